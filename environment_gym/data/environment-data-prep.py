@@ -3,6 +3,7 @@ import os
 
 
 
+# Processed_CROSS_* are the BTC vs macro features of cross_asset_features.py
 # List of 1H
 files1H = ['../../vectoring_data/indicators/indicators_data/1 hour/Processed_BTC_with_indicators_1H.csv',
          '../../vectoring_data/indicators/indicators_data/1 hour/Processed_DXY_with_indicators_1H.csv',
@@ -12,6 +13,7 @@ files1H = ['../../vectoring_data/indicators/indicators_data/1 hour/Processed_BTC
         '../../vectoring_data/indicators/indicators_data/1 hour/Processed_US02Y_with_indicators_1H.csv',
         '../../vectoring_data/indicators/indicators_data/1 hour/Processed_US10Y_with_indicators_1H.csv',
         '../../vectoring_data/indicators/indicators_data/1 hour/Processed_VIX_with_indicators_1H.csv',
+        '../../vectoring_data/indicators/indicators_data/1 hour/Processed_CROSS_with_indicators_1H.csv',
          ]
 # List of 1D
 files1D = ['../../vectoring_data/indicators/indicators_data/1 day/Processed_BTC_with_indicators_1D.csv',
@@ -22,6 +24,7 @@ files1D = ['../../vectoring_data/indicators/indicators_data/1 day/Processed_BTC_
         '../../vectoring_data/indicators/indicators_data/1 day/Processed_US02Y_with_indicators_1D.csv',
         '../../vectoring_data/indicators/indicators_data/1 day/Processed_US10Y_with_indicators_1D.csv',
         '../../vectoring_data/indicators/indicators_data/1 day/Processed_VIX_with_indicators_1D.csv',
+        '../../vectoring_data/indicators/indicators_data/1 day/Processed_CROSS_with_indicators_1D.csv',
          ]
 # List of 1W
 files1W = ['../../vectoring_data/indicators/indicators_data/1 week/Processed_BTC_with_indicators_1W.csv',
@@ -32,6 +35,7 @@ files1W = ['../../vectoring_data/indicators/indicators_data/1 week/Processed_BTC
         '../../vectoring_data/indicators/indicators_data/1 week/Processed_US02Y_with_indicators_1W.csv',
         '../../vectoring_data/indicators/indicators_data/1 week/Processed_US10Y_with_indicators_1W.csv',
         '../../vectoring_data/indicators/indicators_data/1 week/Processed_VIX_with_indicators_1W.csv',
+        '../../vectoring_data/indicators/indicators_data/1 week/Processed_CROSS_with_indicators_1W.csv',
          ]
 # List of 1Y
 files1Y = ['../../vectoring_data/indicators/indicators_data/1 year/Processed_BTC_with_indicators_1Y.csv',
@@ -42,9 +46,12 @@ files1Y = ['../../vectoring_data/indicators/indicators_data/1 year/Processed_BTC
         '../../vectoring_data/indicators/indicators_data/1 year/Processed_US02Y_with_indicators_1Y.csv',
         '../../vectoring_data/indicators/indicators_data/1 year/Processed_US10Y_with_indicators_1Y.csv',
         '../../vectoring_data/indicators/indicators_data/1 year/Processed_VIX_with_indicators_1Y.csv',
+        '../../vectoring_data/indicators/indicators_data/1 year/Processed_CROSS_with_indicators_1Y.csv',
          ]         
 
-files1m = ['../../vectoring_data/indicators/indicators_data/1 minute/Processed_BTC_with_indicators_1m.csv']
+files1m = ['../../vectoring_data/indicators/indicators_data/1 minute/Processed_BTC_with_indicators_1m.csv',
+        '../../vectoring_data/indicators/indicators_data/1 minute/Processed_CROSS_with_indicators_1m.csv',
+         ]
 
 def merger(fileList, outputname):
     # List to hold DataFrames
@@ -110,7 +110,7 @@ async def coordinate_processer(script_events):
             print("All scripts have reached the waiting state.", flush=True)
 
             # Launch processer.py
-            processer_cmd = ['python', 'processer.py']
+            processer_cmd = ['python', '-u', 'processer.py']
             # Construct processer_cwd relative to base_dir
             processer_cwd = os.path.join(base_dir, 'history', 'LIVE PROCESSED')
             processer_cwd = os.path.abspath(processer_cwd)
@@ -125,40 +125,32 @@ async def coordinate_processer(script_events):
                     cwd=processer_cwd  # Set the working directory
                 )
 
-                # Read processer.py output (both stdout and stderr)
-                async def read_processer_output():
+                # Read processer.py output (both stdout and stderr), each
+                # stream on its own so the lines show up as soon as they are
+                # printed: a line per finished stage of each ticker job, then
+                # the whole output of the job when it is done
+                async def read_processer_output(stream, log_level, stream_name):
                     while True:
-                        stdout_line = await processer_process.stdout.readline()
-                        stderr_line = await processer_process.stderr.readline()
-
-                        if not stdout_line and not stderr_line:
-                            if processer_process.returncode is not None:
-                                break
-                            await asyncio.sleep(0.1)
-                            continue
-
-                        if stdout_line:
-                            try:
-                                line = stdout_line.decode('utf-8').rstrip()
-                            except UnicodeDecodeError:
-                                line = stdout_line.decode('utf-8', errors='replace').rstrip()
-                            print(f"Processer [stdout]: {line}", flush=True)
-                            processer_logger.info(f"stdout: {line}")
-
-                        if stderr_line:
-                            try:
-                                line = stderr_line.decode('utf-8').rstrip()
-                            except UnicodeDecodeError:
-                                line = stderr_line.decode('utf-8', errors='replace').rstrip()
-                            print(f"Processer [stderr]: {line}", flush=True)
-                            processer_logger.error(f"stderr: {line}")
+                        line = await stream.readline()
+                        if not line:
+                            break  # Stream closed, processer.py has terminated
+                        try:
+                            line = line.decode('utf-8').rstrip()
+                        except UnicodeDecodeError:
+                            line = line.decode('utf-8', errors='replace').rstrip()
+                        print(f"Processer [{stream_name}]: {line}", flush=True)
+                        processer_logger.log(log_level, f"{stream_name}: {line}")
 
                 # Start reading processer.py output
-                output_task = asyncio.create_task(read_processer_output())
+                stdout_task = asyncio.create_task(read_processer_output(processer_process.stdout, logging.INFO, 'stdout'))
+                stderr_task = asyncio.create_task(read_processer_output(processer_process.stderr, logging.ERROR, 'stderr'))
 
                 # Wait for processer.py to complete
                 await processer_process.wait()
-                await output_task
+                await stdout_task
+                await stderr_task
+                if processer_process.returncode != 0:
+                    processer_logger.error(f"processer.py exited with return code {processer_process.returncode}, some tickers failed.")
 
                 processer_logger.info("processer.py has completed.")
                 print("processer.py has completed.", flush=True)
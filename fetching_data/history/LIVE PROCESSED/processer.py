@@ -1,5 +1,12 @@
 import pandas as pd
+import numpy as np
+import io
+import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
 from datetime import datetime
 
 def update_processed_data(ticker_name, processed_file, live_file):
@@ -84,84 +91,384 @@ def update_processed_data(ticker_name, processed_file, live_file):
     print(f"Data for {ticker_name} updated successfully! The file '{processed_file}' has been overwritten with the latest data.\n")
 
 
+def read_last_row(processed_file):
+    # (offset of the last line, last row) of a CSV file, reading only its end
+    header = pd.read_csv(processed_file, nrows=0).columns
+    with open(processed_file, 'rb') as f:
+        end = f.seek(0, 2)
+        position = end
+        tail = b''
+        # Back from the end until the last line is complete
+        while position > 0:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+            lines = tail.rstrip(b'\r\n').split(b'\n')
+            if len(lines) > 1 or position == 0:
+                break
+    last_line = lines[-1]
+    offset = position + len(tail.rstrip(b'\r\n')) - len(last_line)
+    if offset == 0:
+        # Only the header
+        return None, None
+    last_row = pd.read_csv(io.BytesIO(last_line + b'\n'), names=header, header=None, parse_dates=[header[0]])
+    return offset, last_row
+
+def write_tail(processed_file, offset, data):
+    # The rows replacing the file from offset on are written next to it first,
+    # with the line before offset: if the run stops while the file is cut and
+    # appended, finish_tail completes it the next time
+    tail_file = processed_file + '.tail'
+    with open(processed_file, 'rb') as f:
+        before = line_before(f, offset).decode()
+    with open(tail_file + '.tmp', 'wb') as f:
+        f.write(json.dumps({'offset': offset, 'line_before': before}).encode() + b'\n' + data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tail_file + '.tmp', tail_file)
+    finish_tail(processed_file)
+
+def finish_tail(processed_file):
+    # Applies a tail left by write_tail, again if it was applied already (same
+    # cut, same rows), unless the file changed before its offset since
+    tail_file = processed_file + '.tail'
+    if not os.path.exists(tail_file):
+        return
+    with open(tail_file, 'rb') as f:
+        tail = json.loads(f.readline())
+        data = f.read()
+    with open(processed_file, 'r+b') as f:
+        size = f.seek(0, 2)
+        if size >= tail['offset'] and line_before(f, tail['offset']).decode() == tail['line_before']:
+            f.truncate(tail['offset'])
+            f.seek(tail['offset'])
+            f.write(data)
+        else:
+            print(f"{processed_file} changed since its last tail was written, the tail is dropped.")
+    os.remove(tail_file)
+
+def append_live_data(ticker_name, processed_file, live_file):
+    """
+    Tail-append mode of update_processed_data: only the end of the processed
+    file is read, the live rows from its last minute on are forward-filled to
+    every minute and appended (the last minute is rewritten, the live data of
+    a minute can still change). Returns False when the whole file has to be
+    rewritten instead (no processed rows yet, Volume column appearing).
+    """
+    print(f"**Appending {ticker_name} Data**")
+
+    # **1. Last Row Of The Processed Data**
+    if not os.path.exists(processed_file):
+        return False
+    # A tail the previous run didn't finish writing goes in first
+    finish_tail(processed_file)
+    offset, last_row = read_last_row(processed_file)
+    if last_row is None:
+        return False
+    columns = list(last_row.columns)
+    last_time = last_row['datetime'].iloc[0]
+    volume_in_processed = 'Volume' in columns
+
+    # **2. Load New Live Data**
+    print("Loading new live data...")
+    live_df = pd.read_csv(live_file)
+    live_df['datetime'] = pd.to_datetime(live_df['timestamp'], format='%Y-%m-%d %H:%M')
+    volume_in_live = 'volume' in live_df.columns and (live_df['volume'] != 0).any()
+    if volume_in_live and not volume_in_processed:
+        # The whole history gets a Volume column
+        return False
+    live_df.rename(columns={'price': 'Price', 'volume': 'Volume'}, inplace=True)
+    live_df = live_df[live_df['datetime'] >= last_time]
+    if live_df.empty:
+        print(f"No live data after {last_time}.\n")
+        return True
+    if not volume_in_live:
+        live_df = live_df.drop(columns=['Volume'], errors='ignore')
+
+    # **3. Merge With The Last Row**
+    # Live data replaces the last processed minute, as in the full update
+    tail_df = pd.concat([last_row, live_df[[col for col in columns if col in live_df.columns]]], ignore_index=True)
+    tail_df.drop_duplicates(subset='datetime', keep='last', inplace=True)
+    tail_df.sort_values(by='datetime', inplace=True)
+
+    # **4. Forward Fill Missing Data**
+    print("Forward filling missing data...")
+    tail_df.set_index('datetime', inplace=True)
+    all_minutes = pd.date_range(start=last_time, end=tail_df.index.max(), freq='T')
+    tail_df = tail_df.reindex(all_minutes).ffill()
+    tail_df.index.name = 'datetime'
+    tail_df.reset_index(inplace=True)
+    tail_df = tail_df[columns]
+    if volume_in_processed:
+        tail_df['Volume'] = tail_df['Volume'].astype(float)
+
+    # **5. Append To The Processed Data**
+    # The last row is cut only once the rows replacing it are on disk
+    print("Appending to the processed data...")
+    data = tail_df.to_csv(header=False, index=False, date_format='%Y-%m-%d %H:%M:%S').encode()
+    write_tail(processed_file, offset, data)
+
+    print(f"Data for {ticker_name} updated successfully! {len(tail_df) - 1} minutes appended to '{processed_file}'.\n")
+    return True
+
+
+BTC_LIVE_FILE = '..\\..\\live\\PriceData\\BTCUSD_data.csv'
+BTC_PROCESSED_FILE = 'Processed_BTC.csv'
+# Watermark of the BTC processing: bytes of the live file read, last line
+# read and last Timestamp in the processed file
+STATE_FILE = 'processed_state.json'
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+def save_state(state):
+    # Written to a temporary file first, a crash never leaves half a state
+    tmp_file = STATE_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_file, STATE_FILE)
+
+def line_before(f, offset):
+    # The line ending at offset (without its newline)
+    start = max(0, offset - 4096)
+    f.seek(start)
+    lines = f.read(offset - start).rstrip(b'\r\n').split(b'\n')
+    return lines[-1]
+
+def read_live_btc(state):
+    """
+    Reads the BTC live file from the offset of the state, or from the top if
+    the fetcher rewrote it since. Only complete lines are read.
+    Returns (DataFrame, new offset, last line read).
+    """
+    with open(BTC_LIVE_FILE, 'rb') as f:
+        header = f.readline()
+        size = f.seek(0, 2)
+        offset = state.get('offset', len(header))
+        if 'offset' in state and (size < offset or line_before(f, offset).decode() != state['last_line']):
+            print("Live file rewritten, reading it from the top...")
+            offset = len(header)
+        f.seek(offset)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    last_line = line_before(io.BytesIO(header + data), len(header) + len(data)).decode() if data else state.get('last_line', '')
+    return pd.read_csv(io.BytesIO(header + data)), offset + len(data), last_line
+
+def resolve_duplicates(df):
+    # Keeps the row with the highest volume of each timestamp (the first one
+    # on a tie): highest volume first, then one row each
+    df = df.sort_values(by=['Timestamp', 'Volume'], ascending=[True, False], kind='stable')
+    return df.drop_duplicates(subset='Timestamp', keep='first')
+
+def find_missing_minutes(timestamps, previous=None):
+    # Unix times (seconds) of the minutes missing between the sorted unique
+    # timestamps, and between previous (the last processed one) and the first
+    if previous is not None:
+        timestamps = np.concatenate([[previous], timestamps])
+    steps = np.diff(timestamps)
+    gaps = np.flatnonzero(steps > 60)
+    if len(gaps) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([np.arange(timestamps[i] + 60, timestamps[i + 1], 60) for i in gaps])
+
+def format_btc_rows(df):
+    # Formatted_Time first, then the columns of the live file
+    df['Formatted_Time'] = pd.to_datetime(df['Timestamp'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
+    cols = ['Formatted_Time'] + [col for col in df.columns if col != 'Formatted_Time' and col != 'Datetime']
+    return df[cols]
+
+def save_missing_minutes(missing, append=False):
+    missing_df = pd.DataFrame({'Missing_Time': pd.to_datetime(missing, unit='s', utc=True)})
+    if append and os.path.exists('missing_minutes.csv'):
+        missing_df.to_csv('missing_minutes.csv', mode='a', header=False, index=False)
+    else:
+        missing_df.to_csv('missing_minutes.csv', index=False)
+
 def copy_btc_data():
+    # Errors are left to the caller, process_ticker reports the job as failed
+    print("** Reading BTCUSD_data.csv **")
+    df, offset, last_line = read_live_btc({})
+    
+    print("** Convert Unix time to formatted datetime **")
+    # Convert 'Timestamp' to datetime assuming it's in seconds and in UTC
+    df['Datetime'] = pd.to_datetime(df['Timestamp'], unit='s', utc=True)
+    
+    # Remove duplicates based on 'Timestamp'
+    print("** Removing duplicates based on Timestamp **")
+    duplicates = df.duplicated(subset='Timestamp', keep=False)
+    num_duplicates = duplicates.sum()
+    if num_duplicates > 0:
+        print(f"Found {num_duplicates} duplicate entries")
+        # Only the duplicates after the last processed minute are new,
+        # the older ones were saved by the previous runs
+        last_processed = None
+        if os.path.exists(BTC_PROCESSED_FILE):
+            _, last_row = read_last_row(BTC_PROCESSED_FILE)
+            if last_row is not None:
+                last_processed = pd.Timestamp(last_row['Formatted_Time'].iloc[0]).tz_localize('UTC')
+        duplicated_records = df[duplicates]
+        if last_processed is not None:
+            duplicated_records = duplicated_records[duplicated_records['Datetime'] > last_processed]
+        if len(duplicated_records) > 0:
+            # Save duplicated records to a CSV file
+            duplicated_records.to_csv('duplicated_records.csv', index=False)
+            print(f"{len(duplicated_records)} new duplicated records have been saved to duplicated_records.csv")
+        else:
+            print("No new duplicated records since the last run.")
+
+        df = resolve_duplicates(df)
+        print("Duplicated records have been removed.")
+
+    else:
+        print("No duplicates found.")
+    
+    # Ensure the data is sorted by timestamp
+    df.sort_values(by='Datetime', inplace=True)
+    
+    # Check for missing minutes
+    print("** Checking for missing minutes **")
+    missing_minutes = find_missing_minutes(df['Timestamp'].to_numpy(dtype=np.int64))
+    
+    if len(missing_minutes) > 0:
+        print(f"Found {len(missing_minutes)} missing minutes.")
+        save_missing_minutes(missing_minutes)
+        print("Missing minutes have been saved to missing_minutes.csv")
+    else:
+        print("No missing minutes found.")
+    
+    # Convert 'Datetime' to formatted string if needed
+    df = format_btc_rows(df)
+    
+    # Save the processed data to a new CSV file
+    print("** Save to a new CSV file **")
+    df.to_csv(BTC_PROCESSED_FILE, index=False)
+    save_state({'offset': offset, 'last_line': last_line, 'watermark': int(df['Timestamp'].iloc[-1])})
+
+def append_btc_data():
+    """
+    Incremental copy_btc_data: only the rows of the live file after the
+    watermark are processed and appended to Processed_BTC.csv. Returns False
+    when the whole file has to be built again (no watermark yet, processed
+    file not ending at the watermark, or the append or its state failed).
+    """
     try:
-        print("** Reading BTCUSD_data.csv **")
-        df = pd.read_csv('..\\..\\live\\PriceData\\BTCUSD_data.csv')
-        
-        print("** Convert Unix time to formatted datetime **")
-        # Convert 'Timestamp' to datetime assuming it's in seconds and in UTC
-        df['Datetime'] = pd.to_datetime(df['Timestamp'], unit='s', utc=True)
-        
-        # Remove duplicates based on 'Timestamp'
+        state = load_state()
+        if 'watermark' not in state or not os.path.exists(BTC_PROCESSED_FILE):
+            return False
+        watermark = state['watermark']
+        _, last_row = read_last_row(BTC_PROCESSED_FILE)
+        if last_row is None or int(last_row['Timestamp'].iloc[0]) != watermark:
+            print(f"{BTC_PROCESSED_FILE} does not end at the watermark, building it again.")
+            return False
+
+        print("** Reading new rows of BTCUSD_data.csv **")
+        df, offset, last_line = read_live_btc(state)
+        # Minutes up to the watermark are final
+        df = df[df['Timestamp'] > watermark]
+        if df.empty:
+            print("No new BTC data.\n")
+            save_state({'offset': offset, 'last_line': last_line, 'watermark': watermark})
+            return True
+
         print("** Removing duplicates based on Timestamp **")
         duplicates = df.duplicated(subset='Timestamp', keep=False)
-        num_duplicates = duplicates.sum()
-        if num_duplicates > 0:
-            # Create a DataFrame of duplicated records
-            duplicated_records = df[duplicates]
-            # Save duplicated records to a CSV file
-            duplicated_records.to_csv('duplicated_records.csv', index=False)
-            print(f"Found {num_duplicates} duplicate entries")
-            print("Duplicated records have been saved to duplicated_records.csv")
-
-            # Group by Timestamp and compare volumes
-            for timestamp, group in duplicated_records.groupby('Timestamp'):
-                # print(f"\nDuplicates for {timestamp}:")
-                # print(group)
-                # Keep row with highest volume
-                max_volume_row = group.loc[group['Volume'].idxmax()]
-            
-                # Remove all rows with this timestamp and add back the one with max volume
-                df = df[df['Timestamp'] != timestamp]
-                df = pd.concat([df, pd.DataFrame([max_volume_row])], ignore_index=True)
-            print("Duplicated records have been removed.csv")
+        if duplicates.any():
+            df[duplicates].to_csv('duplicated_records.csv', index=False)
+            print(f"Found {duplicates.sum()} duplicate entries, saved to duplicated_records.csv")
+        df = resolve_duplicates(df)
 
-        else:
-            print("No duplicates found.")
-        
-        # Ensure the data is sorted by timestamp
-        df.sort_values(by='Datetime', inplace=True)
-        
-        # Check for missing minutes
         print("** Checking for missing minutes **")
-        start = df['Datetime'].min()
-        end = df['Datetime'].max()
-        complete_range = pd.date_range(start=start, end=end, freq='T', tz='UTC')
-        existing_timestamps = pd.to_datetime(df['Datetime'])
-        missing_minutes = complete_range[~complete_range.isin(existing_timestamps)]
-        
+        missing_minutes = find_missing_minutes(df['Timestamp'].to_numpy(dtype=np.int64), watermark)
         if len(missing_minutes) > 0:
             print(f"Found {len(missing_minutes)} missing minutes.")
-            # Convert missing_minutes to a DataFrame
-            missing_df = pd.DataFrame(missing_minutes, columns=['Missing_Time'])
-            # Save to a CSV file
-            missing_df.to_csv('missing_minutes.csv', index=False)
-            print("Missing minutes have been saved to missing_minutes.csv")
-        else:
-            print("No missing minutes found.")
-        
-        # Convert 'Datetime' to formatted string if needed
-        df['Formatted_Time'] = df['Datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Reorder columns to put Formatted_Time at the beginning
-        cols = ['Formatted_Time'] + [col for col in df.columns if col != 'Formatted_Time' and col != 'Datetime']
-        df = df[cols]
-        
-        # Save the processed data to a new CSV file
-        print("** Save to a new CSV file **")
-        df.to_csv('Processed_BTC.csv', index=False)
+            save_missing_minutes(missing_minutes, append=True)
+            print("Missing minutes have been appended to missing_minutes.csv")
+
+        # Same dtypes as the columns of the whole file
+        for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
+            if col in df.columns:
+                df[col] = df[col].astype(float)
+        df = format_btc_rows(df)
+
+        print("** Append to the processed CSV file **")
+        df.to_csv(BTC_PROCESSED_FILE, mode='a', header=False, index=False)
+        save_state({'offset': offset, 'last_line': last_line, 'watermark': int(df['Timestamp'].iloc[-1])})
+        print(f"{len(df)} BTC minutes appended to {BTC_PROCESSED_FILE}.\n")
+        return True
     except Exception as e:
-        print(f"Error transforming BTC data: {str(e)}\n")
+        # Also when the rows were appended but the state wasn't saved: the
+        # rebuild writes both again
+        print(f"Error appending BTC data: {str(e)}, building it again.\n")
+        return False
 
-if __name__ == "__main__":
-    # BTC data
-    copy_btc_data()
+TICKERS = ['DXY', 'GOLD', 'NDQ', 'US02Y', 'US10Y', 'VIX', 'SPX']
+
+def stage_done(ticker, stage, started):
+    # One line as soon as a stage of a job is done, on the real stdout (the
+    # rest of the job's output is kept for its block)
+    print(f"{ticker}: {stage} after {time.time() - started:.1f}s", file=sys.__stdout__, flush=True)
+
+def process_ticker(ticker):
+    """
+    One job of the hourly run, in a worker process: BTC or one of TICKERS.
+    A line is printed when each of its stages is done, the rest of its output
+    is kept and printed as a block by the parent, the jobs do not interleave.
+    Returns (ticker, ok, seconds, output).
+    """
+    output = io.StringIO()
+    started = time.time()
+    ok = True
+    try:
+        with redirect_stdout(output):
+            if ticker == 'BTC':
+                # Only the rows after the watermark unless there is none yet
+                if not append_btc_data():
+                    copy_btc_data()
+                processed_file_path = BTC_PROCESSED_FILE
+            else:
+                processed_file_path = f'Processed_{ticker}.csv'
+                live_file_path = f'..\\..\\live\\PriceData\\{ticker}_data.csv'
+                # Only the end of the processed file is read, unless it has to
+                # be rewritten as a whole
+                if not append_live_data(ticker, processed_file_path, live_file_path):
+                    update_processed_data(ticker, processed_file_path, live_file_path)
+            stage_done(ticker, f'{processed_file_path} updated', started)
+    except Exception as e:
+        output.write(f"Error processing {ticker}: {str(e)}\n")
+        ok = False
+    return ticker, ok, time.time() - started, output.getvalue()
 
-    # tickers
-    tickers = ['DXY', 'GOLD', 'NDQ', 'US02Y', 'US10Y', 'VIX', 'SPX']
-    for ticker in tickers:
-        processed_file_path = f'Processed_{ticker}.csv'
-        live_file_path = f'..\\..\\live\\PriceData\\{ticker}_data.csv'
-        update_processed_data(ticker, processed_file_path, live_file_path)
+def process_all(tickers, workers=None):
+    """
+    Runs the jobs of tickers in a process pool and prints each one as soon as
+    it is done; a failing job does not stop the others. Returns the failed ones.
+    """
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_ticker, ticker): ticker for ticker in tickers}
+        for done, future in enumerate(as_completed(futures), 1):
+            ticker = futures[future]
+            try:
+                ticker, ok, seconds, output = future.result()
+            except Exception as e:
+                # The worker itself died
+                ok, seconds, output = False, 0.0, f"Error processing {ticker}: {str(e)}\n"
+            print(output, end='')
+            status = 'done' if ok else 'FAILED'
+            print(f"[{done}/{len(tickers)}] {ticker} {status} in {seconds:.1f}s", flush=True)
+            if not ok:
+                failed.append(ticker)
+    return failed
 
+if __name__ == "__main__":
+    # BTC and the tickers are independent, one job each
+    started = time.time()
+    failed = process_all(['BTC'] + TICKERS)
+    if failed:
+        print(f"Processing failed for {', '.join(failed)}.")
+    print(f"All data processed in {time.time() - started:.1f}s.")
+    sys.exit(1 if failed else 0)
@@ -1,7 +1,6 @@
 import os
 import base64
 import json
-import time
 import datetime
 import html
 import pandas as pd
@@ -13,6 +12,8 @@ from bs4 import BeautifulSoup
 from googleapiclient.errors import HttpError
 from google.auth.exceptions import RefreshError
 
+from minute_scheduler import MinuteScheduler
+
 # Define Gmail API scopes
 SCOPES = ['https://mail.google.com/']
 
@@ -20,6 +21,8 @@ SCOPES = ['https://mail.google.com/']
 last_ticker_states = {}
 data_added = {}  # Tracks whether data was added for each ticker during the interval
 tickers = ['US10Y', 'US02Y', 'VIX', 'SPX', 'GOLD', 'NDQ', 'MOVE', 'DXY']  # List of tickers to monitor
+# Seconds after the minute boundary before reading the alerts (email delivery)
+ALERT_DELAY_SECONDS = 10
 
 # Authenticate and create a service object
 def authenticate_gmail():
@@ -420,11 +423,19 @@ def main():
         last_ticker_states[ticker] = {'timestamp': last_timestamp, 'price': last_price, 'volume': last_volume}
         data_added[ticker] = False  # Initialize data_added flag
 
+    # A first pass right away, then every minute once the alerts of the
+    # minute that closed had time to arrive
+    scheduler = MinuteScheduler(ALERT_DELAY_SECONDS, 'PriceData\\tickers_latency.csv')
+    tick = None
     while True:
         fetch_and_process_emails(service)
         sync_missing_data()
+        if tick is not None:
+            # From the close of the minute to the rows on disk
+            latency = scheduler.record_latency(tick['minute'])
+            print(f"Minute {datetime.datetime.utcfromtimestamp(tick['minute']).strftime('%H:%M')} processed {latency:.2f}s after close")
         print("Waiting for the next minute...")
-        time.sleep(60)  # Wait before checking again
+        tick = scheduler.wait()
 
 if __name__ == '__main__':
     main()
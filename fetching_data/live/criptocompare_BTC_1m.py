@@ -1,14 +1,81 @@
+import argparse
 import requests
+import requests.adapters
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 import time
 import os
+import json
+import shutil
+import threading
 
-def get_last_timestamp(csv_file):
+from minute_scheduler import MinuteScheduler
+
+def watermark_file(csv_file):
+    # PriceData\BTCUSD_data.csv -> PriceData\BTCUSD_data_watermark.json
+    return os.path.splitext(csv_file)[0] + '_watermark.json'
+
+def save_watermark(csv_file, last_timestamp):
     """
-    Reads the CSV file and returns the last valid timestamp in unix format (int).
+    Persists the last timestamp written to the CSV file, so the next start
+    does not have to parse the whole history.
+    """
+    path = watermark_file(csv_file)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'last_timestamp': int(last_timestamp)}, f)
+    os.replace(path + '.tmp', path)
+
+def load_watermark(csv_file):
+    try:
+        with open(watermark_file(csv_file)) as f:
+            return int(json.load(f)['last_timestamp'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def tail_timestamp(csv_file, max_lines=10):
+    """
+    Timestamp of the last valid line of the CSV file, reading backwards from
+    its end (a partial or broken last line is skipped). None if not found in
+    the last max_lines lines.
+    """
+    with open(csv_file, 'rb') as f:
+        header = f.readline().decode().strip().split(',')
+        if 'Timestamp' not in header:
+            return None
+        column = header.index('Timestamp')
+        position = f.seek(0, 2)
+        tail = b''
+        while position > 0 and tail.count(b'\n') <= max_lines:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+    lines = tail.split(b'\n')
+    if position > 0:
+        # The first piece may be cut
+        lines = lines[1:]
+    for line in reversed(lines[-max_lines - 1:]):
+        fields = line.decode(errors='replace').strip().split(',')
+        if len(fields) != len(header):
+            continue
+        try:
+            return int(float(fields[column]))
+        except ValueError:
+            continue
+    return None
+
+def scan_last_timestamp(csv_file):
+    """
+    Reads the whole CSV file and returns the last valid timestamp in unix format (int).
     """
     df = pd.read_csv(csv_file)
+    # A last line without its newline is partial (cut by append_rows)
+    with open(csv_file, 'rb') as f:
+        if f.seek(0, 2) > 0:
+            f.seek(-1, 2)
+            if f.read(1) != b'\n':
+                df = df.iloc[:-1]
     # Ensure that 'Timestamp' column exists and is numeric
     if 'Timestamp' in df.columns:
         # Drop rows where Timestamp is NaN
@@ -17,67 +84,299 @@ def get_last_timestamp(csv_file):
         df['Timestamp'] = df['Timestamp'].astype(float).astype(int)
         if not df.empty:
             last_timestamp = df['Timestamp'].max()
-            return last_timestamp
+            return int(last_timestamp)
     return None  # Return None if no valid timestamp found
 
-def download_missing_data(api_key, last_timestamp):
+def get_last_timestamp(csv_file):
     """
-    Downloads missing BTC data from last_timestamp to now.
+    Returns the last valid timestamp in unix format (int): the persisted
+    watermark when the end of the file agrees with it, else a full scan of
+    the file (first start, or the file changed without the watermark).
     """
-    base_url = 'https://min-api.cryptocompare.com/data/v2/histominute'
-
-    # Subtract 2 minutes from current time to ensure data is available
-    end_timestamp = int((datetime.now(timezone.utc) - timedelta(minutes=1)).timestamp())
-
-    all_data = []
+    watermark = load_watermark(csv_file)
+    last_line = tail_timestamp(csv_file)
+    if watermark is not None and watermark == last_line:
+        return watermark
+    if watermark is None:
+        print("No watermark yet, scanning the whole file...")
+    else:
+        print(f"Watermark {watermark} and last line {last_line} disagree, scanning the whole file...")
+    last_timestamp = scan_last_timestamp(csv_file)
+    if last_timestamp is not None:
+        save_watermark(csv_file, last_timestamp)
+    return last_timestamp
+
+# API root, --base-url points the fetcher elsewhere (histominute_server.py)
+API_URL = 'https://min-api.cryptocompare.com'
+BASE_URL = API_URL + '/data/v2/histominute'
+# Candles per histominute request
+WINDOW_MINUTES = 2000
+# Parallel requests of a backfill
+BACKFILL_WORKERS = 4
+# (requests, seconds) allowed by the API plan, adjust to the subscription
+RATE_LIMITS = [(10, 1), (250, 60), (2500, 3600)]
+# Attempts per window before giving up on it
+MAX_ATTEMPTS = 5
+# Backfill rounds in a row without data before the live loop takes over
+BACKFILL_ROUNDS = 3
+# Requests of the API plan per calendar month (UTC)
+MONTHLY_REQUESTS = 100000
+# Requests kept aside for gap recovery and retries
+RESERVE_REQUESTS = 2000
+# Candles per live request: 1 polls every minute, more minutes between pulls
+# (the latency allowed when the budget is short)
+MIN_BATCH = 1
+MAX_BATCH = 30
+BUDGET_FILE = 'api_budget.json'
+# Seconds after the minute boundary before asking for the minute that closed
+SETTLEMENT_SECONDS = 2
+
+
+class TokenBucket:
+    """
+    Token bucket shared by the backfill threads: rate tokens per second up to
+    capacity, acquire() blocks until a token is available.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
-    toTs = end_timestamp
-    fromTs = last_timestamp + 60  # Start from the next minute after last_timestamp
 
-    while toTs >= fromTs:
-        # Calculate the number of data points to fetch
-        minutes_to_fetch = int((toTs - fromTs) / 60) + 1  # +1 to include both endpoints
-        if minutes_to_fetch <= 0:
-            print(f'minutes_to_fetch < 0: {minutes_to_fetch}... returning')
-            break
+class RateLimiter:
+    # One token bucket per (requests, seconds) limit, a request takes one of each
+    def __init__(self, limits):
+        self.buckets = [TokenBucket(requests_ / seconds, requests_) for requests_, seconds in limits]
 
-        # Since limit = number of data points - 1
-        limit = min(2000, minutes_to_fetch) - 1  # Fetch up to 2000 data points per request
+    def acquire(self):
+        for bucket in self.buckets:
+            bucket.acquire()
 
-        params = {
-            'api_key': api_key,
-            'fsym': 'BTC',
-            'tsym': 'USD',
-            'limit': limit,
-            'toTs': toTs,
-            'aggregate': 1
-        }
 
+class RequestBudget:
+    """
+    Requests used in the current month, persisted in state_file so restarts
+    keep counting. batch_size() spreads the remaining requests over the rest
+    of the month.
+    """
+    def __init__(self, state_file=BUDGET_FILE, monthly_requests=MONTHLY_REQUESTS, reserve=RESERVE_REQUESTS):
+        self.state_file = state_file
+        self.monthly_requests = monthly_requests
+        self.reserve = reserve
+        self.lock = threading.Lock()
+        self.month = None
+        self.used = 0
+        if os.path.exists(state_file):
+            try:
+                with open(state_file) as f:
+                    state = json.load(f)
+                self.month = state['month']
+                self.used = int(state['used'])
+            except (OSError, ValueError, KeyError):
+                print(f"Unreadable {state_file}, counting from 0.")
+        self._roll_month()
+
+    def _roll_month(self):
+        month = datetime.now(timezone.utc).strftime('%Y-%m')
+        if month != self.month:
+            self.month = month
+            self.used = 0
+
+    def _save(self):
+        with open(self.state_file + '.tmp', 'w') as f:
+            json.dump({'month': self.month, 'used': self.used}, f)
+        os.replace(self.state_file + '.tmp', self.state_file)
+
+    def record(self, count=1):
+        # Called for every request sent, successful or not
+        with self.lock:
+            self._roll_month()
+            self.used += count
+            self._save()
+
+    def remaining(self):
+        with self.lock:
+            self._roll_month()
+            return self.monthly_requests - self.used
+
+    def batch_size(self, min_batch=MIN_BATCH, max_batch=MAX_BATCH):
+        """
+        Smallest number of candles per live request (min_batch..max_batch)
+        that lasts until the end of the month with the reserve kept aside.
+        Says so when even max_batch does not last.
+        """
+        now = datetime.now(timezone.utc)
+        next_month = (now.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        minutes_left = int((next_month - now).total_seconds() // 60) + 1
+        available = self.remaining() - self.reserve
+        for batch in range(min_batch, max_batch + 1):
+            if -(-minutes_left // batch) <= available:
+                return batch
+        print(f"WARNING: {self.remaining()} API requests left for {minutes_left} minutes, "
+              f"the budget runs out before the end of the month even with {max_batch} candles per request.")
+        return max_batch
+
+
+_local = threading.local()
+
+def get_session():
+    """
+    Keep-alive session of the current thread (requests sessions are not
+    shared between threads), its connections are reused by every request.
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=BACKFILL_WORKERS)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.session = session
+    return session
+
+def backfill_windows(from_ts, to_ts):
+    """
+    (toTs, limit) of the requests covering from_ts..to_ts. Windows are
+    aligned on from_ts, so a backfill resumed later with a newer to_ts finds
+    its completed windows again (only the last one changes).
+    """
+    windows = []
+    start = from_ts
+    while start <= to_ts:
+        end = min(start + (WINDOW_MINUTES - 1) * 60, to_ts)
+        # limit = number of data points - 1, at least 1 for the API (the
+        # extra older candle is dropped with the ones before from_ts)
+        windows.append((end, max(1, int((end - start) / 60))))
+        start = end + 60
+    return windows
+
+def fetch_window(api_key, to_ts, limit, limiter, budget=None):
+    """
+    One histominute request with retries. Returns a DataFrame, or None when
+    every attempt failed.
+    """
+    params = {
+        'api_key': api_key,
+        'fsym': 'BTC',
+        'tsym': 'USD',
+        'limit': limit,
+        'toTs': to_ts,
+        'aggregate': 1
+    }
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire()
+        if budget is not None:
+            budget.record()
         try:
-            response = requests.get(base_url, params=params)
+            response = get_session().get(BASE_URL, params=params, timeout=30)
             if response.status_code == 200:
                 data = response.json()
-                if 'Data' in data and 'Data' in data['Data']:
-                    df = pd.DataFrame(data['Data']['Data'])
-                    all_data.append(df)
-                    print(f"Downloaded data up to {datetime.fromtimestamp(toTs, timezone.utc)}")
-                else:
-                    print("No data found in response.")
-                    break
-
-                # Move backward in time
-                toTs -= (limit + 1) * 60  # (limit + 1) because limit + 1 data points were fetched
+                if data.get('Response') != 'Error' and 'Data' in data and 'Data' in data['Data']:
+                    return pd.DataFrame(data['Data']['Data'])
+                print(f"No data found in response for {datetime.fromtimestamp(to_ts, timezone.utc)}: {data.get('Message')}")
             else:
                 print(f"Error: Status code {response.status_code}")
                 print(f"Response: {response.text}")
-                break  # Exit the loop on error
-
-            # Respect API rate limits
-            time.sleep(1.5)
-
         except Exception as e:
             print(f"Error downloading data: {e}")
-            time.sleep(60)  # Wait longer if error occurs
+        # Back off before the next attempt
+        time.sleep(min(60, 2 ** attempt))
+    return None
+
+def checkpoint_path(checkpoint_dir, to_ts, limit):
+    return os.path.join(checkpoint_dir, f'{to_ts}_{limit}.csv')
+
+def clear_checkpoint(checkpoint_dir, last_timestamp=None):
+    # Once the backfilled data is in the CSV file: the windows up to
+    # last_timestamp (the ones after a failed window stay for the retry), or
+    # all of them
+    if not checkpoint_dir or not os.path.isdir(checkpoint_dir):
+        return
+    if last_timestamp is not None:
+        for name in os.listdir(checkpoint_dir):
+            to_ts = name.split('_')[0]
+            if to_ts.isdigit() and int(to_ts) <= last_timestamp:
+                os.remove(os.path.join(checkpoint_dir, name))
+        if os.listdir(checkpoint_dir):
+            return
+    shutil.rmtree(checkpoint_dir)
+
+def download_missing_data(api_key, last_timestamp, checkpoint_dir=None, budget=None):
+    """
+    Downloads missing BTC data from last_timestamp to now.
+    The gap is split in windows of WINDOW_MINUTES fetched in parallel under
+    RATE_LIMITS. Each completed window is saved in checkpoint_dir, a backfill
+    interrupted before its data is written continues from there. On failed
+    windows only the data up to the first one is returned, the next call
+    downloads the failed windows and reads the others from checkpoint_dir.
+    """
+    # Subtract 1 minute from current time to ensure data is available
+    end_timestamp = int((datetime.now(timezone.utc) - timedelta(minutes=1)).timestamp())
+    fromTs = last_timestamp + 60  # Start from the next minute after last_timestamp
+    windows = backfill_windows(fromTs, end_timestamp)
+    if not windows:
+        return None
+
+    if checkpoint_dir:
+        # Once the windows before a failed one are written the gap starts at
+        # the failed one, the windows after it keep their names. Files of
+        # other windows are stale
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        names = {os.path.basename(checkpoint_path(checkpoint_dir, to_ts, limit)) for to_ts, limit in windows}
+        for name in os.listdir(checkpoint_dir):
+            if name not in names:
+                os.remove(os.path.join(checkpoint_dir, name))
+
+    results = {}
+    pending = []
+    for to_ts, limit in windows:
+        path = checkpoint_path(checkpoint_dir, to_ts, limit) if checkpoint_dir else None
+        if path and os.path.exists(path):
+            results[to_ts] = pd.read_csv(path)
+        else:
+            pending.append((to_ts, limit))
+    if results:
+        print(f"Resuming backfill: {len(results)} of {len(windows)} windows already downloaded.")
+    if budget is not None and len(pending) > budget.remaining() - budget.reserve:
+        print(f"WARNING: the backfill needs {len(pending)} requests, "
+              f"{budget.remaining()} are left this month ({budget.reserve} kept for recovery).")
+
+    limiter = RateLimiter(RATE_LIMITS)
+    with ThreadPoolExecutor(max_workers=BACKFILL_WORKERS) as executor:
+        futures = {executor.submit(fetch_window, api_key, to_ts, limit, limiter, budget): (to_ts, limit)
+                   for to_ts, limit in pending}
+        for future in as_completed(futures):
+            to_ts, limit = futures[future]
+            df = future.result()
+            if df is None:
+                print(f"Giving up on the window up to {datetime.fromtimestamp(to_ts, timezone.utc)}")
+                continue
+            results[to_ts] = df
+            if checkpoint_dir:
+                path = checkpoint_path(checkpoint_dir, to_ts, limit)
+                df.to_csv(path + '.tmp', index=False)
+                os.replace(path + '.tmp', path)
+            print(f"Downloaded data up to {datetime.fromtimestamp(to_ts, timezone.utc)} ({len(results)}/{len(windows)})")
+
+    # Only the windows before the first missing one, the data stays contiguous
+    all_data = []
+    for to_ts, limit in windows:
+        if to_ts not in results:
+            break
+        all_data.append(results[to_ts])
 
     if all_data:
         combined_df = pd.concat(all_data, ignore_index=True)
@@ -91,22 +390,23 @@ def download_missing_data(api_key, last_timestamp):
     else:
         return None
 
-def fetch_latest_data(api_key):
+def fetch_latest_data(api_key, limit=1, budget=None):
     """
-    Fetches the latest 1-minute BTC data point.
+    Fetches the latest 1-minute BTC data points (limit + 1 candles).
     """
-    base_url = 'https://min-api.cryptocompare.com/data/v2/histominute'
     toTs = int((datetime.now(timezone.utc) - timedelta(minutes=1)).timestamp())
     params = {
         'api_key': api_key,
         'fsym': 'BTC',
         'tsym': 'USD',
-        'limit': 1,  # Fetch the latest data point
+        'limit': limit,  # Fetch the latest data points
         'aggregate': 1,
         'toTs': toTs
     }
+    if budget is not None:
+        budget.record()
     try:
-        response = requests.get(base_url, params=params)
+        response = get_session().get(BASE_URL, params=params, timeout=30)
         # print(f"Request URL: {response.url}")
         if response.status_code == 200:
             data = response.json()
@@ -126,6 +426,75 @@ def fetch_latest_data(api_key):
         print(f"Error fetching latest data: {e}")
         return None
 
+def to_rows(new_data):
+    # API candles to the columns of the CSV file
+    new_data['Timestamp'] = new_data['time']
+    new_data.rename(columns={
+        'open': 'Open',
+        'high': 'High',
+        'low': 'Low',
+        'close': 'Close',
+        'volumefrom': 'Volume'
+    }, inplace=True)
+    return new_data[['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume']]
+
+def append_rows(csv_file, rows, last_timestamp):
+    """
+    Appends the rows newer than last_timestamp (the last one in the file) in
+    time order, without reading the file: the overlap is resolved against its
+    last timestamp only. A partial last line left by a crash is cut first.
+    Returns the number of rows appended.
+    """
+    rows = rows[rows['Timestamp'] > last_timestamp]
+    rows = rows.drop_duplicates(subset=['Timestamp']).sort_values('Timestamp')
+    if rows.empty:
+        return 0
+    with open(csv_file, 'rb+') as f:
+        size = f.seek(0, 2)
+        if size > 0:
+            f.seek(max(0, size - 4096))
+            tail = f.read()
+            if not tail.endswith(b'\n'):
+                f.truncate(size - len(tail) + tail.rfind(b'\n') + 1)
+    rows.to_csv(csv_file, mode='a', header=False, index=False)
+    return len(rows)
+
+def backfill(csv_file, api_key, last_timestamp, checkpoint_dir, budget):
+    """
+    Appends the missing minutes with download_missing_data and returns the
+    new last timestamp. Failed windows are downloaded again until the gap
+    fits in one live request, or BACKFILL_ROUNDS rounds in a row bring
+    nothing.
+    """
+    failed_rounds = 0
+    while failed_rounds < BACKFILL_ROUNDS:
+        new_data = download_missing_data(api_key, last_timestamp, checkpoint_dir, budget)
+        if new_data is None or new_data.empty:
+            print("No new data downloaded.")
+            failed_rounds += 1
+        else:
+            failed_rounds = 0
+            # Backfilled rows are all newer than last_timestamp, they go at
+            # the end of the file in order
+            new_data = to_rows(new_data)
+            appended = append_rows(csv_file, new_data, last_timestamp)
+
+            # Update last_timestamp
+            last_timestamp = max(last_timestamp, int(new_data['Timestamp'].max()))
+            save_watermark(csv_file, last_timestamp)
+            clear_checkpoint(checkpoint_dir, last_timestamp)
+            print(f"Appended {appended} new records to {csv_file}")
+
+        now_ts = int((datetime.now(timezone.utc) - timedelta(minutes=1)).timestamp())
+        if (now_ts - last_timestamp) // 60 < WINDOW_MINUTES:
+            break
+    return last_timestamp
+
+def set_base_url(api_url):
+    # Every request goes to api_url instead of the CryptoCompare API
+    global BASE_URL
+    BASE_URL = api_url.rstrip('/') + '/data/v2/histominute'
+
 def main(csv_file, api_key):
     try:
         if not os.path.exists(csv_file):
@@ -141,84 +510,67 @@ def main(csv_file, api_key):
         print(f"Starting from last timestamp: {datetime.fromtimestamp(last_timestamp, timezone.utc)}")
 
         # Download missing data and clean it
-        new_data = download_missing_data(api_key, last_timestamp)
-        if new_data is not None and not new_data.empty:
-            # Process new data
-            new_data['Timestamp'] = new_data['time']
-            new_data.rename(columns={
-                'open': 'Open',
-                'high': 'High',
-                'low': 'Low',
-                'close': 'Close',
-                'volumefrom': 'Volume'
-            }, inplace=True)
-            new_data = new_data[['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume']]
-
-            # Read existing CSV
-            existing_df = pd.read_csv(csv_file)
-
-            # Append new data
-            combined_df = pd.concat([existing_df, new_data], ignore_index=True)
-
-            # Drop duplicates
-            combined_df.drop_duplicates(subset=['Timestamp'], inplace=True)
-
-            # Sort by Timestamp
-            combined_df.sort_values('Timestamp', inplace=True)
-
-            # Save back to CSV
-            combined_df.to_csv(csv_file, index=False)
-
-            # Update last_timestamp
-            last_timestamp = combined_df['Timestamp'].max()
-            print(f"Appended {len(new_data)} new records to {csv_file}")
-
-        else:
-            print("No new data downloaded.")
-
-        # After initial run, only fetch and append the latest minute data
+        # Windows already downloaded by an interrupted backfill are kept there
+        checkpoint_dir = os.path.splitext(csv_file)[0] + '_backfill'
+        budget = RequestBudget()
+        print(f"{budget.remaining()} API requests left this month.")
+        last_timestamp = backfill(csv_file, api_key, last_timestamp, checkpoint_dir, budget)
+
+        # After initial run, only fetch and append the latest minute data,
+        # at the start of every minute once the vendor published it
+        scheduler = MinuteScheduler(SETTLEMENT_SECONDS, os.path.splitext(csv_file)[0] + '_latency.csv')
         while True:
             try:
-                new_data = fetch_latest_data(api_key)
+                # Candles per request from the budget left, the API is only
+                # called once that many minutes are missing
+                batch = budget.batch_size()
+                now_ts = int((datetime.now(timezone.utc) - timedelta(minutes=1)).timestamp())
+                missing = (now_ts - last_timestamp) // 60
+                if missing > WINDOW_MINUTES - 1:
+                    # More than one request holds (the machine slept, the API
+                    # was down): windows of the backfill
+                    last_timestamp = backfill(csv_file, api_key, last_timestamp, checkpoint_dir, budget)
+                    new_data = None
+                elif missing < batch:
+                    new_data = None
+                    if batch > 1:
+                        print(f"Batching {batch} minutes per request, {missing} waiting.")
+                    else:
+                        print("No new data available yet.")
+                else:
+                    # One more than missing covers a late minute too
+                    new_data = fetch_latest_data(api_key, missing, budget)
                 if new_data is not None and not new_data.empty:
                     # Check if new_data timestamp is greater than last_timestamp
-                    new_timestamp = new_data['time'].iloc[0]
+                    # (the request returns the previous minute too)
+                    new_timestamp = int(new_data['time'].max())
                     if new_timestamp > last_timestamp:
-                        # Process new data
-                        new_data['Timestamp'] = new_data['time']
-                        new_data.rename(columns={
-                            'open': 'Open',
-                            'high': 'High',
-                            'low': 'Low',
-                            'close': 'Close',
-                            'volumefrom': 'Volume'
-                        }, inplace=True)
-                        new_data = new_data[['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume']]
-
                         # Append new data to CSV file
-                        new_data.to_csv(csv_file, mode='a', header=False, index=False)
+                        append_rows(csv_file, to_rows(new_data), last_timestamp)
 
                         # Update last_timestamp
                         last_timestamp = new_timestamp
-                        print(f"Appended new record to {csv_file} at {datetime.fromtimestamp(new_timestamp, timezone.utc)}")
+                        save_watermark(csv_file, last_timestamp)
+                        # From the close of the minute to the row on disk
+                        latency = scheduler.record_latency(new_timestamp + 60)
+                        print(f"Appended new record to {csv_file} at {datetime.fromtimestamp(new_timestamp, timezone.utc)} ({latency:.2f}s after close)")
                     else:
                         print("No new data available yet.")
-                else:
+                elif batch <= missing <= WINDOW_MINUTES - 1:
                     print("No new data downloaded.")
 
-                # Wait until the start of the next minute
+                # Wait until the start of the next minute (missed minutes are
+                # in the next request, it asks for all the missing ones)
                 print("Waiting for the next minute...")
-                now = datetime.now(timezone.utc)
-                sleep_seconds = 60 - now.second
-                time.sleep(sleep_seconds)
+                scheduler.wait()
 
             except KeyboardInterrupt:
                 print("Script terminated by user.")
                 break
             except Exception as e:
                 print(f"An error occurred: {e}")
-                print("Waiting for 60 seconds before retrying...")
-                time.sleep(60)
+                print("Waiting for the next minute before retrying...")
+                scheduler.wait()
 
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -235,12 +587,22 @@ def read_api_key(file_path='apikey.txt'):
         return None
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CryptoCompare BTC 1 minute fetcher")
+    parser.add_argument('--base-url', default=API_URL, help="API root, e.g. a local histominute_server.py")
+    parser.add_argument('--csv', default="PriceData\\BTCUSD_data.csv", help="BTC CSV file to update")
+    args = parser.parse_args()
+
     api_key = read_api_key()
     if api_key is None:
-        print("Failed to load API key. Exiting...")
-        exit(1)
-        
-    csv_file = "PriceData\\BTCUSD_data.csv"
+        if args.base_url == API_URL:
+            print("Failed to load API key. Exiting...")
+            exit(1)
+        # A local stand-in does not check the key
+        api_key = 'local'
+    if args.base_url != API_URL:
+        print(f"Using the API at {args.base_url}")
+        set_base_url(args.base_url)
+
+    csv_file = args.csv
     print("Starting BTC data update script...")
     main(csv_file, api_key)
-
@@ -0,0 +1,232 @@
+"""
+Streaming ingestion of the BTC minute bars, an alternative to the polling of
+criptocompare_BTC_1m.py writing the same BTCUSD_data.csv.
+
+The trades of the CryptoCompare websocket (SUBSCRIPTIONS) are aggregated in
+1 minute OHLCV bars, each bar is appended as soon as its minute closes
+(CLOSE_GRACE_SECONDS after the boundary for the last trades to arrive). The
+REST API is only the fallback: at start and after every disconnection the
+missing minutes are backfilled with download_missing_data, and so is the
+minute the stream joined in the middle of. Minutes without trades repeat the
+last close with no volume, like the histominute candles.
+
+The bars are built from the trades of the subscribed exchanges, not from the
+CryptoCompare aggregate index the REST candles come from, so prices can differ
+slightly between the two sources.
+
+    python trade_replay_server.py --port 8766
+    python criptocompare_BTC_stream.py --stream-url ws://127.0.0.1:8766 --base-url http://127.0.0.1:8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import websockets
+
+import criptocompare_BTC_1m as rest
+from minute_scheduler import MinuteScheduler
+
+STREAM_URL = 'wss://streamer.cryptocompare.com/v2'
+# Trade channels of the bars (0~exchange~from~to)
+SUBSCRIPTIONS = ['0~Coinbase~BTC~USD', '0~Bitstamp~BTC~USD', '0~Kraken~BTC~USD']
+# Seconds after the minute boundary before closing the bar of the minute
+CLOSE_GRACE_SECONDS = 1
+# Seconds before reconnecting, doubled after each failed connection
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+
+
+class MinuteBars:
+    """
+    Minute bars (Timestamp, Open, High, Low, Close, Volume) of the trades
+    received from start on (the first minute fully covered by the stream).
+    """
+    def __init__(self, start, last_close=None):
+        self.start = start
+        self.last_close = last_close
+        # minute (unix seconds): [open, high, low, close, volume]
+        self.bars = {}
+
+    def add_trade(self, ts, price, quantity):
+        minute = int(ts) // 60 * 60
+        if minute < self.start:
+            # Before the stream covered whole minutes, or a late trade of a
+            # minute already closed
+            return False
+        bar = self.bars.get(minute)
+        if bar is None:
+            self.bars[minute] = [price, price, price, price, quantity]
+        else:
+            bar[1] = max(bar[1], price)
+            bar[2] = min(bar[2], price)
+            bar[3] = price
+            bar[4] += quantity
+        return True
+
+    def close_until(self, boundary):
+        """
+        Closes the minutes before boundary and returns their rows as a
+        DataFrame, or None if a minute without trades has no close to repeat.
+        """
+        rows = []
+        for minute in range(self.start, boundary, 60):
+            bar = self.bars.pop(minute, None)
+            if bar is None:
+                if self.last_close is None:
+                    return None
+                bar = [self.last_close] * 4 + [0.0]
+            self.last_close = bar[3]
+            rows.append([minute] + bar)
+        self.start = max(self.start, boundary)
+        return pd.DataFrame(rows, columns=['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
+
+
+class StreamFetcher:
+    def __init__(self, csv_file, api_key, stream_url=STREAM_URL, subscriptions=SUBSCRIPTIONS, record_file=None):
+        self.csv_file = csv_file
+        # Trades received are saved there (TS, P, Q) for trade_replay_server.py
+        self.record_file = record_file
+        self.api_key = api_key
+        self.stream_url = stream_url
+        self.subscriptions = subscriptions
+        self.checkpoint_dir = os.path.splitext(csv_file)[0] + '_backfill'
+        self.budget = rest.RequestBudget()
+        self.scheduler = MinuteScheduler(CLOSE_GRACE_SECONDS, os.path.splitext(csv_file)[0] + '_latency.csv')
+        self.last_timestamp = rest.get_last_timestamp(csv_file)
+        self.last_close = None
+        self.bars = None
+        # Future of the REST catch-up running in the executor
+        self.catching_up = None
+
+    def write(self, rows, source):
+        # Appends rows newer than the file, moves the watermark
+        appended = rest.append_rows(self.csv_file, rows, self.last_timestamp)
+        if appended:
+            self.last_timestamp = max(self.last_timestamp, int(rows['Timestamp'].max()))
+            self.last_close = float(rows.sort_values('Timestamp')['Close'].iloc[-1])
+            rest.save_watermark(self.csv_file, self.last_timestamp)
+            latency = self.scheduler.record_latency(self.last_timestamp + 60)
+            print(f"Appended {appended} record(s) from the {source} up to "
+                  f"{datetime.fromtimestamp(self.last_timestamp, timezone.utc)} ({latency:.2f}s after close)")
+        return appended
+
+    def rest_catch_up(self):
+        # REST backfill of the closed minutes missing from the file
+        new_data = rest.download_missing_data(self.api_key, self.last_timestamp, self.checkpoint_dir, self.budget)
+        if new_data is not None and not new_data.empty:
+            self.write(rest.to_rows(new_data), 'REST backfill')
+        # Windows after a failed one stay for the next catch-up
+        rest.clear_checkpoint(self.checkpoint_dir, self.last_timestamp)
+
+    async def catch_up(self):
+        # One REST catch-up at a time: cancelling close_minutes does not stop
+        # the one running in its thread, the next one waits for it to finish
+        while self.catching_up is not None and not self.catching_up.done():
+            await asyncio.wait([self.catching_up])
+        self.catching_up = asyncio.get_running_loop().run_in_executor(None, self.rest_catch_up)
+        await asyncio.shield(self.catching_up)
+
+    async def close_minutes(self):
+        # At every minute close: bar of the stream, or REST for the minutes
+        # it does not cover
+        while True:
+            tick = await self.scheduler.wait_async()
+            boundary = tick['minute']
+            rows = None
+            if self.last_timestamp + 60 >= self.bars.start:
+                if self.bars.last_close is None:
+                    self.bars.last_close = self.last_close
+                rows = self.bars.close_until(boundary)
+            if rows is None:
+                await self.catch_up()
+                self.bars.start = max(self.bars.start, self.last_timestamp + 60)
+                self.bars.last_close = self.last_close
+                # Bars of the minutes the REST API wrote are not needed
+                self.bars.bars = {minute: bar for minute, bar in self.bars.bars.items() if minute >= self.bars.start}
+            elif not rows.empty:
+                self.write(rows, 'stream')
+            print("Waiting for the next minute...")
+
+    def open_record(self):
+        # Record file of a connection, opened once and closed on disconnection
+        if not self.record_file:
+            return None
+        new_file = not os.path.exists(self.record_file)
+        record = open(self.record_file, 'a')
+        if new_file:
+            record.write('TS,P,Q\n')
+        return record
+
+    async def read_trades(self, websocket, record=None):
+        async for message in websocket:
+            data = json.loads(message)
+            kind = data.get('TYPE')
+            if kind == '0':
+                self.bars.add_trade(data['TS'], float(data['P']), float(data['Q']))
+                if record is not None:
+                    record.write(f"{data['TS']},{data['P']},{data['Q']}\n")
+            elif kind in ('20', '16', '999'):
+                # Welcome, subscription done, heartbeat
+                continue
+            else:
+                print(f"Stream message: {data}")
+
+    async def run(self):
+        delay = RECONNECT_DELAY
+        while True:
+            # Minutes missed while disconnected
+            await self.catch_up()
+            try:
+                async with websockets.connect(f'{self.stream_url}?api_key={self.api_key}') as websocket:
+                    await websocket.send(json.dumps({'action': 'SubAdd', 'subs': self.subscriptions}))
+                    # The minute in progress is partial, the stream covers
+                    # the next ones
+                    start = (int(time.time()) // 60 + 1) * 60
+                    self.bars = MinuteBars(start, self.last_close)
+                    print(f"Streaming {', '.join(self.subscriptions)} from {datetime.fromtimestamp(start, timezone.utc)}")
+                    delay = RECONNECT_DELAY
+                    closer = asyncio.create_task(self.close_minutes())
+                    record = self.open_record()
+                    try:
+                        await self.read_trades(websocket, record)
+                    finally:
+                        closer.cancel()
+                        if record is not None:
+                            record.close()
+                print("Stream closed by the server.")
+            except (OSError, websockets.exceptions.WebSocketException) as e:
+                print(f"Stream disconnected: {e}")
+            print(f"Reconnecting in {delay}s, the REST API fills the gap...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CryptoCompare BTC 1 minute bars from the trade stream")
+    parser.add_argument('--stream-url', default=STREAM_URL, help="websocket URL, e.g. a local trade_replay_server.py")
+    parser.add_argument('--base-url', default=rest.API_URL, help="REST API root for the backfills")
+    parser.add_argument('--csv', default="PriceData\\BTCUSD_data.csv", help="BTC CSV file to update")
+    parser.add_argument('--record', help="CSV file to save the trades received to")
+    args = parser.parse_args()
+
+    api_key = rest.read_api_key()
+    if api_key is None:
+        if args.stream_url == STREAM_URL:
+            print("Failed to load API key. Exiting...")
+            exit(1)
+        api_key = 'local'
+    if args.base_url != rest.API_URL:
+        rest.set_base_url(args.base_url)
+    if not os.path.exists(args.csv) or rest.get_last_timestamp(args.csv) is None:
+        print(f"No valid timestamp found in {args.csv}.")
+        exit(1)
+
+    print("Starting BTC streaming script...")
+    try:
+        asyncio.run(StreamFetcher(args.csv, api_key, args.stream_url, record_file=args.record).run())
+    except KeyboardInterrupt:
+        print("Script terminated by user.")
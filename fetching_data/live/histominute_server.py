@@ -0,0 +1,205 @@
+"""
+Local stand-in for the CryptoCompare histominute API (data/v2/histominute),
+to run criptocompare_BTC_1m.py without the real API and an API key.
+
+It answers the requests of download_missing_data and fetch_latest_data with
+synthetic candles (a deterministic price path, the same for every run) or
+with candles recorded in a BTCUSD_data.csv file, and can inject latency,
+server errors, duplicated candles and rate-limit responses. /stats returns the
+request counters.
+
+    python histominute_server.py --port 8765 --latency 0.2 --error-rate 0.05
+    python criptocompare_BTC_1m.py --base-url http://127.0.0.1:8765
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+MAX_LIMIT = 2000
+RATE_LIMIT_MESSAGE = 'You are over your rate limit please upgrade your account!'
+
+
+class SyntheticCandles:
+    """
+    Candles of a deterministic price path: the price of a minute only depends
+    on the seed and the minute, so any range can be served in any order with
+    the same values. Each candle opens at the close of the minute before.
+    """
+    def __init__(self, seed=0, start_price=30000.0):
+        self.seed = seed
+        self.start_price = start_price
+
+    def _noise(self, minutes):
+        # Hash of (seed, minute) in -0.5..0.5
+        return ((minutes * 2654435761 + self.seed * 97) % 1000003) / 1000003.0 - 0.5
+
+    def _price(self, minutes):
+        # Daily swing of +-5% and a minute noise of +-0.1%
+        return self.start_price * (1 + np.sin(minutes / 1440.0 + self.seed) * 0.05 + self._noise(minutes) * 0.002)
+
+    def candles(self, first, last):
+        # Unix times (seconds) of the minutes first..last, both included
+        times = np.arange(first, last + 1, 60, dtype=np.int64)
+        minutes = times // 60
+        open_ = self._price(minutes - 1)
+        close = self._price(minutes)
+        spread = np.abs(self._noise(minutes)) * self.start_price * 0.001
+        volume = np.abs(self._noise(minutes)) * 20
+        return pd.DataFrame({'time': times, 'open': open_, 'high': np.maximum(open_, close) + spread,
+                             'low': np.minimum(open_, close) - spread, 'close': close,
+                             'volumefrom': volume, 'volumeto': volume * close})
+
+
+class RecordedCandles:
+    # Candles of a BTCUSD_data.csv file (Timestamp, Open, High, Low, Close, Volume)
+    def __init__(self, csv_file):
+        df = pd.read_csv(csv_file).drop_duplicates(subset=['Timestamp']).sort_values('Timestamp')
+        self.df = pd.DataFrame({
+            'time': df['Timestamp'].astype(np.int64).to_numpy(),
+            'open': df['Open'].to_numpy(),
+            'high': df['High'].to_numpy(),
+            'low': df['Low'].to_numpy(),
+            'close': df['Close'].to_numpy(),
+            'volumefrom': df['Volume'].to_numpy(),
+            'volumeto': (df['Volume'] * df['Close']).to_numpy()
+        })
+
+    def candles(self, first, last):
+        times = self.df['time'].to_numpy()
+        lo, hi = np.searchsorted(times, [first, last + 1])
+        return self.df.iloc[lo:hi]
+
+
+def make_handler(source, latency=0.0, jitter=0.0, error_rate=0.0, duplicate_rate=0.0, rate_limit=None):
+    """
+    Request handler class serving source. rate_limit: requests allowed per
+    second, the ones over it get the API's rate-limit error.
+    """
+    stats = {'requests': 0, 'served': 0, 'errors': 0, 'rate_limited': 0, 'candles': 0, 'duplicates': 0}
+    lock = threading.Lock()
+    recent = deque()
+
+    class HistominuteHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/stats':
+                with lock:
+                    self._send(200, dict(stats))
+                return
+            if url.path != '/data/v2/histominute':
+                self._send(404, {'Response': 'Error', 'Message': f'Unknown path {url.path}'})
+                return
+
+            with lock:
+                stats['requests'] += 1
+                now = time.monotonic()
+                while recent and now - recent[0] > 1:
+                    recent.popleft()
+                limited = rate_limit is not None and len(recent) >= rate_limit
+                if not limited:
+                    recent.append(now)
+            if latency or jitter:
+                time.sleep(latency + random.random() * jitter)
+            if limited:
+                with lock:
+                    stats['rate_limited'] += 1
+                self._send(429, {'Response': 'Error', 'Message': RATE_LIMIT_MESSAGE, 'Type': 99, 'Data': {}})
+                return
+            if random.random() < error_rate:
+                with lock:
+                    stats['errors'] += 1
+                self._send(500, {'Response': 'Error', 'Message': 'Injected server error'})
+                return
+
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            try:
+                limit = int(params.get('limit', 1440))
+                to_ts = int(params.get('toTs', time.time()))
+            except ValueError:
+                self._send(200, {'Response': 'Error', 'Message': 'limit and toTs must be integers', 'Type': 2})
+                return
+            if not 0 < limit <= MAX_LIMIT:
+                self._send(200, {'Response': 'Error', 'Message': f'limit param is not valid, it must be between 1 and {MAX_LIMIT}', 'Type': 2})
+                return
+            # Candles end at the minute of toTs, never after the current one
+            last = min(to_ts, int(time.time())) // 60 * 60
+            first = last - limit * 60
+            df = source.candles(first, last)
+            records = df.to_dict('records')
+            duplicates = [record for record in records if random.random() < duplicate_rate]
+            records = sorted(records + duplicates, key=lambda record: record['time'])
+            for record in records:
+                record['conversionType'] = 'direct'
+                record['conversionSymbol'] = ''
+            with lock:
+                stats['served'] += 1
+                stats['candles'] += len(records)
+                stats['duplicates'] += len(duplicates)
+            self._send(200, {
+                'Response': 'Success',
+                'Message': '',
+                'HasWarning': False,
+                'Type': 100,
+                'RateLimit': {},
+                'Data': {'Aggregated': False, 'TimeFrom': first, 'TimeTo': last, 'Data': records}
+            })
+
+    HistominuteHandler.stats = stats
+    return HistominuteHandler
+
+
+def start_server(source, host='127.0.0.1', port=0, **options):
+    """
+    Serves source in a background thread (port 0: any free port). Returns the
+    server, its URL is f'http://{host}:{server.server_port}'.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(source, **options))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local CryptoCompare histominute stand-in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--recorded', help="BTCUSD_data.csv file to serve instead of synthetic candles")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic candles")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random seconds added on top of the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help="share of candles sent twice")
+    parser.add_argument('--rate-limit', type=int, help="requests per second before rate-limit responses")
+    args = parser.parse_args()
+
+    source = RecordedCandles(args.recorded) if args.recorded else SyntheticCandles(args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(
+        source, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        duplicate_rate=args.duplicate_rate, rate_limit=args.rate_limit
+    ))
+    print(f"Serving histominute on http://{args.host}:{server.server_port}/data/v2/histominute")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Stopped by user. {json.dumps(server.RequestHandlerClass.stats)}")
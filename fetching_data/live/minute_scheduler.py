@@ -0,0 +1,110 @@
+"""
+Minute-aligned scheduler shared by the live fetchers.
+
+wait() returns at the start of every minute plus a settlement offset (the
+seconds the vendor needs to publish the minute that just closed), whatever
+the time spent working since the last tick: the deadline is the next minute
+boundary of the wall clock turned into a time.monotonic() deadline, so the
+sleep neither drifts nor suffers from clock adjustments while waiting. Ticks
+skipped because the work took longer than a minute are reported, the caller
+catches up once for all of them.
+
+record_latency() logs the seconds between the close of a minute and the time
+its row was persisted.
+
+    scheduler = MinuteScheduler(offset=2, latency_file='latency.csv')
+    while True:
+        tick = scheduler.wait()
+        ...fetch and write the minute that closed at tick['minute']...
+        scheduler.record_latency(tick['minute'])
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+
+class MinuteScheduler:
+    def __init__(self, offset=0.0, latency_file=None):
+        # offset: seconds after the minute boundary to fire at
+        self.offset = offset
+        self.latency_file = latency_file
+        # Last minute boundary fired (unix seconds)
+        self.last_minute = None
+        self.latencies = []
+
+    def _current_minute(self):
+        # Last minute boundary whose offset has passed
+        return int((time.time() - self.offset) // 60 * 60)
+
+    def _plan(self):
+        # (minute boundary of the next tick, seconds until it fires)
+        minute = self._current_minute()
+        if self.last_minute is None or minute <= self.last_minute:
+            return minute + 60, (minute + 60 + self.offset) - time.time()
+        # The work overran the tick, it fires now
+        return minute, 0.0
+
+    def _fire(self, minute):
+        minute = max(minute, self._current_minute())
+        missed = []
+        if self.last_minute is not None:
+            missed = list(range(self.last_minute + 60, minute, 60))
+        self.last_minute = minute
+        late = time.time() - (minute + self.offset)
+        if missed:
+            print(f"Missed {len(missed)} minute(s) since {datetime.fromtimestamp(missed[0] - 60, timezone.utc)}, catching up.")
+        return {'minute': minute, 'missed': missed, 'late': late}
+
+    def wait(self):
+        """
+        Sleeps until the next minute boundary plus the offset. Returns
+        {'minute': boundary (unix seconds), 'missed': boundaries skipped since
+        the last tick, 'late': seconds after the planned time}.
+        """
+        minute, delay = self._plan()
+        # The wall clock deadline as a monotonic one
+        deadline = time.monotonic() + delay
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, 1.0))
+        return self._fire(minute)
+
+    async def wait_async(self):
+        # wait() for asyncio code, the event loop keeps running meanwhile
+        minute, delay = self._plan()
+        deadline = time.monotonic() + delay
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, 1.0))
+        return self._fire(minute)
+
+    def record_latency(self, minute_close, persisted_at=None):
+        """
+        Seconds from minute_close (unix seconds, the end of the minute) to
+        persisted_at (now by default), appended to the latency file.
+        """
+        if persisted_at is None:
+            persisted_at = time.time()
+        latency = persisted_at - minute_close
+        self.latencies.append(latency)
+        # The last day of measures is enough for the summary
+        del self.latencies[:-1440]
+        if self.latency_file:
+            new_file = not os.path.exists(self.latency_file)
+            with open(self.latency_file, 'a') as f:
+                if new_file:
+                    f.write('minute_close,persisted_at,latency\n')
+                f.write(f'{int(minute_close)},{persisted_at:.3f},{latency:.3f}\n')
+        return latency
+
+    def latency_summary(self):
+        # (last, median, max) of the recorded latencies, None if there is none
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return self.latencies[-1], ordered[len(ordered) // 2], ordered[-1]
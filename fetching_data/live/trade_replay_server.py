@@ -0,0 +1,99 @@
+"""
+Local stand-in for the CryptoCompare trade stream, to run
+criptocompare_BTC_stream.py without the real websocket.
+
+Every client gets the welcome message, a SUBSCRIBECOMPLETE per channel of its
+SubAdd and then the trades: replayed from a recorded CSV file (TS, P, Q
+columns, the gaps between the trades kept and divided by --speed) or
+synthetic ones (--rate trades per second on the price path of
+histominute_server.SyntheticCandles). The trades are stamped with the current
+time, so the client sees them as live. --disconnect-after closes the
+connection to exercise the REST fallback.
+
+    python trade_replay_server.py --port 8766 --recorded trades.csv --disconnect-after 300
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+import pandas as pd
+import websockets
+
+from histominute_server import SyntheticCandles
+
+
+def recorded_trades(csv_file, speed):
+    # (seconds to wait, price, quantity) of the recorded trades, forever
+    df = pd.read_csv(csv_file).sort_values('TS')
+    gaps = np.diff(df['TS'].to_numpy(dtype=np.float64), prepend=df['TS'].iloc[0]) / speed
+    while True:
+        for gap, price, quantity in zip(gaps, df['P'], df['Q']):
+            yield gap, float(price), float(quantity)
+
+def synthetic_trades(rate, seed):
+    # Trades at random times around the synthetic price of the minute
+    source = SyntheticCandles(seed)
+    while True:
+        minute = int(time.time()) // 60 * 60
+        price = float(source.candles(minute, minute)['close'].iloc[0])
+        yield random.expovariate(rate), price * (1 + random.gauss(0, 0.0002)), random.expovariate(20.0)
+
+
+async def replay(websocket, trades, disconnect_after):
+    await websocket.send(json.dumps({'TYPE': '20', 'MESSAGE': 'STREAMERWELCOME'}))
+    request = json.loads(await websocket.recv())
+    subscriptions = request.get('subs', [])
+    for sub in subscriptions:
+        await websocket.send(json.dumps({'TYPE': '16', 'MESSAGE': 'SUBSCRIBECOMPLETE', 'SUB': sub}))
+    market = subscriptions[0].split('~')[1] if subscriptions else 'Replay'
+
+    started = time.monotonic()
+    trade_id = 0
+    for gap, price, quantity in trades:
+        await asyncio.sleep(gap)
+        if disconnect_after is not None and time.monotonic() - started > disconnect_after:
+            print("Disconnecting the client.")
+            await websocket.close()
+            return
+        trade_id += 1
+        await websocket.send(json.dumps({
+            'TYPE': '0', 'M': market, 'FSYM': 'BTC', 'TSYM': 'USD', 'F': '1', 'ID': str(trade_id),
+            'TS': int(time.time()), 'Q': quantity, 'P': price, 'TOTAL': price * quantity
+        }))
+
+
+async def serve(host, port, make_trades, disconnect_after):
+    async def handler(websocket):
+        print("Client connected.")
+        try:
+            await replay(websocket, make_trades(), disconnect_after)
+        except websockets.exceptions.ConnectionClosed:
+            print("Client disconnected.")
+
+    async with websockets.serve(handler, host, port):
+        print(f"Streaming trades on ws://{host}:{port}")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local CryptoCompare trade stream stand-in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--recorded', help="CSV file of trades (TS, P, Q) to replay")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed of the recorded trades")
+    parser.add_argument('--rate', type=float, default=5.0, help="synthetic trades per second")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic prices")
+    parser.add_argument('--disconnect-after', type=float, help="seconds before closing each connection")
+    args = parser.parse_args()
+
+    if args.recorded:
+        make_trades = lambda: recorded_trades(args.recorded, args.speed)
+    else:
+        make_trades = lambda: synthetic_trades(args.rate, args.seed)
+    try:
+        asyncio.run(serve(args.host, args.port, make_trades, args.disconnect_after))
+    except KeyboardInterrupt:
+        print("Stopped by user.")
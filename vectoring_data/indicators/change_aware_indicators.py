@@ -0,0 +1,85 @@
+"""
+Change-aware mode of the chunked indicators for the forward-filled 1 minute
+files.
+
+The 1 minute files of DXY, GOLD, NDQ, SPX, VIX, US02Y and US10Y are mostly
+minutes repeating the last price (nights, weekends and the gaps filled by
+processer.py and sync_missing_data). Two things are saved on them:
+
+- the resumable kernels of the chunked mode run with skip_runs
+  (indicator_kernels.py): inside a run of repeated inputs, as soon as one
+  more row leaves a kernel state as it was (the window is inside the run, the
+  EMA converged on the run value, a cumulative sum adds zeros, the AVWAP loop
+  is at a fixed point) the rest of the run gets the same output and only the
+  row counters of the state jump to its end;
+- write_block formats a value only where its column changes: most of the
+  cells of a run repeat the row above, their text is reused, and so is the
+  whole line when no column moved. Writing the CSV is most of the time of a
+  run (the kernels are a few percent of it).
+
+Nothing is approximated: a row is only skipped when computing it would give
+the same state and output bits, and a cell is only reused when its value has
+the same bits, so the output file is byte-identical to the one of the chunked
+and whole-file modes. The kernels whose state keeps moving inside a run are
+computed row by row there (the RSI averages decay by (1 - alpha) per
+unchanged minute until they underflow, the StochRSI and the AVWAP follow the
+RSI); advancing them in closed form would change the last bits of the RSI.
+"""
+import os
+
+import numpy as np
+
+
+def unchanged_minutes(df):
+    # Minutes repeating the previous close with no volume (forward-filled)
+    close = df['Close'].to_numpy()
+    flat = np.zeros(len(df), dtype=bool)
+    flat[1:] = close[1:] == close[:-1]
+    for column in ('Open', 'High', 'Low'):
+        flat &= df[column].to_numpy() == close
+    if 'Volume' in df.columns:
+        flat &= df['Volume'].to_numpy() == 0
+    return flat
+
+
+def _changed(values):
+    # Rows whose value has other bits than the row above (the first row too)
+    bits = values.view(np.int64)
+    changed = np.ones(len(values), dtype=bool)
+    changed[1:] = bits[1:] != bits[:-1]
+    return changed
+
+def _cells(values, changed):
+    # Text of every cell as to_csv writes it, formatting only the changed rows
+    # and repeating it down to the next change
+    text = values[changed].astype(str).astype(object)
+    if values.dtype.kind == 'f':
+        text[np.isnan(values[changed])] = ''
+    return text[np.cumsum(changed) - 1]
+
+def write_block(block, path, first, date_format):
+    """
+    Writes block (the time in its first column, numbers in the others) as
+    block.to_csv(path, mode='w' if first else 'a', header=first, index=False,
+    date_format=date_format) would, byte for byte.
+    """
+    columns = list(block.columns)
+    numbers = [block[column].to_numpy() for column in columns[1:]]
+    if not numbers or not all(values.dtype.kind in 'fi' and values.dtype.itemsize == 8 for values in numbers):
+        block.to_csv(path, mode='w' if first else 'a', header=first, index=False, date_format=date_format)
+        return
+    if first:
+        block.iloc[:0].to_csv(path, mode='w', index=False)
+    if block.empty:
+        return
+
+    times = block[columns[0]].dt.strftime(date_format or '%Y-%m-%d').fillna('').to_numpy(dtype=object)
+    changes = [_changed(values) for values in numbers]
+    cells = [_cells(values, changed) for values, changed in zip(numbers, changes)]
+    # A line without any changed cell repeats the one above after its time
+    moved = np.logical_or.reduce(changes)
+    rows = zip(*[text[moved].tolist() for text in cells])
+    bodies = np.array([','.join(row) for row in rows], dtype=object)[np.cumsum(moved) - 1]
+    lines = times + ',' + bodies
+    with open(path, 'a', newline='') as f:
+        f.write(os.linesep.join(lines.tolist()) + os.linesep)
@@ -0,0 +1,591 @@
+"""
+Chunked (out-of-core) mode for calculate_indicators.
+
+The input CSV is streamed in time-ordered blocks of chunk_rows rows and the
+output is appended block by block, so memory is bounded by the block size no
+matter how many years of minutes the file holds. Every node of the indicator
+graph has a streaming twin that carries its state across blocks (rolling
+accumulators and the last `window` values, EWM weights, running sums, the
+AVWAP loop state) using the kernels in indicator_kernels.py, which reproduce
+the pandas arithmetic: the output file is byte-identical to the one written
+by calculate_indicators on the whole file (pandas_ta pandas code paths, not
+TA-Lib).
+
+Global properties of the whole file are collected by extra streaming passes
+before the main one: row count, dtypes and volume availability (they decide
+which features run), and whether non_zero_range() has to add epsilon to the
+high-low range or to the StochRSI range.
+
+With a cache (indicator_cache.py), the outputs with a cached prefix restart
+from the node states stored after it and only the rows after it are
+computed, the prefix columns are read back from the cache.
+
+With change_aware, the kernels skip the rows of a run of repeated inputs
+where their state no longer moves and only the cells that change are
+formatted (change_aware_indicators.py), for the forward-filled 1 minute files
+of the tickers; the output is the same.
+"""
+import copy
+import os
+import time
+from sys import float_info as sflt
+
+import numpy as np
+import pandas as pd
+
+from indicator_graph import spec_for_file, compile_graph, subset_plan
+from indicator_cache import watermark, as_result, as_columns
+from change_aware_indicators import unchanged_minutes, write_block
+from indicator_kernels import (
+    avwap_initial_state,
+    compute_avwap_stream,
+    cumsum_stream,
+    ewm_mean_stream,
+    group_cumsum_stream,
+    rolling_mean_stream,
+    rolling_sum_stream,
+    rolling_var_stream,
+)
+
+
+# ---------------------------------------------------------------------------
+# Resumable building blocks (state is a dict owned by the node, its
+# 'skip_runs' is the change-aware mode of the kernels)
+# ---------------------------------------------------------------------------
+
+def _values(series):
+    return np.ascontiguousarray(series.to_numpy(dtype=np.float64))
+
+def _rolling_mean(state, key, series, window):
+    if key not in state:
+        state[key] = (np.zeros(window), np.zeros(4), np.zeros(4, np.int64))
+    return pd.Series(rolling_mean_stream(_values(series), window, window, *state[key], state['skip_runs']),
+                     index=series.index)
+
+def _rolling_sum(state, key, series, window):
+    if key not in state:
+        state[key] = (np.zeros(window), np.zeros(4), np.zeros(3, np.int64))
+    return pd.Series(rolling_sum_stream(_values(series), window, window, *state[key], state['skip_runs']),
+                     index=series.index)
+
+def _rolling_std(state, key, series, window):
+    if key not in state:
+        state[key] = (np.zeros(window), np.zeros(6), np.zeros(2, np.int64))
+    var = rolling_var_stream(_values(series), window, window, 1, *state[key], state['skip_runs'])
+    # zsqrt, as pandas does for rolling std
+    with np.errstate(all='ignore'):
+        std = np.sqrt(var)
+    std[var < 0] = 0
+    return pd.Series(std, index=series.index)
+
+def _rolling_extreme(state, key, series, window, is_max):
+    # Min/max involve no arithmetic, the last window - 1 rows are enough
+    tail = state.get(key)
+    joined = series if tail is None else pd.concat([tail, series])
+    rolling = joined.rolling(window=window)
+    result = rolling.max() if is_max else rolling.min()
+    state[key] = joined.iloc[len(joined) - min(window - 1, len(joined)):]
+    return result.iloc[len(joined) - len(series):]
+
+def _ewm(state, key, series, com, adjust, minp):
+    if key not in state:
+        state[key] = (np.zeros(2), np.zeros(2, np.int64))
+    return pd.Series(ewm_mean_stream(_values(series), com, adjust, minp, *state[key], state['skip_runs']),
+                     index=series.index)
+
+def _cumsum(state, key, series):
+    if key not in state:
+        state[key] = (np.zeros(1), np.zeros(1, np.int64))
+    return pd.Series(cumsum_stream(_values(series), *state[key], state['skip_runs']), index=series.index)
+
+def _group_cumsum(state, key, series, labels):
+    # groupby(labels).cumsum(), the running sum of each group survives the block
+    groups = state.setdefault(key, {})
+    ordinals, codes = np.unique(labels, return_inverse=True)
+    accum = np.array([groups.get(o, (0.0, 0.0))[0] for o in ordinals])
+    compensation = np.array([groups.get(o, (0.0, 0.0))[1] for o in ordinals])
+    out = group_cumsum_stream(_values(series), codes.astype(np.int64), accum, compensation)
+    for i, o in enumerate(ordinals):
+        groups[o] = (accum[i], compensation[i])
+    return pd.Series(out, index=series.index)
+
+def _previous(state, key, series):
+    # series.shift(1) across block boundaries
+    shifted = series.shift(1)
+    if key in state:
+        shifted.iloc[0] = state[key]
+    state[key] = series.iloc[-1]
+    return shifted
+
+def _ta_ema(state, key, series, length, from_first_valid=False):
+    # ta.ema: the first `length` values are replaced by their mean (seed) then
+    # ewm(span=length, adjust=False). ta.macd feeds the signal EMA from the
+    # first valid MACD value, rows before that stay NaN.
+    st = state.setdefault(key, {'started': not from_first_valid, 'head': []})
+    values = series.copy()
+    if len(st['head']) < length:
+        for i in range(len(values)):
+            if not st['started']:
+                if values.iloc[i] == values.iloc[i]:
+                    st['started'] = True
+                else:
+                    continue
+            st['head'].append(values.iloc[i])
+            if len(st['head']) < length:
+                values.iloc[i] = np.nan
+            else:
+                values.iloc[i] = pd.Series(st['head'], dtype=np.float64).mean()
+                break
+    return _ewm(state, key + '_ewm', values, (length - 1) / 2.0, False, 0)
+
+def _non_zero(state, diff):
+    if state['zero_range']:
+        diff += sflt.epsilon
+    return diff
+
+
+# ---------------------------------------------------------------------------
+# Streaming nodes: same kinds and outputs as indicator_graph.NODES
+# stream(block, inputs, params, state)
+# ---------------------------------------------------------------------------
+
+def _s_sma(block, inputs, p, state):
+    return _rolling_mean(state, 'sma', block['Close'], p['length'])
+
+def _s_ema(block, inputs, p, state):
+    return _ta_ema(state, 'ema', block['Close'], p['length'])
+
+def _s_rsi(block, inputs, p, state):
+    close = block['Close']
+    negative = close - _previous(state, 'close', close)
+    positive = negative.copy()
+    positive[positive < 0] = 0
+    negative[negative > 0] = 0
+    com = 1.0 / (1.0 / p['length']) - 1.0
+    positive_avg = _ewm(state, 'positive', positive, com, True, p['length'])
+    negative_avg = _ewm(state, 'negative', negative, com, True, p['length'])
+    return 100.0 * positive_avg / (positive_avg + negative_avg.abs())
+
+def _s_macd(block, inputs, p, state):
+    fastma, slowma = inputs
+    macd = fastma - slowma
+    signalma = _ta_ema(state, 'signal', macd, p['signal'], from_first_valid=True)
+    histogram = macd - signalma
+    suffix = f"{p['fast']}_{p['slow']}_{p['signal']}"
+    return pd.DataFrame({
+        f'MACD_{suffix}': macd,
+        f'MACDh_{suffix}': histogram,
+        f'MACDs_{suffix}': signalma
+    })
+
+def _s_stochrsi(block, inputs, p, state):
+    rsi_ = inputs[0]
+    lowest_rsi = _rolling_extreme(state, 'lowest', rsi_, p['length'], False)
+    highest_rsi = _rolling_extreme(state, 'highest', rsi_, p['length'], True)
+    diff = highest_rsi - lowest_rsi
+    if state['scan']:
+        state['zero_range'] = state['zero_range'] or bool(diff.eq(0).any())
+        return None
+    state['zero_seen'] = state['zero_seen'] or bool(diff.eq(0).any())
+    stoch = 100 * (rsi_ - lowest_rsi)
+    stoch /= _non_zero(state, diff)
+    stochrsi_k = _rolling_mean(state, 'k', stoch, p['k'])
+    stochrsi_d = _rolling_mean(state, 'd', stochrsi_k, p['d'])
+    return pd.DataFrame({'k': stochrsi_k, 'd': stochrsi_d})
+
+def _s_hlc3(block, inputs, p, state):
+    return (block['High'] + block['Low'] + block['Close']) / 3.0
+
+def _s_hl_range(block, inputs, p, state):
+    diff = block['High'] - block['Low']
+    if state['scan']:
+        state['zero_range'] = state['zero_range'] or bool(diff.eq(0).any())
+        return None
+    state['zero_seen'] = state['zero_seen'] or bool(diff.eq(0).any())
+    return _non_zero(state, diff)
+
+def _s_log_returns(block, inputs, p, state):
+    close = block['Close']
+    return np.log(close / _previous(state, 'close', close))
+
+def _s_mf_volume(block, inputs, p, state):
+    ad = 2 * block['Close'] - (block['High'] + block['Low'])
+    ad *= block['Volume'] / inputs[0]
+    return ad
+
+def _s_vwap(block, inputs, p, state):
+    volume = block['Volume']
+    labels = block.index.to_period(p['anchor']).asi8
+    wp = inputs[0] * volume
+    vwap = _group_cumsum(state, 'wp', wp, labels)
+    vwap /= _group_cumsum(state, 'volume', volume, labels)
+    return vwap
+
+def _s_avwap(block, inputs, p, state):
+    stoch_rsi = inputs[0]
+    if 'carry' not in state:
+        state['carry'] = avwap_initial_state(float(block['High'].iloc[0]), float(block['Low'].iloc[0]))
+    hiAVWAP_arr, loAVWAP_arr, hiAVWAP_next_arr, loAVWAP_next_arr = compute_avwap_stream(
+        block['High'].values.astype(np.float64),
+        block['Low'].values.astype(np.float64),
+        block['Volume'].values.astype(np.float64),
+        stoch_rsi['k'].values.astype(np.float64),
+        stoch_rsi['d'].values.astype(np.float64),
+        block['Close'].values.astype(np.float64),
+        p['use_hilow'],
+        state['carry'],
+        float(p.get('lower_band', 20)),
+        float(p.get('upper_band', 80)),
+        state['skip_runs']
+    )
+    return pd.DataFrame({
+        'hiAVWAP': hiAVWAP_arr,
+        'loAVWAP': loAVWAP_arr,
+        'hiAVWAP_next': hiAVWAP_next_arr,
+        'loAVWAP_next': loAVWAP_next_arr
+    }, index=block.index)
+
+def _s_rolling_min(block, inputs, p, state):
+    return _rolling_extreme(state, 'low', block['Low'], p['window'], False)
+
+def _s_rolling_max(block, inputs, p, state):
+    return _rolling_extreme(state, 'high', block['High'], p['window'], True)
+
+def _s_rolling_std(block, inputs, p, state):
+    return _rolling_std(state, 'std', block['Close'], p['window'])
+
+def _s_volatility(block, inputs, p, state):
+    return _rolling_std(state, 'std', inputs[0], p['window']) * np.sqrt(p['periods_per_year'])
+
+def _s_obv(block, inputs, p, state):
+    # ta.obv: sign of the close change (the very first row counts as +1)
+    close = block['Close']
+    sign = close - _previous(state, 'close', close)
+    sign[sign > 0] = 1
+    sign[sign < 0] = -1
+    if not state.get('signed'):
+        sign.iloc[0] = 1
+        state['signed'] = True
+    return _cumsum(state, 'obv', sign * block['Volume'])
+
+def _s_accdist(block, inputs, p, state):
+    return _cumsum(state, 'ad', inputs[0])
+
+def _s_cmf(block, inputs, p, state):
+    length = p['length']
+    cmf = _rolling_sum(state, 'ad', inputs[0], length)
+    cmf /= _rolling_sum(state, 'volume', block['Volume'], length)
+    return cmf
+
+
+STREAM_NODES = {
+    'sma': _s_sma,
+    'ema': _s_ema,
+    'rsi': _s_rsi,
+    'macd': _s_macd,
+    'stochrsi': _s_stochrsi,
+    'hlc3': _s_hlc3,
+    'hl_range': _s_hl_range,
+    'log_returns': _s_log_returns,
+    'mf_volume': _s_mf_volume,
+    'vwap': _s_vwap,
+    'avwap': _s_avwap,
+    'rolling_min': _s_rolling_min,
+    'rolling_max': _s_rolling_max,
+    'rolling_std': _s_rolling_std,
+    'volatility': _s_volatility,
+    'obv': _s_obv,
+    'accdist': _s_accdist,
+    'cmf': _s_cmf,
+}
+
+# Nodes using non_zero_range(): they need a scan of the whole series first
+SCAN_NODES = {'stochrsi', 'hl_range'}
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+def _price_only(columns):
+    # The 1 minute files of the tickers only have a Price
+    return 'Price' in columns and not {'Open', 'High', 'Low', 'Close'}.intersection(columns)
+
+def _read_blocks(file_path, chunk_rows, time_col, dtypes=None):
+    for block in pd.read_csv(file_path, chunksize=chunk_rows, dtype=dtypes):
+        block[time_col] = pd.to_datetime(block[time_col])
+        if time_col != 'Formatted_Time':
+            block.rename(columns={time_col: 'Formatted_Time'}, inplace=True)
+        block.set_index('Formatted_Time', inplace=True)
+        if _price_only(block.columns):
+            price = block.pop('Price')
+            for i, column in enumerate(['Open', 'High', 'Low', 'Close']):
+                block.insert(i, column, price)
+        yield block
+
+def _scan_input(file_path, chunk_rows):
+    # First pass: everything the whole-file mode learns from the full DataFrame
+    columns = pd.read_csv(file_path, nrows=0).columns
+    if 'Formatted_Time' in columns:
+        time_col = 'Formatted_Time'
+    elif 'datetime' in columns:
+        time_col = 'datetime'
+    else:
+        print(f"Time column not found in {file_path}")
+        return None
+
+    n_rows = 0
+    volume_seen = False
+    dates_only = True
+    floats = set()
+    for block in pd.read_csv(file_path, chunksize=chunk_rows):
+        n_rows += len(block)
+        floats.update(col for col in block.columns if block[col].dtype == np.float64)
+        if 'Volume' in block.columns:
+            volume_seen = volume_seen or bool(block['Volume'].notnull().any())
+        times = pd.to_datetime(block[time_col])
+        dates_only = dates_only and bool((times == times.dt.normalize()).all())
+
+    # A column parsed as float anywhere is float in the whole-file read
+    dtypes = {col: np.float64 for col in floats if col != time_col}
+    if _price_only(columns):
+        columns = pd.Index(['Open', 'High', 'Low', 'Close'] + [col for col in columns if col != 'Price'])
+    return {
+        'time_col': time_col,
+        'columns': columns,
+        'n_rows': n_rows,
+        'has_volume': volume_seen,
+        'dtypes': dtypes,
+        'dates_only': dates_only,
+    }
+
+def _run_steps(block, steps, states):
+    results = {}
+    for key, kind, params, dep_keys in steps:
+        inputs = [results[dep] for dep in dep_keys]
+        results[key] = STREAM_NODES[kind](block, inputs, params, states[key])
+    return results
+
+def initial_states(steps, blocks, skip_runs=False):
+    # Empty states of the steps. If a step uses non_zero_range(), the steps it
+    # needs are run in scan mode over blocks() (a function returning the
+    # blocks) to know whether a zero range is seen anywhere
+    states = {key: {'scan': False, 'zero_range': False, 'zero_seen': False, 'skip_runs': skip_runs}
+              for key, _, _, _ in steps}
+    scan_keys = set()
+    for key, kind, params, dep_keys in reversed(steps):
+        if kind in SCAN_NODES or key in scan_keys:
+            scan_keys.add(key)
+            scan_keys.update(dep_keys)
+    if scan_keys:
+        scan_steps = [step for step in steps if step[0] in scan_keys]
+        scan_states = {key: {'scan': kind in SCAN_NODES, 'zero_range': False, 'zero_seen': False, 'skip_runs': skip_runs}
+                       for key, kind, _, _ in scan_steps}
+        for block in blocks():
+            _run_steps(block, scan_steps, scan_states)
+        for key, kind, _, _ in scan_steps:
+            if kind in SCAN_NODES:
+                states[key]['zero_range'] = scan_states[key]['zero_range']
+    return states
+
+def _drop_columns(src, dst, drop):
+    # The values are plain numbers and timestamps, no quoting involved
+    with open(src, 'r', newline='') as fin, open(dst, 'w', newline='') as fout:
+        header = fin.readline()
+        names = header.rstrip('\r\n').split(',')
+        keep = [i for i, name in enumerate(names) if name not in drop]
+        ending = header[len(header.rstrip('\r\n')):]
+        fout.write(','.join(names[i] for i in keep) + ending)
+        for line in fin:
+            fields = line.rstrip('\r\n').split(',')
+            fout.write(','.join(fields[i] for i in keep) + line[len(line.rstrip('\r\n')):])
+
+def _split_blocks(blocks, cuts):
+    # The blocks, also cut at the given row numbers
+    offset = 0
+    for block in blocks:
+        start = 0
+        for cut in sorted(c for c in cuts if offset < c < offset + len(block)):
+            yield block.iloc[start:cut - offset].copy()
+            start = cut - offset
+        yield block.iloc[start:].copy() if start else block
+        offset += len(block)
+
+def _resume_groups(plan, cache, file_path, cut, skip_runs):
+    # Outputs with a cached prefix, grouped by the run that computed it: each
+    # group restarts from the states stored after the prefix and only the
+    # rows after it are computed
+    groups = {}
+    for name, key in plan['outputs']:
+        hit = cache.get(file_path, key, mmap=True)
+        if hit is not None and hit['rows'] <= cut:
+            group = groups.setdefault((hit['rows'], hit['run']), {'start': hit['rows'], 'hits': {}, 'states': {}})
+            group['hits'][key] = hit['columns']
+            group['states'].update(hit['states'])
+    resumed = []
+    for group in groups.values():
+        group['keys'] = set(group['hits'])
+        group['steps'] = subset_plan(plan, group['keys'])['steps']
+        if all(key in group['states'] for key, _, _, _ in group['steps']):
+            for state in group['states'].values():
+                state['skip_runs'] = skip_runs
+            resumed.append(group)
+    return resumed
+
+def _main_pass(file_path, part_file, chunk_rows, meta, plan, groups, cache, cut, change_aware):
+    # Computes the groups block by block and writes the output. Returns
+    # ({column: has values}, unchanged rows, entries for the cache) where an
+    # entry is (key, columns, writers, states of its steps after the cut)
+    date_format = None if meta['dates_only'] else '%Y-%m-%d %H:%M:%S'
+    # Outputs whose cached prefix ends before the cut get a new entry
+    store = {key for group in groups if group['start'] < cut for key in group['keys']}
+    with_values = {}
+    unchanged = 0
+    writers = {}
+    snapshots = {}
+    first = True
+    offset = 0
+    blocks = _read_blocks(file_path, chunk_rows, meta['time_col'], meta['dtypes'])
+    try:
+        for block in _split_blocks(blocks, {group['start'] for group in groups} | {cut}):
+            if change_aware:
+                unchanged += int(unchanged_minutes(block).sum())
+            results = {}
+            for group in groups:
+                if offset >= group['start']:
+                    computed = _run_steps(block, group['steps'], group['states'])
+                    results.update((key, computed[key]) for key in group['keys'])
+                else:
+                    for key, hit in group['hits'].items():
+                        results[key] = as_result([(column, np.array(values[offset:offset + len(block)]))
+                                                  for column, values in hit], block.index)
+            for name, key in plan['outputs']:
+                result = results[key]
+                if key in store and offset < cut:
+                    columns = as_columns(result)
+                    if key not in writers:
+                        writers[key] = (cache.create(file_path, key, len(columns), cut), [column for column, _ in columns])
+                    cache.write(writers[key][0], [values for _, values in columns])
+                if isinstance(result, pd.DataFrame):
+                    for column, series in result.items():
+                        block[column] = series
+                else:
+                    block[name] = result
+            offset += len(block)
+            if offset == cut:
+                for group in groups:
+                    snapshots[id(group)] = copy.deepcopy(group['states'])
+            # Remove Timestamp column if present (it's for BTC i want clean data at this point)
+            if 'Timestamp' in block.columns:
+                block.drop(columns=['Timestamp'], inplace=True)
+            for column in block.columns:
+                with_values[column] = with_values.get(column, False) or bool(block[column].notnull().any())
+            block.reset_index(inplace=True)
+            if change_aware:
+                write_block(block, part_file, first, date_format)
+            else:
+                block.to_csv(part_file, mode='w' if first else 'a', header=first, index=False, date_format=date_format)
+            first = False
+            del results, block
+    except BaseException:
+        for files, _ in writers.values():
+            cache.discard(files)
+        raise
+
+    entries = []
+    for group in groups:
+        for key in group['keys'] & store:
+            files, columns = writers[key]
+            states = {step[0]: snapshots[id(group)][step[0]] for step in subset_plan(plan, {key})['steps']}
+            entries.append((key, columns, files, states))
+    return with_values, unchanged, entries
+
+def _zero_range_kept(groups):
+    # A resumed group keeps the non_zero_range() flags of the run it comes
+    # from, they have to be the ones of the whole file
+    return all(
+        group['states'][key]['zero_seen'] == group['states'][key]['zero_range']
+        for group in groups
+        for key, kind, _, _ in group['steps'] if kind in SCAN_NODES
+    )
+
+def calculate_indicators_chunked(file_path, output_file, chunk_rows=500_000, cache=None, change_aware=False):
+    # Watermark of the last row first: the cached prefix is every row before it
+    mark = watermark(file_path) if cache is not None else None
+    meta = _scan_input(file_path, chunk_rows)
+    if meta is None:
+        return
+
+    required_columns = {'Open', 'High', 'Low', 'Close'}
+    if not required_columns.issubset(meta['columns']):
+        print(f"Required columns {required_columns} not found in {file_path}")
+        return
+
+    spec = spec_for_file(file_path)
+    if spec is None:
+        return
+    if meta['n_rows'] == 0:
+        print(f"No data in {file_path}")
+        return
+
+    plan = compile_graph(spec, meta['n_rows'], meta['has_volume'], file_path)
+    time_col = meta['time_col']
+    dtypes = meta['dtypes']
+    blocks = lambda: _read_blocks(file_path, chunk_rows, time_col, dtypes)
+
+    def fresh_group(keys):
+        # Second pass (only if needed): does non_zero_range() see a zero anywhere?
+        steps = subset_plan(plan, keys)['steps']
+        return {'start': 0, 'keys': keys, 'hits': {}, 'steps': steps,
+                'states': initial_states(steps, blocks, change_aware)}
+
+    # Outputs with a cached prefix only compute the rows after it (the cached
+    # columns are memory-mapped and sliced block by block), the others are
+    # computed from the start
+    cut = meta['n_rows'] - 1 if cache is not None else 0
+    groups = _resume_groups(plan, cache, file_path, cut, change_aware) if cache is not None else []
+    resumed = {key for group in groups for key in group['keys']}
+    missing = {key for _, key in plan['outputs'] if key not in resumed}
+    if cache is not None:
+        print(f"Indicator cache: {len(resumed)} resumed, {len(missing)} computed")
+    if missing:
+        groups.append(fresh_group(missing))
+
+    # Main pass: compute block by block and append to the output
+    part_file = output_file + '.part'
+    if os.path.exists(part_file):
+        os.remove(part_file)
+    with_values, unchanged, entries = _main_pass(file_path, part_file, chunk_rows, meta, plan, groups,
+                                                  cache, cut, change_aware)
+    if not _zero_range_kept(groups):
+        print(f"Indicator cache: non_zero_range() changed for {file_path}, recomputing")
+        for _, _, files, _ in entries:
+            cache.discard(files)
+        groups = [fresh_group({key for _, key in plan['outputs']})]
+        with_values, unchanged, entries = _main_pass(file_path, part_file, chunk_rows, meta, plan, groups,
+                                                      cache, cut, change_aware)
+
+    if cache is not None:
+        run = time.time_ns()
+        for key, columns, files, states in entries:
+            cache.finish(file_path, key, columns, files, cut, mark, states, run)
+        # The memory maps are closed before anything is evicted
+        groups.clear()
+        cache.evict(keep=[(file_path, key) for _, key in plan['outputs']])
+        cache.save()
+
+    if change_aware:
+        print(f"{unchanged / meta['n_rows']:.1%} of the rows are unchanged in {file_path}")
+    for column, has_values in with_values.items():
+        if not has_values and column not in meta['columns']:
+            print(f"{column} calculation returned all NaN for {file_path}")
+
+    # Columns that are all NaN over the whole file are dropped, as in the
+    # whole-file mode
+    empty = [column for column, has_values in with_values.items() if not has_values]
+    if empty:
+        _drop_columns(part_file, output_file, set(empty))
+        os.remove(part_file)
+    else:
+        os.replace(part_file, output_file)
+    print(f"Indicators calculated and saved to {output_file}")
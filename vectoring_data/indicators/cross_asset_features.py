@@ -0,0 +1,184 @@
+"""
+Cross-asset features: BTC against each macro ticker.
+
+For every time frame, the log returns of BTC and of each ticker are aligned on
+the BTC bars (int64 times, the last ticker close known at each BTC bar) and
+rolling statistics are computed over several windows:
+
+- Corr_<ticker>_<window>: correlation of the returns
+- Beta_<ticker>_<window>: beta of BTC on the ticker, cov(btc, ticker) / var(ticker)
+- SpreadZ_<ticker>_<window>: z-score of the return spread (btc - ticker) of the
+  bar against its mean and std over the window
+
+The co-moments are updated in O(1) per bar (a bar entering and a bar leaving
+the window), no rolling apply. The result is saved next to the per-ticker
+indicators as Processed_CROSS_with_indicators_1<tf>.csv, so it is merged like
+any other ticker by environment-data-prep.py.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from numba import njit
+
+TICKERS = ['DXY', 'GOLD', 'NDQ', 'SPX', 'US02Y', 'US10Y', 'VIX']
+
+# Windows in bars for each time frame
+WINDOWS = {
+    'm': [60, 1440],
+    'H': [24, 168, 720],
+    'D': [7, 30, 90],
+    'W': [4, 13, 52],
+    'M': [3, 6, 12],
+    'Y': [2, 3],
+}
+
+
+@njit
+def rolling_cross_stats(x, y, window):
+    # Rolling co-moments of the pairs (x, y) without NaN, updated with a
+    # Welford step for the bar entering and its inverse for the bar leaving.
+    # Values once the window holds `window` valid pairs.
+    n = len(x)
+    corr = np.full(n, np.nan)
+    beta = np.full(n, np.nan)
+    spread_z = np.full(n, np.nan)
+    count = 0
+    mean_x = 0.0
+    mean_y = 0.0
+    m2_x = 0.0
+    m2_y = 0.0
+    c_xy = 0.0
+    same_x = 0
+    same_y = 0
+    for i in range(n):
+        if i >= window:
+            ox = x[i - window]
+            oy = y[i - window]
+            if ox == ox and oy == oy:
+                if count == 1:
+                    count = 0
+                    mean_x = mean_y = m2_x = m2_y = c_xy = 0.0
+                else:
+                    count -= 1
+                    old_mean_x = mean_x
+                    old_mean_y = mean_y
+                    mean_x -= (ox - mean_x) / count
+                    mean_y -= (oy - mean_y) / count
+                    m2_x -= (ox - mean_x) * (ox - old_mean_x)
+                    m2_y -= (oy - mean_y) * (oy - old_mean_y)
+                    c_xy -= (ox - mean_x) * (oy - old_mean_y)
+        vx = x[i]
+        vy = y[i]
+        if vx == vx and vy == vy:
+            count += 1
+            dx = vx - mean_x
+            old_mean_y = mean_y
+            mean_x += dx / count
+            mean_y += (vy - mean_y) / count
+            m2_x += dx * (vx - mean_x)
+            m2_y += (vy - old_mean_y) * (vy - mean_y)
+            c_xy += dx * (vy - mean_y)
+        # A window of one repeated value has exactly no variance (closed
+        # markets, forward-filled closes), whatever the round-off left
+        same_x = same_x + 1 if i > 0 and vx == x[i - 1] else 1
+        same_y = same_y + 1 if i > 0 and vy == y[i - 1] else 1
+        if same_x >= window:
+            mean_x = vx
+            m2_x = 0.0
+            c_xy = 0.0
+        if same_y >= window:
+            mean_y = vy
+            m2_y = 0.0
+            c_xy = 0.0
+        if count == window and window > 1:
+            # Round-off can leave tiny negative second moments
+            var_x = max(m2_x, 0.0)
+            var_y = max(m2_y, 0.0)
+            if var_x > 0 and var_y > 0:
+                corr[i] = min(max(c_xy / np.sqrt(var_x * var_y), -1.0), 1.0)
+            if var_y > 0:
+                beta[i] = c_xy / var_y
+            var_s = (var_x + var_y - 2.0 * c_xy) / (count - 1)
+            if var_s > 0 and vx == vx and vy == vy:
+                spread_z[i] = ((vx - vy) - (mean_x - mean_y)) / np.sqrt(var_s)
+    return corr, beta, spread_z
+
+
+def load_closes(file_path):
+    # Returns (int64 times in ns, close) sorted by time
+    df = pd.read_csv(file_path, usecols=['Formatted_Time', 'Close'])
+    times = pd.to_datetime(df['Formatted_Time']).values.astype(np.int64)
+    close = df['Close'].to_numpy(dtype=np.float64)
+    order = np.argsort(times, kind='stable')
+    return times[order], close[order]
+
+def log_returns(close):
+    out = np.full(len(close), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[1:] = np.log(close[1:] / close[:-1])
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+def align_to(times, ticker_times, ticker_close):
+    # Last ticker close known at each of the times (NaN before its first bar)
+    pos = np.searchsorted(ticker_times, times, side='right') - 1
+    aligned = np.full(len(times), np.nan)
+    known = pos >= 0
+    aligned[known] = ticker_close[pos[known]]
+    return aligned
+
+def cross_asset_features(btc_file, ticker_files, windows):
+    """
+    btc_file and ticker_files ({ticker: file}) are indicator outputs of the
+    same time frame. Returns a DataFrame indexed like the BTC bars.
+    """
+    times, btc_close = load_closes(btc_file)
+    btc_returns = log_returns(btc_close)
+    columns = {}
+    for ticker, file_path in ticker_files.items():
+        ticker_times, ticker_close = load_closes(file_path)
+        ticker_returns = log_returns(align_to(times, ticker_times, ticker_close))
+        for window in windows:
+            corr, beta, spread_z = rolling_cross_stats(btc_returns, ticker_returns, window)
+            columns[f'Corr_{ticker}_{window}'] = corr
+            columns[f'Beta_{ticker}_{window}'] = beta
+            columns[f'SpreadZ_{ticker}_{window}'] = spread_z
+    index = pd.DatetimeIndex(pd.to_datetime(times), name='Formatted_Time')
+    return pd.DataFrame(columns, index=index)
+
+
+if __name__ == "__main__":
+    base_dir = 'indicators_data'
+    time_frames = [
+        ('1 minute', 'm'),
+        ('1 hour', 'H'),
+        ('1 day', 'D'),
+        ('1 week', 'W'),
+        ('1 month', 'M'),
+        ('1 year', 'Y')
+    ]
+
+    for time_frame, time_name in time_frames:
+        data_dir = os.path.join(base_dir, time_frame)
+        btc_file = os.path.join(data_dir, 'Processed_BTC_with_indicators_1' + time_name + '.csv')
+        if not os.path.exists(btc_file):
+            print(f"File {btc_file} not found.")
+            continue
+        ticker_files = {}
+        for ticker in TICKERS:
+            ticker_file = os.path.join(data_dir, f'Processed_{ticker}_with_indicators_1' + time_name + '.csv')
+            if os.path.exists(ticker_file):
+                ticker_files[ticker] = ticker_file
+            else:
+                print(f"File {ticker_file} not found.")
+        if not ticker_files:
+            continue
+
+        print(f"Computing cross-asset features for {time_frame}...")
+        df = cross_asset_features(btc_file, ticker_files, WINDOWS[time_name])
+        # Remove columns that are all NaN (windows longer than the data)
+        df.dropna(axis=1, how='all', inplace=True)
+        output_file = os.path.join(data_dir, 'Processed_CROSS_with_indicators_1' + time_name + '.csv')
+        df.reset_index().to_csv(output_file, index=False)
+        print(f"Cross-asset features saved to {output_file}")
@@ -0,0 +1,232 @@
+"""
+Prefix cache for the indicator columns.
+
+An entry is keyed by (input file, graph node key), where the node key already
+holds the indicator name and its parameters. It stores each column of that
+node for the first `rows` rows of the file in its own .npy file, together with
+the streaming states of the nodes it needs (chunked_indicators.py) after those
+rows. When a parameter changes only the nodes using it get a new key, so a
+re-run recomputes those columns and loads the others.
+
+The input files grow at the end (new minutes, and the last bar of the
+resampled files is still open), so an entry covers every row but the last and
+is checked against the prefix only: the offset of the row after it and the
+SHA-1 of a bounded sample of the bytes before it (prefix_sample), stored with
+the entry. The sample holds the line ending at the offset, so a resume reads
+about a megabyte of the input before the rows after the prefix, whatever the
+size of the file. While they match, the cached prefix is reused and only the
+rows after it are computed, starting from the stored states.
+
+A rebuild of an input that changes older rows (processer.py,
+time_processer.py) almost always moves the offset of its last row or a
+sampled byte. An edit that keeps both is not seen: remove the cache directory
+after editing an input by hand.
+
+The cache is kept under a disk budget by evicting the least recently used
+entries.
+"""
+import hashlib
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+# Bump when an indicator computation changes, older entries then stop matching
+CACHE_VERSION = 3
+# Sample of a cached prefix: blocks of SAMPLE_BYTES at its start, at its end
+# and SAMPLE_BLOCKS spread between them (the whole prefix when smaller)
+SAMPLE_BYTES = 1 << 16
+SAMPLE_BLOCKS = 16
+
+
+def prefix_sample(file_path, offset):
+    # SHA-1 of the offset and of a sample of the first offset bytes of the file
+    if offset <= SAMPLE_BYTES * (SAMPLE_BLOCKS + 2):
+        starts = range(0, offset, SAMPLE_BYTES)
+    else:
+        starts = [offset * i // (SAMPLE_BLOCKS + 1) for i in range(SAMPLE_BLOCKS + 1)] + [offset - SAMPLE_BYTES]
+    digest = hashlib.sha1(str(offset).encode())
+    with open(file_path, 'rb') as f:
+        for start in starts:
+            f.seek(start)
+            digest.update(f.read(min(SAMPLE_BYTES, offset - start)))
+    return digest.hexdigest()
+
+def watermark(file_path):
+    # (offset, prefix_sample) of the start of the last row of a CSV file,
+    # reading only its end and the sample
+    with open(file_path, 'rb') as f:
+        position = f.seek(0, 2)
+        tail = b''
+        while position > 0:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+            lines = tail.rstrip(b'\r\n').split(b'\n')
+            if len(lines) > 1 or position == 0:
+                break
+        offset = position + len(tail.rstrip(b'\r\n')) - len(lines[-1])
+    return offset, prefix_sample(file_path, offset)
+
+
+class IndicatorCache:
+    def __init__(self, cache_dir, budget_bytes):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        # Files of replaced entries, removed by evict()
+        self.stale = []
+        self.index = self._load_index()
+
+    def _load_index(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    index = json.load(f)
+                if index.get('version') == CACHE_VERSION:
+                    return index
+                # Entries of an older version go with their files
+                self.stale.extend(f for entry in index.get('entries', {}).values() for f in entry.get('files', []))
+            except (OSError, ValueError) as e:
+                print(f"Cache index unreadable ({e}), starting with an empty cache")
+        return {'version': CACHE_VERSION, 'entries': {}}
+
+    def save(self):
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_file, self.index_file)
+
+    def _entry_id(self, file_path, key):
+        return hashlib.sha1(repr((CACHE_VERSION, os.path.abspath(file_path), key)).encode()).hexdigest()
+
+    def _path(self, file_name):
+        return os.path.join(self.cache_dir, file_name)
+
+    def get(self, file_path, key, mmap=False):
+        # {'rows', 'run', 'columns': [(column name or None, array)], 'states'}
+        # for the cached prefix of the file, or None on a miss
+        entry_id = self._entry_id(file_path, key)
+        entry = self.index['entries'].get(entry_id)
+        if entry is None:
+            return None
+        if not all(os.path.exists(self._path(f)) for f in entry['files'] + [entry['states']]):
+            self._remove(entry_id)
+            return None
+        if os.path.getsize(file_path) < entry['offset'] or prefix_sample(file_path, entry['offset']) != entry['sample']:
+            # The prefix changed, the entry is replaced by this run
+            return None
+        entry['last_access'] = time.time()
+        with open(self._path(entry['states']), 'rb') as f:
+            states = pickle.load(f)
+        return {
+            'rows': entry['rows'],
+            'run': entry['run'],
+            'columns': [
+                (column, np.load(self._path(f), mmap_mode='r' if mmap else None))
+                for column, f in zip(entry['columns'], entry['files'])
+            ],
+            'states': states,
+        }
+
+    def create(self, file_path, key, n_columns, n_rows):
+        # .npy files filled block by block with write(), then finish(). The
+        # row count is in the names, a new prefix never replaces a file that
+        # may still be memory-mapped
+        entry_id = self._entry_id(file_path, key)
+        writers = []
+        for i in range(n_columns):
+            f = open(self._path(f'{entry_id}_{i}_{n_rows}.npy.tmp'), 'wb')
+            np.lib.format.write_array_header_1_0(f, {'descr': '<f8', 'fortran_order': False, 'shape': (n_rows,)})
+            writers.append(f)
+        return writers
+
+    def write(self, writers, arrays):
+        for f, values in zip(writers, arrays):
+            f.write(np.ascontiguousarray(values, dtype='<f8').tobytes())
+
+    def finish(self, file_path, key, columns, writers, rows, mark, states, run):
+        # mark: watermark() of the row after the prefix, states: the states
+        # of the nodes after it, run: the run the prefix was computed in
+        entry_id = self._entry_id(file_path, key)
+        files = []
+        size = 0
+        for writer in writers:
+            writer.close()
+            f = os.path.basename(writer.name)[:-len('.tmp')]
+            os.replace(writer.name, self._path(f))
+            files.append(f)
+            size += os.path.getsize(self._path(f))
+        states_file = f'{entry_id}_{rows}.pkl'
+        with open(self._path(states_file + '.tmp'), 'wb') as f:
+            pickle.dump(states, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self._path(states_file + '.tmp'), self._path(states_file))
+        size += os.path.getsize(self._path(states_file))
+        old = self.index['entries'].get(entry_id)
+        if old is not None:
+            self.stale.extend(f for f in old['files'] + [old['states']] if f not in files + [states_file])
+        offset, sample = mark
+        self.index['entries'][entry_id] = {
+            'columns': columns,
+            'files': files,
+            'states': states_file,
+            'rows': rows,
+            'offset': offset,
+            'sample': sample,
+            'run': run,
+            'bytes': size,
+            'last_access': time.time(),
+        }
+
+    def discard(self, writers):
+        # Drops the files of a create() that didn't complete
+        for writer in writers:
+            writer.close()
+            try:
+                os.remove(writer.name)
+            except OSError:
+                pass
+
+    def _remove(self, entry_id):
+        entry = self.index['entries'].pop(entry_id)
+        self.stale.extend(entry['files'] + [entry['states']])
+
+    def evict(self, keep=()):
+        # Least recently used entries go first until the cache fits its budget,
+        # the entries in keep (file, key used by the current run) stay. Call
+        # it once the memory maps of the run are closed, the replaced files
+        # are removed here too
+        keep_ids = {self._entry_id(file_path, key) for file_path, key in keep}
+        entries = self.index['entries']
+        total = sum(entry['bytes'] for entry in entries.values())
+        for entry_id in sorted(entries, key=lambda e: entries[e]['last_access']):
+            if total <= self.budget_bytes:
+                break
+            if entry_id in keep_ids:
+                continue
+            total -= entries[entry_id]['bytes']
+            self._remove(entry_id)
+        for f in self.stale:
+            try:
+                os.remove(self._path(f))
+            except OSError:
+                pass
+        self.stale = []
+
+
+def as_result(columns, index):
+    # Cached arrays back to the Series / DataFrame the node returns
+    if len(columns) == 1 and columns[0][0] is None:
+        return pd.Series(columns[0][1], index=index)
+    return pd.DataFrame({column: values for column, values in columns}, index=index)
+
+def as_columns(result):
+    # Node result to [(column name or None, array)] for the cache
+    if isinstance(result, pd.DataFrame):
+        return [(column, series.to_numpy(dtype=np.float64)) for column, series in result.items()]
+    return [(None, result.to_numpy(dtype=np.float64))]
@@ -0,0 +1,315 @@
+"""
+Declarative indicator graph used by indicators_processer.py.
+
+Each time frame has a spec: a list of feature entries such as
+{'indicator': 'sma', 'length': 50}. compile_graph() expands the features into
+the nodes they depend on (RSI, log returns, typical price, high-low range...),
+drops the features that can't be computed on the given data and orders the
+remaining nodes so every intermediate is computed once and shared by all the
+features that use it. run_graph() then evaluates the plan on a DataFrame.
+
+To add a feature for the agent: register its node in NODES (and in FEATURES if
+it is an output) and add an entry to the spec of the time frames that need it.
+"""
+import re
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+from pandas_ta.utils import non_zero_range
+
+from indicator_kernels import compute_avwap
+
+
+def node_key(kind, params):
+    # Nodes are identified by kind + parameters, so the same RSI(64) requested
+    # by two features is a single node in the graph
+    return (kind, tuple(sorted(params.items())))
+
+
+# ---------------------------------------------------------------------------
+# Nodes: deps(params) -> [(kind, params)], compute(df, inputs, params)
+# ---------------------------------------------------------------------------
+
+def _sma(df, inputs, p):
+    return ta.sma(df['Close'], length=p['length'])
+
+def _ema(df, inputs, p):
+    return ta.ema(df['Close'], length=p['length'])
+
+def _rsi(df, inputs, p):
+    return ta.rsi(df['Close'], length=p['length'])
+
+def _macd(df, inputs, p):
+    # Same computation as ta.macd, but the two EMAs come from shared nodes
+    fastma, slowma = inputs
+    macd = fastma - slowma
+    signalma = ta.ema(close=macd.loc[macd.first_valid_index():,], length=p['signal'])
+    histogram = macd - signalma
+    suffix = f"{p['fast']}_{p['slow']}_{p['signal']}"
+    return pd.DataFrame({
+        f'MACD_{suffix}': macd,
+        f'MACDh_{suffix}': histogram,
+        f'MACDs_{suffix}': signalma
+    })
+
+def _stochrsi(df, inputs, p):
+    # Same computation as ta.stochrsi, but the RSI comes from a shared node
+    rsi_ = inputs[0]
+    lowest_rsi = rsi_.rolling(p['length']).min()
+    highest_rsi = rsi_.rolling(p['length']).max()
+    stoch = 100 * (rsi_ - lowest_rsi)
+    stoch /= non_zero_range(highest_rsi, lowest_rsi)
+    stochrsi_k = ta.sma(stoch, length=p['k'])
+    stochrsi_d = ta.sma(stochrsi_k, length=p['d'])
+    return pd.DataFrame({'k': stochrsi_k, 'd': stochrsi_d})
+
+def _hlc3(df, inputs, p):
+    return ta.hlc3(high=df['High'], low=df['Low'], close=df['Close'])
+
+def _hl_range(df, inputs, p):
+    return non_zero_range(df['High'], df['Low'])
+
+def _log_returns(df, inputs, p):
+    return np.log(df['Close'] / df['Close'].shift(1))
+
+def _mf_volume(df, inputs, p):
+    # Money flow volume, shared by the A/D line and CMF (same as ta.ad / ta.cmf)
+    ad = 2 * df['Close'] - (df['High'] + df['Low'])
+    ad *= df['Volume'] / inputs[0]
+    return ad
+
+def _vwap(df, inputs, p):
+    # Same computation as ta.vwap, but the typical price comes from a shared node
+    volume = df['Volume']
+    wp = inputs[0] * volume
+    vwap = wp.groupby(wp.index.to_period(p['anchor'])).cumsum()
+    vwap /= volume.groupby(volume.index.to_period(p['anchor'])).cumsum()
+    return vwap
+
+def _avwap(df, inputs, p):
+    stoch_rsi = inputs[0]
+    hiAVWAP_arr, loAVWAP_arr, hiAVWAP_next_arr, loAVWAP_next_arr = compute_avwap(
+        df['High'].values.astype(np.float64),
+        df['Low'].values.astype(np.float64),
+        df['Volume'].values.astype(np.float64),
+        stoch_rsi['k'].values.astype(np.float64),
+        stoch_rsi['d'].values.astype(np.float64),
+        df['Close'].values.astype(np.float64),
+        p['use_hilow'],
+        float(p.get('lower_band', 20)),
+        float(p.get('upper_band', 80))
+    )
+    return pd.DataFrame({
+        'hiAVWAP': hiAVWAP_arr,
+        'loAVWAP': loAVWAP_arr,
+        'hiAVWAP_next': hiAVWAP_next_arr,
+        'loAVWAP_next': loAVWAP_next_arr
+    }, index=df.index)
+
+def _rolling_min(df, inputs, p):
+    return df['Low'].rolling(window=p['window']).min()
+
+def _rolling_max(df, inputs, p):
+    return df['High'].rolling(window=p['window']).max()
+
+def _rolling_std(df, inputs, p):
+    return df['Close'].rolling(window=p['window']).std()
+
+def _volatility(df, inputs, p):
+    return inputs[0].rolling(window=p['window']).std() * np.sqrt(p['periods_per_year'])
+
+def _obv(df, inputs, p):
+    return ta.obv(close=df['Close'], volume=df['Volume'])
+
+def _accdist(df, inputs, p):
+    return inputs[0].cumsum()
+
+def _cmf(df, inputs, p):
+    length = p['length']
+    cmf = inputs[0].rolling(length, min_periods=length).sum()
+    cmf /= df['Volume'].rolling(length, min_periods=length).sum()
+    return cmf
+
+
+NODES = {
+    'sma': (lambda p: [], _sma),
+    'ema': (lambda p: [], _ema),
+    'rsi': (lambda p: [], _rsi),
+    'macd': (lambda p: [('ema', {'length': p['fast']}), ('ema', {'length': p['slow']})], _macd),
+    'stochrsi': (lambda p: [('rsi', {'length': p['rsi_length']})], _stochrsi),
+    'hlc3': (lambda p: [], _hlc3),
+    'hl_range': (lambda p: [], _hl_range),
+    'log_returns': (lambda p: [], _log_returns),
+    'mf_volume': (lambda p: [('hl_range', {})], _mf_volume),
+    'vwap': (lambda p: [('hlc3', {})], _vwap),
+    'avwap': (lambda p: [('stochrsi', {k: p[k] for k in ('length', 'rsi_length', 'k', 'd')})], _avwap),
+    'rolling_min': (lambda p: [], _rolling_min),
+    'rolling_max': (lambda p: [], _rolling_max),
+    'rolling_std': (lambda p: [], _rolling_std),
+    'volatility': (lambda p: [('log_returns', {})], _volatility),
+    'obv': (lambda p: [], _obv),
+    'accdist': (lambda p: [('mf_volume', {})], _accdist),
+    'cmf': (lambda p: [('mf_volume', {})], _cmf),
+}
+
+# Output features: minimum number of rows, whether Volume is needed and the
+# default column name (features returning a DataFrame keep their own names)
+FEATURES = {
+    'sma': (lambda p: p['length'], False, lambda p: f"SMA_{p['length']}"),
+    'rsi': (lambda p: p['length'], False, lambda p: f"RSI_{p['length']}"),
+    'macd': (lambda p: p['slow'], False, None),
+    'vwap': (lambda p: 0, True, lambda p: 'VWAP'),
+    'avwap': (lambda p: p['rsi_length'], True, None),
+    'rolling_min': (lambda p: p['window'], False, lambda p: f"Rolling_Min_{p['window']}"),
+    'rolling_max': (lambda p: p['window'], False, lambda p: f"Rolling_Max_{p['window']}"),
+    'rolling_std': (lambda p: p['window'], False, lambda p: f"Rolling_STD_{p['window']}"),
+    'volatility': (lambda p: p['window'], False, lambda p: f"Volatility_{p['window']}"),
+    'obv': (lambda p: 0, True, lambda p: 'OBV'),
+    'accdist': (lambda p: 0, True, lambda p: 'AccDist'),
+    'cmf': (lambda p: p['length'], True, lambda p: 'CMF'),
+}
+
+
+# ---------------------------------------------------------------------------
+# Specs per time frame
+# ---------------------------------------------------------------------------
+
+def default_spec(vol_window_size, periods_per_year):
+    # The feature set used for the agent so far, only the volatility changes
+    # between time frames
+    return [
+        *({'indicator': 'sma', 'length': period} for period in [5, 10, 20, 50, 100, 200, 500]),
+        {'indicator': 'rsi', 'length': 14, 'name': 'RSI'},
+        {'indicator': 'macd', 'fast': 12, 'slow': 26, 'signal': 9},
+        {'indicator': 'vwap', 'anchor': 'D'},
+        {'indicator': 'avwap', 'length': 48, 'rsi_length': 64, 'k': 4, 'd': 4, 'use_hilow': True},
+        {'indicator': 'rolling_min', 'window': 30},
+        {'indicator': 'rolling_max', 'window': 30},
+        {'indicator': 'rolling_std', 'window': 30},
+        # Volatility was always gated by the 30 rows of the rolling block
+        {'indicator': 'volatility', 'window': vol_window_size, 'periods_per_year': periods_per_year, 'min_rows': 30},
+        {'indicator': 'obv'},
+        {'indicator': 'accdist'},
+        {'indicator': 'cmf', 'length': 20},
+    ]
+
+
+INDICATOR_SPECS = {
+    'm': default_spec(30, 525600),  # 365 days * 24 hours * 60 minutes
+    'H': default_spec(12, 8760),    # 365 days * 24 hours
+    'D': default_spec(2, 365),
+    'W': default_spec(2, 52),
+    'M': default_spec(2, 12),
+    'Y': default_spec(2, 1),
+}
+
+
+def spec_for_file(file_path):
+    # Pick the spec from the time frame in the file name
+    # Assuming the file name contains '_1m', '_1H', '_1D', '_1W', '_1M', or '_1Y'
+    time_frame_match = re.search(r'_1([mHDWMY])\.', file_path)
+    if not time_frame_match:
+        print(f"Could not determine time frame from file path '{file_path}'")
+        return None
+    time_frame_code = time_frame_match.group(1)
+    spec = INDICATOR_SPECS.get(time_frame_code)
+    if spec is None:
+        print(f"Unknown time frame code '{time_frame_code}' in file path '{file_path}'")
+    return spec
+
+
+# ---------------------------------------------------------------------------
+# Compile and run
+# ---------------------------------------------------------------------------
+
+def _feature_params(entry):
+    return {k: v for k, v in entry.items() if k not in ('indicator', 'name', 'min_rows')}
+
+def compile_graph(spec, n_rows, has_volume, file_path=''):
+    """
+    Returns the plan for a spec: {'steps': [(key, kind, params, dep_keys)],
+    'outputs': [(name, key)], 'release': {step_index: [keys]}}.
+    Features that can't be computed on n_rows rows (or without volume) are
+    skipped, and so are the nodes only they depend on.
+    """
+    steps = []
+    seen = set()
+    outputs = []
+
+    def visit(kind, params):
+        key = node_key(kind, params)
+        if key in seen:
+            return key
+        deps_fn = NODES[kind][0]
+        dep_keys = [visit(dep_kind, dep_params) for dep_kind, dep_params in deps_fn(params)]
+        seen.add(key)
+        steps.append((key, kind, params, dep_keys))
+        return key
+
+    for entry in spec:
+        kind = entry['indicator']
+        params = _feature_params(entry)
+        min_rows_fn, needs_volume, name_fn = FEATURES[kind]
+        min_rows = entry.get('min_rows', min_rows_fn(params))
+        label = entry.get('name') or (name_fn(params) if name_fn else kind.upper())
+        if needs_volume and not has_volume:
+            print(f"Volume data not available for {label} in {file_path}")
+            continue
+        if n_rows < min_rows:
+            print(f"Not enough data to compute {label} for {file_path}")
+            continue
+        outputs.append((entry.get('name') or (name_fn(params) if name_fn else None), visit(kind, params)))
+
+    return {'steps': steps, 'outputs': outputs, 'release': _release(steps, outputs)}
+
+def _release(steps, outputs):
+    # Free each intermediate after its last consumer ran, outputs are kept
+    output_keys = {key for _, key in outputs}
+    last_use = {}
+    for i, (key, kind, params, dep_keys) in enumerate(steps):
+        for dep in dep_keys:
+            last_use[dep] = i
+    release = {}
+    for key, i in last_use.items():
+        if key not in output_keys:
+            release.setdefault(i, []).append(key)
+    return release
+
+def subset_plan(plan, output_keys):
+    # The part of a plan needed for some of its outputs only
+    needed = set()
+    for key, kind, params, dep_keys in reversed(plan['steps']):
+        if key in output_keys or key in needed:
+            needed.add(key)
+            needed.update(dep_keys)
+    steps = [step for step in plan['steps'] if step[0] in needed]
+    outputs = [(name, key) for name, key in plan['outputs'] if key in output_keys]
+    return {'steps': steps, 'outputs': outputs, 'release': _release(steps, outputs)}
+
+def evaluate_plan(df, plan):
+    # Runs the steps of a plan, returns {output key: Series or DataFrame}
+    results = {}
+    for i, (key, kind, params, dep_keys) in enumerate(plan['steps']):
+        inputs = [results[dep] for dep in dep_keys]
+        results[key] = NODES[kind][1](df, inputs, params)
+        for done in plan['release'].get(i, []):
+            del results[done]
+    return results
+
+def output_columns(plan, results):
+    # Flattens the output results into (column name, Series) in spec order
+    columns = []
+    for name, key in plan['outputs']:
+        result = results[key]
+        if isinstance(result, pd.DataFrame):
+            columns.extend(result.items())
+        else:
+            columns.append((name, result))
+    return columns
+
+def run_graph(df, plan):
+    """
+    Evaluates a compiled plan on df (indexed by time, with the OHLC(V) columns)
+    and returns the output columns as a list of (column name, Series).
+    """
+    return output_columns(plan, evaluate_plan(df, plan))
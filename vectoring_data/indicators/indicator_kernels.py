@@ -0,0 +1,625 @@
+import numpy as np
+from numba import njit
+
+@njit
+def compute_avwap(high, low, volume, k, d, close, useHiLow, lowerBand=20.0, upperBand=80.0):
+    carry = avwap_initial_state(high[0], low[0])
+    return compute_avwap_stream(high, low, volume, k, d, close, useHiLow, carry, lowerBand, upperBand)
+
+
+@njit
+def avwap_initial_state(first_high, first_low):
+    # hi, lo, phi, plo, state, then the hi/lo sums and volumes (current and next)
+    carry = np.zeros(13)
+    carry[0] = first_high
+    carry[1] = first_low
+    carry[2] = first_high
+    carry[3] = first_low
+    return carry
+
+
+@njit
+def compute_avwap_stream(high, low, volume, k, d, close, useHiLow, carry, lowerBand=20.0, upperBand=80.0,
+                         skip_runs=False):
+    # Same as compute_avwap, but it resumes from (and updates) the loop state
+    # in carry so a long series can be processed block by block. skip_runs:
+    # see the resumable kernels below, a repeated bar leaving carry unchanged
+    # is a fixed point of the loop
+    n = len(high)
+    hiAVWAP_arr = np.full(n, np.nan)
+    loAVWAP_arr = np.full(n, np.nan)
+    hiAVWAP_next_arr = np.full(n, np.nan)
+    loAVWAP_next_arr = np.full(n, np.nan)
+    before = np.empty(len(carry))
+    idx = 0
+    while idx < n:
+        repeated = skip_runs and idx > 0 and _same_bar(
+            high[idx - 1], low[idx - 1], volume[idx - 1], k[idx - 1], d[idx - 1], close[idx - 1],
+            high[idx], low[idx], volume[idx], k[idx], d[idx], close[idx]
+        )
+        if repeated:
+            before[:] = carry
+        hiAVWAP, loAVWAP, hiAVWAP_next, loAVWAP_next = avwap_step(
+            high[idx], low[idx], volume[idx], k[idx], d[idx], close[idx],
+            useHiLow, carry, lowerBand, upperBand
+        )
+        hiAVWAP_arr[idx] = hiAVWAP
+        loAVWAP_arr[idx] = loAVWAP
+        hiAVWAP_next_arr[idx] = hiAVWAP_next
+        loAVWAP_next_arr[idx] = loAVWAP_next
+        idx += 1
+
+        if repeated and _same_state(before, carry):
+            end = idx
+            while end < n and _same_bar(
+                high[idx - 1], low[idx - 1], volume[idx - 1], k[idx - 1], d[idx - 1], close[idx - 1],
+                high[end], low[end], volume[end], k[end], d[end], close[end]
+            ):
+                end += 1
+            hiAVWAP_arr[idx:end] = hiAVWAP
+            loAVWAP_arr[idx:end] = loAVWAP
+            hiAVWAP_next_arr[idx:end] = hiAVWAP_next
+            loAVWAP_next_arr[idx:end] = loAVWAP_next
+            idx = end
+
+    return hiAVWAP_arr, loAVWAP_arr, hiAVWAP_next_arr, loAVWAP_next_arr
+
+
+@njit
+def _same_bar(h0, l0, v0, k0, d0, c0, h1, l1, v1, k1, d1, c1):
+    # Same AVWAP inputs (scalars, passing the arrays per row costs more than
+    # the comparison)
+    return (_same(h0, h1) and _same(l0, l1) and _same(v0, v1)
+            and _same(k0, k1) and _same(d0, d1) and _same(c0, c1))
+
+
+@njit
+def avwap_step(h, l, vol, k_val, d_val, c, useHiLow, carry, lowerBand, upperBand):
+    # One bar of the AVWAP loop, the state lives in carry (see avwap_initial_state)
+    hi = carry[0]
+    lo = carry[1]
+    phi = carry[2]
+    plo = carry[3]
+    state = int(carry[4])
+    hiAVWAP_s = carry[5]
+    loAVWAP_s = carry[6]
+    hiAVWAP_v = carry[7]
+    loAVWAP_v = carry[8]
+    hiAVWAP_s_next = carry[9]
+    loAVWAP_s_next = carry[10]
+    hiAVWAP_v_next = carry[11]
+    loAVWAP_v_next = carry[12]
+    lowerReversal = 20
+    upperReversal = 80
+
+    # Update phi and reset hiAVWAP_s_next under specific conditions
+    if d_val < lowerBand and state != 1:
+        phi = h
+        hiAVWAP_s_next = 0.0
+        hiAVWAP_v_next = 0.0
+    elif h > phi:
+        phi = h  # Update phi without resetting hiAVWAP_s_next
+
+    # Update hi and reset hiAVWAP_s when h > hi
+    if h > hi:
+        hi = h
+        hiAVWAP_s = 0.0
+        hiAVWAP_v = 0.0
+
+    # Update state
+    prev_state = state
+    if state != -1 and d_val < lowerBand:
+        state = -1
+    elif state != 1 and d_val > upperBand:
+        state = 1
+
+    # VWAP calculations
+    if useHiLow:
+        vwapHi = h
+        vwapLo = l
+    else:
+        vwapHi = (h + l + c) / 3.0
+        vwapLo = vwapHi
+
+    # Accumulate hiAVWAP_s and hiAVWAP_s_next under different conditions
+    if state == 1:
+        hiAVWAP_s += vwapHi * vol
+        hiAVWAP_v += vol
+    else:
+        hiAVWAP_s_next += vwapHi * vol
+        hiAVWAP_v_next += vol
+
+    # Similar adjustments for loAVWAP_s and loAVWAP_s_next
+    if l < lo:
+        lo = l
+        loAVWAP_s = 0.0
+        loAVWAP_v = 0.0
+
+    if d_val > upperBand and state != -1:
+        plo = l
+        loAVWAP_s_next = 0.0
+        loAVWAP_v_next = 0.0
+    elif l < plo:
+        plo = l
+
+    if state == -1:
+        loAVWAP_s += vwapLo * vol
+        loAVWAP_v += vol
+    else:
+        loAVWAP_s_next += vwapLo * vol
+        loAVWAP_v_next += vol
+
+    # Conditional assignments
+    if hi > phi and state == 1 and k_val < d_val and k_val < lowerReversal:
+        hi = phi
+        hiAVWAP_s = hiAVWAP_s_next
+        hiAVWAP_v = hiAVWAP_v_next
+
+    if lo < plo and state == -1 and k_val > d_val and k_val > upperReversal:
+        lo = plo
+        loAVWAP_s = loAVWAP_s_next
+        loAVWAP_v = loAVWAP_v_next
+
+    # Calculate AVWAPs
+    hiAVWAP = hiAVWAP_s / hiAVWAP_v if hiAVWAP_v != 0.0 else np.nan
+    loAVWAP = loAVWAP_s / loAVWAP_v if loAVWAP_v != 0.0 else np.nan
+    hiAVWAP_next = hiAVWAP_s_next / hiAVWAP_v_next if hiAVWAP_v_next != 0.0 else np.nan
+    loAVWAP_next = loAVWAP_s_next / loAVWAP_v_next if loAVWAP_v_next != 0.0 else np.nan
+
+    carry[0] = hi
+    carry[1] = lo
+    carry[2] = phi
+    carry[3] = plo
+    carry[4] = state
+    carry[5] = hiAVWAP_s
+    carry[6] = loAVWAP_s
+    carry[7] = hiAVWAP_v
+    carry[8] = loAVWAP_v
+    carry[9] = hiAVWAP_s_next
+    carry[10] = loAVWAP_s_next
+    carry[11] = hiAVWAP_v_next
+    carry[12] = loAVWAP_v_next
+
+    return hiAVWAP, loAVWAP, hiAVWAP_next, loAVWAP_next
+
+
+# ---------------------------------------------------------------------------
+# Resumable kernels for the chunked mode
+#
+# They reproduce the arithmetic of the pandas window functions used by the
+# indicators (rolling mean/sum/var, ewm, cumsum, groupby cumsum), including
+# their Kahan compensation, so a series processed block by block gives the
+# same bits as pandas on the whole series. The running state lives in small
+# arrays owned by the caller; rolling windows also keep their last `window`
+# values in a ring buffer.
+#
+# With skip_runs (change-aware mode), once a row repeating the value of the
+# row before leaves the state as it was (the counters of rows aside), the
+# following rows of the run would do the same: they get the same output and
+# only the counters move. The output bits are the same as without it.
+# ---------------------------------------------------------------------------
+
+@njit
+def _same(a, b):
+    # Same float for the kernels: NaN matches NaN, 0.0 doesn't match -0.0
+    if a == b:
+        return a != 0.0 or np.signbit(a) == np.signbit(b)
+    return a != a and b != b
+
+
+@njit
+def _run_end(values, idx):
+    # First index after the run of values repeating values[idx]
+    j = idx + 1
+    while j < len(values) and _same(values[j], values[idx]):
+        j += 1
+    return j
+
+
+@njit
+def _window_is(buf, val):
+    # The window only holds val
+    for i in range(len(buf)):
+        if not _same(buf[i], val):
+            return False
+    return True
+
+
+@njit
+def _same_state(before, state):
+    # Same state arrays
+    for i in range(len(state)):
+        if not _same(before[i], state[i]):
+            return False
+    return True
+
+
+@njit
+def rolling_mean_stream(values, window, minp, buf, fstate, istate, skip_runs=False):
+    # fstate = [sum_x, compensation_add, compensation_remove, prev_value]
+    # istate = [rows seen, nobs, neg_ct, num_consec_same_value]
+    n = len(values)
+    out = np.empty(n)
+    sum_x = fstate[0]
+    comp_add = fstate[1]
+    comp_remove = fstate[2]
+    prev_value = fstate[3]
+    seen = istate[0]
+    nobs = istate[1]
+    neg_ct = istate[2]
+    same = istate[3]
+
+    idx = 0
+    while idx < n:
+        val = values[idx]
+        if np.isinf(val):
+            val = np.nan
+        before = (sum_x, comp_add, comp_remove, prev_value)
+        before_counts = (nobs, neg_ct)
+
+        if seen == 0 or window <= 1:
+            # First window: pandas starts from a clean accumulator
+            prev_value = val
+            same = 0
+            sum_x = 0.0
+            comp_add = 0.0
+            comp_remove = 0.0
+            nobs = 0
+            neg_ct = 0
+        elif seen >= window:
+            old = buf[seen % window]
+            if old == old:
+                nobs -= 1
+                y = - old - comp_remove
+                t = sum_x + y
+                comp_remove = t - sum_x - y
+                sum_x = t
+                if np.signbit(old):
+                    neg_ct -= 1
+
+        if val == val:
+            nobs += 1
+            y = val - comp_add
+            t = sum_x + y
+            comp_add = t - sum_x - y
+            sum_x = t
+            if np.signbit(val):
+                neg_ct += 1
+            if val == prev_value:
+                same += 1
+            else:
+                same = 1
+            prev_value = val
+
+        buf[seen % window] = val
+        seen += 1
+
+        if nobs >= minp and nobs > 0:
+            result = sum_x / nobs
+            if same >= nobs:
+                result = prev_value
+            elif neg_ct == 0 and result < 0:
+                result = 0.0
+            elif neg_ct == nobs and result > 0:
+                result = 0.0
+        else:
+            result = np.nan
+        out[idx] = result
+        idx += 1
+
+        if (skip_runs and val == val and same >= window and (nobs, neg_ct) == before_counts
+                and _same(sum_x, before[0]) and _same(comp_add, before[1]) and _same(comp_remove, before[2])
+                and _same(prev_value, before[3]) and _window_is(buf, val)):
+            end = _run_end(values, idx - 1)
+            out[idx:end] = result
+            seen += end - idx
+            same += end - idx
+            idx = end
+
+    fstate[0] = sum_x
+    fstate[1] = comp_add
+    fstate[2] = comp_remove
+    fstate[3] = prev_value
+    istate[0] = seen
+    istate[1] = nobs
+    istate[2] = neg_ct
+    istate[3] = same
+    return out
+
+
+@njit
+def rolling_sum_stream(values, window, minp, buf, fstate, istate, skip_runs=False):
+    # fstate = [sum_x, compensation_add, compensation_remove, prev_value]
+    # istate = [rows seen, nobs, num_consec_same_value]
+    n = len(values)
+    out = np.empty(n)
+    sum_x = fstate[0]
+    comp_add = fstate[1]
+    comp_remove = fstate[2]
+    prev_value = fstate[3]
+    seen = istate[0]
+    nobs = istate[1]
+    same = istate[2]
+
+    idx = 0
+    while idx < n:
+        val = values[idx]
+        if np.isinf(val):
+            val = np.nan
+        before = (sum_x, comp_add, comp_remove, prev_value)
+        before_nobs = nobs
+
+        if seen == 0 or window <= 1:
+            prev_value = val
+            same = 0
+            sum_x = 0.0
+            comp_add = 0.0
+            comp_remove = 0.0
+            nobs = 0
+        elif seen >= window:
+            old = buf[seen % window]
+            if old == old:
+                nobs -= 1
+                y = - old - comp_remove
+                t = sum_x + y
+                comp_remove = t - sum_x - y
+                sum_x = t
+
+        if val == val:
+            nobs += 1
+            y = val - comp_add
+            t = sum_x + y
+            comp_add = t - sum_x - y
+            sum_x = t
+            if val == prev_value:
+                same += 1
+            else:
+                same = 1
+            prev_value = val
+
+        buf[seen % window] = val
+        seen += 1
+
+        if nobs == 0 and minp == 0:
+            result = 0.0
+        elif nobs >= minp:
+            if same >= nobs:
+                result = prev_value * nobs
+            else:
+                result = sum_x
+        else:
+            result = np.nan
+        out[idx] = result
+        idx += 1
+
+        if (skip_runs and val == val and same >= window and nobs == before_nobs
+                and _same(sum_x, before[0]) and _same(comp_add, before[1]) and _same(comp_remove, before[2])
+                and _same(prev_value, before[3]) and _window_is(buf, val)):
+            end = _run_end(values, idx - 1)
+            out[idx:end] = result
+            seen += end - idx
+            same += end - idx
+            idx = end
+
+    fstate[0] = sum_x
+    fstate[1] = comp_add
+    fstate[2] = comp_remove
+    fstate[3] = prev_value
+    istate[0] = seen
+    istate[1] = nobs
+    istate[2] = same
+    return out
+
+
+@njit
+def rolling_var_stream(values, window, minp, ddof, buf, fstate, istate, skip_runs=False):
+    # Welford's online variance as in pandas' roll_var
+    # fstate = [mean_x, ssqdm_x, nobs, compensation_add, compensation_remove, prev_value]
+    # istate = [rows seen, num_consec_same_value]
+    n = len(values)
+    out = np.empty(n)
+    mean_x = fstate[0]
+    ssqdm_x = fstate[1]
+    nobs = fstate[2]
+    comp_add = fstate[3]
+    comp_remove = fstate[4]
+    prev_value = fstate[5]
+    seen = istate[0]
+    same = istate[1]
+    minp = max(minp, 1)
+
+    idx = 0
+    while idx < n:
+        val = values[idx]
+        if np.isinf(val):
+            val = np.nan
+        before = (mean_x, ssqdm_x, nobs, comp_add, comp_remove, prev_value)
+
+        if seen == 0 or window <= 1:
+            prev_value = val
+            same = 0
+            mean_x = 0.0
+            ssqdm_x = 0.0
+            nobs = 0.0
+            comp_add = 0.0
+            comp_remove = 0.0
+        elif seen >= window:
+            old = buf[seen % window]
+            if old == old:
+                nobs = nobs - 1
+                if nobs:
+                    prev_mean = mean_x - comp_remove
+                    y = old - comp_remove
+                    t = y - mean_x
+                    comp_remove = t + mean_x - y
+                    delta = t
+                    mean_x = mean_x - delta / nobs
+                    ssqdm_x = ssqdm_x - (old - prev_mean) * (old - mean_x)
+                else:
+                    mean_x = 0.0
+                    ssqdm_x = 0.0
+
+        if val == val:
+            nobs = nobs + 1
+            if val == prev_value:
+                same += 1
+            else:
+                same = 1
+            prev_value = val
+            prev_mean = mean_x - comp_add
+            y = val - comp_add
+            t = y - mean_x
+            comp_add = t + mean_x - y
+            delta = t
+            if nobs:
+                mean_x = mean_x + delta / nobs
+            else:
+                mean_x = 0.0
+            ssqdm_x = ssqdm_x + (val - prev_mean) * (val - mean_x)
+
+        buf[seen % window] = val
+        seen += 1
+
+        if nobs >= minp and nobs > ddof:
+            if nobs == 1 or same >= nobs:
+                result = 0.0
+            else:
+                result = ssqdm_x / (nobs - ddof)
+        else:
+            result = np.nan
+        out[idx] = result
+        idx += 1
+
+        if (skip_runs and val == val and same >= window
+                and _same(mean_x, before[0]) and _same(ssqdm_x, before[1]) and _same(nobs, before[2])
+                and _same(comp_add, before[3]) and _same(comp_remove, before[4])
+                and _same(prev_value, before[5]) and _window_is(buf, val)):
+            end = _run_end(values, idx - 1)
+            out[idx:end] = result
+            seen += end - idx
+            same += end - idx
+            idx = end
+
+    fstate[0] = mean_x
+    fstate[1] = ssqdm_x
+    fstate[2] = nobs
+    fstate[3] = comp_add
+    fstate[4] = comp_remove
+    fstate[5] = prev_value
+    istate[0] = seen
+    istate[1] = same
+    return out
+
+
+@njit
+def ewm_mean_stream(values, com, adjust, minp, fstate, istate, skip_runs=False):
+    # pandas' ewm mean with ignore_na=False and no times
+    # fstate = [weighted, old_wt], istate = [rows seen, nobs]
+    n = len(values)
+    out = np.empty(n)
+    alpha = 1. / (1. + com)
+    old_wt_factor = 1. - alpha
+    new_wt = 1. if adjust else alpha
+    weighted = fstate[0]
+    old_wt = fstate[1]
+    seen = istate[0]
+    nobs = istate[1]
+    minp = max(minp, 1)
+
+    idx = 0
+    while idx < n:
+        cur = values[idx]
+        if np.isinf(cur):
+            cur = np.nan
+        is_observation = cur == cur
+        before = (weighted, old_wt)
+        if seen == 0:
+            weighted = cur
+            nobs = 1 if is_observation else 0
+            old_wt = 1.
+        else:
+            if is_observation:
+                nobs += 1
+            if weighted == weighted:
+                old_wt *= old_wt_factor
+                if is_observation:
+                    # avoid numerical errors on constant series
+                    if weighted != cur:
+                        weighted = old_wt * weighted + new_wt * cur
+                        weighted /= (old_wt + new_wt)
+                    if adjust:
+                        old_wt += new_wt
+                    else:
+                        old_wt = 1.
+            elif is_observation:
+                weighted = cur
+        seen += 1
+        out[idx] = weighted if nobs >= minp else np.nan
+        idx += 1
+
+        if (skip_runs and is_observation and seen > 1 and nobs >= minp
+                and _same(weighted, before[0]) and _same(old_wt, before[1])):
+            end = _run_end(values, idx - 1)
+            out[idx:end] = weighted
+            seen += end - idx
+            nobs += end - idx
+            idx = end
+
+    fstate[0] = weighted
+    fstate[1] = old_wt
+    istate[0] = seen
+    istate[1] = nobs
+    return out
+
+
+@njit
+def cumsum_stream(values, fstate, istate, skip_runs=False):
+    # Series.cumsum (NaN skipped and kept as NaN in the output)
+    # fstate = [running sum], istate = [rows seen]
+    n = len(values)
+    out = np.empty(n)
+    acc = fstate[0]
+    seen = istate[0]
+    idx = 0
+    while idx < n:
+        val = values[idx]
+        is_na = val != val
+        if is_na:
+            val = 0.0
+        before = acc
+        if seen == 0:
+            acc = val
+        else:
+            acc = acc + val
+        seen += 1
+        out[idx] = np.nan if is_na else acc
+        idx += 1
+
+        if skip_runs and not is_na and seen > 1 and _same(acc, before):
+            end = _run_end(values, idx - 1)
+            out[idx:end] = acc
+            seen += end - idx
+            idx = end
+    fstate[0] = acc
+    istate[0] = seen
+    return out
+
+
+@njit
+def group_cumsum_stream(values, codes, accum, compensation):
+    # groupby(...).cumsum() with Kahan summation, codes index into the
+    # per-group accum/compensation arrays the caller keeps between blocks
+    n = len(values)
+    out = np.empty(n)
+    for idx in range(n):
+        lab = codes[idx]
+        val = values[idx]
+        if val == val:
+            y = val - compensation[lab]
+            t = accum[lab] + y
+            compensation[lab] = t - accum[lab] - y
+            accum[lab] = t
+            out[idx] = t
+        else:
+            out[idx] = val
+    return out
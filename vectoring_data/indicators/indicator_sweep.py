@@ -0,0 +1,234 @@
+"""
+Parameter sweeps: many parameterizations of an indicator in one pass.
+
+sweep(df, indicator, grid) takes a grid such as {'length': [10, 20, 50]} (every
+combination of the listed values is a variant) and returns a time x variant
+DataFrame whose columns are a MultiIndex (output, *parameters). The variants
+are computed by numba kernels running in parallel over the price arrays, and
+what they share is computed once: the close diff for all RSI lengths, each RSI
+for all the StochRSI variants built on it, each StochRSI for all the AVWAP
+band levels.
+
+The values are the same as the ones of indicators_processer (pandas_ta pandas
+code paths), the kernels reproduce the pandas arithmetic.
+
+    sweep(df, 'sma', {'length': range(5, 205, 5)})
+    sweep(df, 'avwap', {'length': [48], 'rsi_length': [64], 'k': [4], 'd': [4],
+                        'lower_band': [10, 20, 30], 'upper_band': [70, 80, 90]})
+"""
+import itertools
+from sys import float_info as sflt
+
+import numpy as np
+import pandas as pd
+from numba import njit, prange
+
+from indicator_kernels import compute_avwap, rolling_mean_stream, ewm_mean_stream
+
+# indicator: (parameters in column order, defaults, outputs)
+SWEEPS = {
+    'sma': (('length',), {}, ('SMA',)),
+    'rsi': (('length',), {}, ('RSI',)),
+    'stochrsi': (('length', 'rsi_length', 'k', 'd'), {}, ('k', 'd')),
+    'avwap': (
+        ('length', 'rsi_length', 'k', 'd', 'lower_band', 'upper_band', 'use_hilow'),
+        {'lower_band': 20, 'upper_band': 80, 'use_hilow': True},
+        ('hiAVWAP', 'loAVWAP', 'hiAVWAP_next', 'loAVWAP_next'),
+    ),
+}
+
+EPSILON = sflt.epsilon
+
+
+# ---------------------------------------------------------------------------
+# Kernels: one column per variant
+# ---------------------------------------------------------------------------
+
+@njit
+def _sma(values, length):
+    # ta.sma: rolling(length).mean()
+    return rolling_mean_stream(values, length, length, np.zeros(length), np.zeros(4), np.zeros(4, np.int64))
+
+@njit(parallel=True)
+def sma_block(close, lengths):
+    out = np.empty((len(close), len(lengths)))
+    for j in prange(len(lengths)):
+        out[:, j] = _sma(close, lengths[j])
+    return out
+
+@njit(parallel=True)
+def rsi_block(close, lengths):
+    n = len(close)
+    # close.diff() split into gains and losses, shared by every length
+    positive = np.empty(n)
+    negative = np.empty(n)
+    positive[0] = np.nan
+    negative[0] = np.nan
+    for i in range(1, n):
+        diff = close[i] - close[i - 1]
+        positive[i] = 0.0 if diff < 0 else diff
+        negative[i] = 0.0 if diff > 0 else diff
+    out = np.empty((n, len(lengths)))
+    for j in prange(len(lengths)):
+        length = lengths[j]
+        # ta.rma: ewm(alpha=1/length, min_periods=length).mean()
+        com = 1.0 / (1.0 / length) - 1.0
+        positive_avg = ewm_mean_stream(positive, com, True, length, np.zeros(2), np.zeros(2, np.int64))
+        negative_avg = ewm_mean_stream(negative, com, True, length, np.zeros(2), np.zeros(2, np.int64))
+        for i in range(n):
+            out[i, j] = 100.0 * positive_avg[i] / (positive_avg[i] + abs(negative_avg[i]))
+    return out
+
+@njit
+def _rolling_extremes(values, window):
+    # rolling(window).min() / .max(): NaN until window values without a NaN,
+    # monotonic queues of indices for the extremes
+    n = len(values)
+    lowest = np.full(n, np.nan)
+    highest = np.full(n, np.nan)
+    min_q = np.empty(n, np.int64)
+    max_q = np.empty(n, np.int64)
+    min_head = min_tail = max_head = max_tail = 0
+    last_nan = -1
+    for i in range(n):
+        val = values[i]
+        if val != val:
+            last_nan = i
+        else:
+            while min_tail > min_head and values[min_q[min_tail - 1]] >= val:
+                min_tail -= 1
+            min_q[min_tail] = i
+            min_tail += 1
+            while max_tail > max_head and values[max_q[max_tail - 1]] <= val:
+                max_tail -= 1
+            max_q[max_tail] = i
+            max_tail += 1
+        while min_tail > min_head and min_q[min_head] <= i - window:
+            min_head += 1
+        while max_tail > max_head and max_q[max_head] <= i - window:
+            max_head += 1
+        if i >= window - 1 and i - last_nan >= window:
+            lowest[i] = values[min_q[min_head]]
+            highest[i] = values[max_q[max_head]]
+    return lowest, highest
+
+@njit(parallel=True)
+def stochrsi_block(rsi, rsi_index, lengths, ks, ds):
+    # Variant j uses the RSI column rsi_index[j]
+    n = rsi.shape[0]
+    m = len(lengths)
+    k_out = np.empty((n, m))
+    d_out = np.empty((n, m))
+    for j in prange(m):
+        rsi_ = np.ascontiguousarray(rsi[:, rsi_index[j]])
+        lowest, highest = _rolling_extremes(rsi_, lengths[j])
+        diff = highest - lowest
+        # non_zero_range: epsilon is added to the whole range if it is ever 0
+        zero = False
+        for i in range(n):
+            if diff[i] == 0:
+                zero = True
+                break
+        if zero:
+            diff += EPSILON
+        stoch = 100 * (rsi_ - lowest)
+        stoch /= diff
+        k_ = _sma(stoch, ks[j])
+        k_out[:, j] = k_
+        d_out[:, j] = _sma(k_, ds[j])
+    return k_out, d_out
+
+@njit(parallel=True)
+def avwap_block(high, low, volume, close, k, d, kd_index, lower_bands, upper_bands, use_hilow):
+    # Variant j uses the StochRSI columns kd_index[j]
+    n = len(high)
+    m = len(kd_index)
+    out = np.empty((4, n, m))
+    for j in prange(m):
+        hi, lo, hi_next, lo_next = compute_avwap(
+            high, low, volume,
+            np.ascontiguousarray(k[:, kd_index[j]]),
+            np.ascontiguousarray(d[:, kd_index[j]]),
+            close, use_hilow[j], lower_bands[j], upper_bands[j]
+        )
+        out[0, :, j] = hi
+        out[1, :, j] = lo
+        out[2, :, j] = hi_next
+        out[3, :, j] = lo_next
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Grid handling
+# ---------------------------------------------------------------------------
+
+def _variants(indicator, grid):
+    names, defaults, _ = SWEEPS[indicator]
+    unknown = set(grid) - set(names)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {indicator}: {sorted(unknown)}")
+    values = []
+    for name in names:
+        if name in grid:
+            values.append(list(grid[name]))
+        elif name in defaults:
+            values.append([defaults[name]])
+        else:
+            raise ValueError(f"Parameter {name} missing from the {indicator} grid")
+    return names, list(itertools.product(*values))
+
+def _unique_index(keys):
+    # Distinct keys and, for each input key, the index of its distinct key
+    distinct = list(dict.fromkeys(keys))
+    position = {key: i for i, key in enumerate(distinct)}
+    return distinct, np.array([position[key] for key in keys], dtype=np.int64)
+
+def _array(df, column):
+    return np.ascontiguousarray(df[column].to_numpy(dtype=np.float64))
+
+def _stochrsi(close, variants):
+    # variants: [(length, rsi_length, k, d)], each RSI length computed once
+    rsi_lengths, rsi_index = _unique_index([v[1] for v in variants])
+    rsi = rsi_block(close, np.array(rsi_lengths, dtype=np.int64))
+    return stochrsi_block(
+        rsi, rsi_index,
+        np.array([v[0] for v in variants], dtype=np.int64),
+        np.array([v[2] for v in variants], dtype=np.int64),
+        np.array([v[3] for v in variants], dtype=np.int64)
+    )
+
+def sweep(df, indicator, grid):
+    """
+    Computes every variant of the grid for one indicator on df (OHLCV columns,
+    time index). Returns a time x variant DataFrame with MultiIndex columns
+    (output, *parameters).
+    """
+    if indicator not in SWEEPS:
+        raise ValueError(f"No sweep for {indicator}, available: {sorted(SWEEPS)}")
+    names, variants = _variants(indicator, grid)
+    outputs = SWEEPS[indicator][2]
+    close = _array(df, 'Close')
+
+    if indicator == 'sma':
+        blocks = [sma_block(close, np.array([v[0] for v in variants], dtype=np.int64))]
+    elif indicator == 'rsi':
+        blocks = [rsi_block(close, np.array([v[0] for v in variants], dtype=np.int64))]
+    elif indicator == 'stochrsi':
+        blocks = list(_stochrsi(close, variants))
+    else:
+        # Each StochRSI computed once for all the band levels using it
+        stoch_variants, kd_index = _unique_index([v[:4] for v in variants])
+        k, d = _stochrsi(close, stoch_variants)
+        blocks = list(avwap_block(
+            _array(df, 'High'), _array(df, 'Low'), _array(df, 'Volume'), close,
+            k, d, kd_index,
+            np.array([v[4] for v in variants], dtype=np.float64),
+            np.array([v[5] for v in variants], dtype=np.float64),
+            np.array([v[6] for v in variants], dtype=np.bool_)
+        ))
+
+    columns = pd.MultiIndex.from_tuples(
+        [(output,) + variant for output in outputs for variant in variants],
+        names=('output',) + names
+    )
+    return pd.DataFrame(np.hstack(blocks), index=df.index, columns=columns)
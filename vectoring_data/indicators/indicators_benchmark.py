@@ -0,0 +1,291 @@
+"""
+Benchmark and regression suite for the indicators.
+
+Generates a seeded synthetic OHLCV series for each scale (1m, 1H, 1D), then
+times every feature of the indicator spec on its own (with the nodes it
+depends on), compute_avwap alone, the whole graph and calculate_indicators end
+to end (CSV in and out, chunked mode for 1m). For each measure it records
+seconds, rows/s, peak resident memory (RSS) growth and a checksum of the
+values in a JSON history. The RSS is read with psutil when it is installed,
+from /proc otherwise; without either the memory is not measured.
+
+A run is compared with the last recorded run of the same scale and size on the
+same machine: it fails (exit code 1) when a measure is slower or uses more
+memory than the threshold allows, or when the values changed. Passing runs are
+appended to the history and become the next baseline.
+
+    python indicators_benchmark.py                  # 1 year of minutes, 10 years of hours/days
+    python indicators_benchmark.py --years-1m 10    # the full 10 years of minutes
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from indicator_graph import INDICATOR_SPECS, compile_graph, run_graph
+from indicator_kernels import compute_avwap
+from indicators_processer import calculate_indicators, CHUNK_ROWS
+
+HISTORY_FILE = 'indicators_benchmark_history.json'
+
+# scale: (pandas frequency, rows per year)
+SCALES = {
+    'm': ('min', 525600),
+    'H': ('h', 8760),
+    'D': ('D', 365),
+}
+
+
+def synthetic_ohlcv(n_rows, freq, seed=42):
+    # Geometric random walk for the close, bars built around it
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2015-01-01', periods=n_rows, freq=freq)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, n_rows)))
+    open_ = np.empty(n_rows)
+    open_[0] = close[0]
+    open_[1:] = close[:-1]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.0005, n_rows)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.0005, n_rows)))
+    volume = rng.lognormal(1.0, 1.0, n_rows)
+    return pd.DataFrame({
+        'Open': open_,
+        'High': high,
+        'Low': low,
+        'Close': close,
+        'Volume': volume
+    }, index=pd.DatetimeIndex(times, name='Formatted_Time'))
+
+
+def _checksum(arrays):
+    digest = hashlib.sha1()
+    for arr in arrays:
+        digest.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _rss():
+    # Resident memory of the process in bytes, None if it can't be read.
+    # tracemalloc would miss the arrays numba and numpy allocate in the kernels
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss(fn, interval=0.001):
+    # Peak RSS growth (bytes) during fn, sampled by a thread; the result is
+    # still referenced at the last sample. None without an RSS source
+    start = _rss()
+    if start is None:
+        fn()
+        return None
+    peak = [start]
+    stop = threading.Event()
+
+    def sample():
+        while not stop.is_set():
+            peak[0] = max(peak[0], _rss())
+            time.sleep(interval)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    result = fn()
+    peak[0] = max(peak[0], _rss())
+    stop.set()
+    sampler.join()
+    del result
+    return peak[0] - start
+
+
+def _measure(fn, rows, repeat):
+    # One warm-up run (numba compilation, caches), best of `repeat` runs for
+    # the time, one extra sampled run for the memory
+    result = fn()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    peak = _peak_rss(fn)
+    best = min(seconds)
+    return result, {
+        'seconds': best,
+        'rows_per_sec': rows / best if best > 0 else None,
+        'peak_rss_mb': peak / 2**20 if peak is not None else None,
+    }
+
+
+def benchmark_scale(scale, n_rows, repeat):
+    freq = SCALES[scale][0]
+    df = synthetic_ohlcv(n_rows, freq)
+    spec = INDICATOR_SPECS[scale]
+    results = {}
+
+    # Each feature alone, with its dependencies
+    for entry in spec:
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = compile_graph([entry], len(df), True)
+        if not plan['outputs']:
+            continue
+        columns, stats = _measure(lambda: run_graph(df, plan), n_rows, repeat)
+        name = entry.get('name') or (columns[0][0] if len(columns) == 1 else entry['indicator'].upper())
+        stats['checksum'] = _checksum(series.values for _, series in columns)
+        results[f'feature:{name}'] = stats
+
+    # The AVWAP kernel alone
+    high, low, close = (df[c].values.astype(np.float64) for c in ('High', 'Low', 'Close'))
+    volume = df['Volume'].values.astype(np.float64)
+    rng = np.random.default_rng(7)
+    k = rng.uniform(0, 100, n_rows)
+    d = rng.uniform(0, 100, n_rows)
+    arrays, stats = _measure(lambda: compute_avwap(high, low, volume, k, d, close, True), n_rows, repeat)
+    stats['checksum'] = _checksum(arrays)
+    results['kernel:compute_avwap'] = stats
+
+    # The whole graph, shared intermediates included
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = compile_graph(spec, len(df), True)
+    columns, stats = _measure(lambda: run_graph(df, plan), n_rows, repeat)
+    stats['checksum'] = _checksum(series.values for _, series in columns)
+    results['graph:all'] = stats
+
+    # End to end through the CSV files, as the pipeline runs it
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, f'Processed_SYNTH_1{scale}.csv')
+        output_file = os.path.join(tmp, f'Processed_SYNTH_with_indicators_1{scale}.csv')
+        df.reset_index().to_csv(input_file, index=False)
+        chunk_rows = CHUNK_ROWS if scale == 'm' else None
+
+        def end_to_end():
+            with contextlib.redirect_stdout(io.StringIO()):
+                calculate_indicators(input_file, output_file, chunk_rows)
+
+        _, stats = _measure(end_to_end, n_rows, 1)
+        with open(output_file, 'rb') as f:
+            stats['checksum'] = hashlib.sha1(f.read()).hexdigest()
+        results['end_to_end:calculate_indicators'] = stats
+
+    return results
+
+
+def _machine():
+    return {
+        'node': platform.node(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def load_history(history_file):
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file, 'r') as f:
+        return json.load(f)
+
+
+def find_baseline(history, machine, scale, n_rows):
+    for run in reversed(history):
+        if run['machine'] == machine and run['scale'] == scale and run['rows'] == n_rows:
+            return run
+    return None
+
+
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.005
+MIN_MB = 1.0
+
+
+def compare(results, baseline, threshold):
+    # Returns the list of regressions against the baseline run
+    regressions = []
+    if baseline is None:
+        return regressions
+    for name, stats in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        if stats['seconds'] > max(base['seconds'] * (1 + threshold), base['seconds'] + MIN_SECONDS):
+            regressions.append(f"{name}: {stats['seconds']:.3f}s vs {base['seconds']:.3f}s")
+        if stats['peak_rss_mb'] is not None and base.get('peak_rss_mb') is not None and \
+                stats['peak_rss_mb'] > max(base['peak_rss_mb'] * (1 + threshold), base['peak_rss_mb'] + MIN_MB):
+            regressions.append(f"{name}: peak {stats['peak_rss_mb']:.1f}MB vs {base['peak_rss_mb']:.1f}MB")
+        if stats['checksum'] != base['checksum']:
+            regressions.append(f"{name}: values changed")
+    return regressions
+
+
+def print_results(scale, n_rows, results, baseline):
+    print(f"\n** Scale 1{scale}, {n_rows} rows **")
+    print(f"{'measure':<40}{'seconds':>10}{'rows/s':>14}{'peak RSS MB':>12}{'vs base':>9}")
+    for name, stats in results.items():
+        ratio = ''
+        if baseline and baseline['results'].get(name, {}).get('seconds'):
+            ratio = f"{stats['seconds'] / baseline['results'][name]['seconds']:.2f}x"
+        peak = f"{stats['peak_rss_mb']:.1f}" if stats['peak_rss_mb'] is not None else 'n/a'
+        print(f"{name:<40}{stats['seconds']:>10.3f}{stats['rows_per_sec'] or 0:>14,.0f}{peak:>12}{ratio:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indicator benchmark and regression suite")
+    parser.add_argument('--scales', default='m,H,D', help="comma separated scales among m,H,D")
+    parser.add_argument('--years-1m', type=float, default=1, help="years of minutes for the 1m scale (up to 10)")
+    parser.add_argument('--years', type=float, default=10, help="years of data for the 1H and 1D scales")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measure, the best one is kept")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown / memory growth (0.25 = 25%%)")
+    parser.add_argument('--history', default=HISTORY_FILE, help="JSON history file")
+    parser.add_argument('--no-record', action='store_true', help="don't append this run to the history")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    machine = _machine()
+    failed = False
+    for scale in args.scales.split(','):
+        years = args.years_1m if scale == 'm' else args.years
+        n_rows = int(years * SCALES[scale][1])
+        results = benchmark_scale(scale, n_rows, args.repeat)
+        baseline = find_baseline(history, machine, scale, n_rows)
+        print_results(scale, n_rows, results, baseline)
+
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            failed = True
+            print(f"Regressions for 1{scale}:")
+            for regression in regressions:
+                print(f"  {regression}")
+        elif not args.no_record:
+            history.append({
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'machine': machine,
+                'scale': scale,
+                'rows': n_rows,
+                'results': results,
+            })
+
+    if not args.no_record:
+        with open(args.history, 'w') as f:
+            json.dump(history, f, indent=2)
+
+    if failed:
+        print("\nBenchmark failed: regressions beyond the threshold.")
+        sys.exit(1)
+    print("\nBenchmark passed.")
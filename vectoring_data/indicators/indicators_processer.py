@@ -1,129 +1,32 @@
 import pandas as pd
 import os
-import pandas_ta as ta
-import numpy as np
-from numba import njit
-from datetime import datetime
-import re
 
-@njit
-def compute_avwap(high, low, volume, k, d, close, useHiLow):
-    n = len(high)
-    hiAVWAP_arr = np.full(n, np.nan)
-    loAVWAP_arr = np.full(n, np.nan)
-    hiAVWAP_next_arr = np.full(n, np.nan)
-    loAVWAP_next_arr = np.full(n, np.nan)
-    
-    hi = high[0]
-    lo = low[0]
-    phi = hi
-    plo = lo
-    state = 0
-    hiAVWAP_s = 0.0
-    loAVWAP_s = 0.0
-    hiAVWAP_v = 0.0
-    loAVWAP_v = 0.0
-    hiAVWAP_s_next = 0.0
-    loAVWAP_s_next = 0.0
-    hiAVWAP_v_next = 0.0
-    loAVWAP_v_next = 0.0
-    lowerBand = 20
-    upperBand = 80
-    lowerReversal = 20
-    upperReversal = 80
-    
-    for idx in range(n):
-        h = high[idx]
-        l = low[idx]
-        vol = volume[idx]
-        k_val = k[idx]
-        d_val = d[idx]
-        c = close[idx]
-
-        # Update phi and reset hiAVWAP_s_next under specific conditions
-        if d_val < lowerBand and state != 1:
-            phi = h
-            hiAVWAP_s_next = 0.0
-            hiAVWAP_v_next = 0.0
-        elif h > phi:
-            phi = h  # Update phi without resetting hiAVWAP_s_next
-
-        # Update hi and reset hiAVWAP_s when h > hi
-        if h > hi:
-            hi = h
-            hiAVWAP_s = 0.0
-            hiAVWAP_v = 0.0
-
-        # Update state
-        prev_state = state
-        if state != -1 and d_val < lowerBand:
-            state = -1
-        elif state != 1 and d_val > upperBand:
-            state = 1
-
-        # VWAP calculations
-        if useHiLow:
-            vwapHi = h
-            vwapLo = l
-        else:
-            vwapHi = (h + l + c) / 3.0
-            vwapLo = vwapHi
-
-        # Accumulate hiAVWAP_s and hiAVWAP_s_next under different conditions
-        if state == 1:
-            hiAVWAP_s += vwapHi * vol
-            hiAVWAP_v += vol
-        else:
-            hiAVWAP_s_next += vwapHi * vol
-            hiAVWAP_v_next += vol
-
-        # Similar adjustments for loAVWAP_s and loAVWAP_s_next
-        if l < lo:
-            lo = l
-            loAVWAP_s = 0.0
-            loAVWAP_v = 0.0
-
-        if d_val > upperBand and state != -1:
-            plo = l
-            loAVWAP_s_next = 0.0
-            loAVWAP_v_next = 0.0
-        elif l < plo:
-            plo = l
-
-        if state == -1:
-            loAVWAP_s += vwapLo * vol
-            loAVWAP_v += vol
-        else:
-            loAVWAP_s_next += vwapLo * vol
-            loAVWAP_v_next += vol
+from indicator_graph import spec_for_file, compile_graph, run_graph
+from chunked_indicators import calculate_indicators_chunked
+from indicator_cache import IndicatorCache
 
-        # Conditional assignments
-        if hi > phi and state == 1 and k_val < d_val and k_val < lowerReversal:
-            hi = phi
-            hiAVWAP_s = hiAVWAP_s_next
-            hiAVWAP_v = hiAVWAP_v_next
+# Rows per block for the chunked mode (used for the 1 minute files, the other
+# time frames are small enough to be processed in memory)
+CHUNK_ROWS = 500_000
 
-        if lo < plo and state == -1 and k_val > d_val and k_val > upperReversal:
-            lo = plo
-            loAVWAP_s = loAVWAP_s_next
-            loAVWAP_v = loAVWAP_v_next
+# Indicator columns already computed for an input file are reused from here
+CACHE_DIR = 'indicators_cache'
+CACHE_BUDGET_BYTES = 5 * 2**30
 
-        # Calculate AVWAPs
-        hiAVWAP = hiAVWAP_s / hiAVWAP_v if hiAVWAP_v != 0.0 else np.nan
-        loAVWAP = loAVWAP_s / loAVWAP_v if loAVWAP_v != 0.0 else np.nan
-        hiAVWAP_next = hiAVWAP_s_next / hiAVWAP_v_next if hiAVWAP_v_next != 0.0 else np.nan
-        loAVWAP_next = loAVWAP_s_next / loAVWAP_v_next if loAVWAP_v_next != 0.0 else np.nan
+# 1 minute files forward-filled by processer.py, computed in change-aware mode
+# (same output, the repeated minutes are skipped where the indicators settled)
+FORWARD_FILLED = ['DXY', 'GOLD', 'NDQ', 'US02Y', 'US10Y', 'VIX', 'SPX']
 
-        # Store in arrays
-        hiAVWAP_arr[idx] = hiAVWAP
-        loAVWAP_arr[idx] = loAVWAP
-        hiAVWAP_next_arr[idx] = hiAVWAP_next
-        loAVWAP_next_arr[idx] = loAVWAP_next
 
-    return hiAVWAP_arr, loAVWAP_arr, hiAVWAP_next_arr, loAVWAP_next_arr
+def calculate_indicators(file_path, output_file, chunk_rows=None, cache=None, change_aware=False):
+    # Multi-year 1m files are streamed block by block with bounded memory,
+    # the output is the same. change_aware skips the work on the unchanged
+    # minutes of forward-filled files (see change_aware_indicators.py) and the
+    # cache resumes from the states after the cached rows, both run on the
+    # chunked mode
+    if chunk_rows or change_aware or cache is not None:
+        return calculate_indicators_chunked(file_path, output_file, chunk_rows or CHUNK_ROWS, cache, change_aware)
 
-
-def calculate_indicators(file_path, output_file):
     # Read the data
     df = pd.read_csv(file_path)
     
@@ -138,6 +41,12 @@ def calculate_indicators(file_path, output_file):
         return
     
     df.set_index('Formatted_Time', inplace=True)
+
+    # The 1 minute files of the tickers only have a Price
+    if 'Price' in df.columns and not {'Open', 'High', 'Low', 'Close'}.intersection(df.columns):
+        price = df.pop('Price')
+        for i, column in enumerate(['Open', 'High', 'Low', 'Close']):
+            df.insert(i, column, price)
     
     # Check if required columns are present
     required_columns = {'Open', 'High', 'Low', 'Close'}
@@ -145,167 +54,19 @@ def calculate_indicators(file_path, output_file):
         print(f"Required columns {required_columns} not found in {file_path}")
         return
     
-    # Calculate Simple Moving Averages (SMAs)
-    sma_periods = [5, 10, 20, 50, 100, 200, 500]
-    for period in sma_periods:
-        if len(df) >= period:
-            df[f'SMA_{period}'] = ta.sma(df['Close'], length=period)
-        else:
-            print(f"Not enough data to compute SMA_{period} for {file_path}")
-    
-    # Calculate RSI
-    rsi_period = 14  # Default RSI period
-    if len(df) >= rsi_period:
-        df['RSI'] = ta.rsi(df['Close'], length=rsi_period)
-    else:
-        print(f"Not enough data to compute RSI for {file_path}")
-    
-    # Calculate MACD
-    macd_fast = 12
-    macd_slow = 26
-    macd_signal = 9
-    if len(df) >= macd_slow:
-        macd = ta.macd(df['Close'], fast=macd_fast, slow=macd_slow, signal=macd_signal)
-        df = df.join(macd)
-    else:
-        print(f"Not enough data to compute MACD for {file_path}")
-    
-    # Calculate VWAP (Volume Weighted Average Price)
-    if 'Volume' in df.columns and not df['Volume'].isnull().all():
-        df['VWAP'] = ta.vwap(high=df['High'], low=df['Low'], close=df['Close'], volume=df['Volume'])
-        
-        # Calculate Stochastic RSI parameters
-        lengthRSI = 64
-        lengthStoch = 48
-        smoothK = 4
-        smoothD = 4
-        if len(df['Close']) >= lengthRSI:  # Check for minimum required data points
-            # Calculate Stochastic RSI
-            stoch_rsi = ta.stochrsi(
-                close=df['Close'],
-                length=lengthStoch,
-                rsi_length=lengthRSI,
-                k=smoothK,
-                d=smoothD
-            )
-
-            # Assign the columns to the DataFrame using the correct column names
-            k_col = stoch_rsi.columns[0]
-            d_col = stoch_rsi.columns[1]
-            
-            # Convert columns to NumPy arrays
-            high = df['High'].values.astype(np.float64)
-            low = df['Low'].values.astype(np.float64)
-            volume = df['Volume'].values.astype(np.float64)
-            k = stoch_rsi[k_col].values.astype(np.float64)
-            d = stoch_rsi[d_col].values.astype(np.float64)
-            close = df['Close'].values.astype(np.float64)
-
-            # Use Numba-optimized function
-            useHiLow = True  # Set based on your preference
-
-            hiAVWAP_arr, loAVWAP_arr, hiAVWAP_next_arr, loAVWAP_next_arr = compute_avwap(
-                high, low, volume, k, d, close, useHiLow
-            )
-
-            # Assign results back to the DataFrame
-            df['hiAVWAP'] = hiAVWAP_arr
-            df['loAVWAP'] = loAVWAP_arr
-            df['hiAVWAP_next'] = hiAVWAP_next_arr
-            df['loAVWAP_next'] = loAVWAP_next_arr
-        
-        else:
-            print(f"Insufficient data for StochRSI{file_path} calculation. Need at least {lengthRSI} records.") 
-
-    else:
-        print(f"Volume data not available or insufficient for VWAP in {file_path}")
-    
-     # Calculate Rolling Minima, Maxima, Standard Deviation, and Volatility
-    window_size = 30  # Adjust based on your preference
-    if len(df) >= window_size:
-        # Rolling Minima and Maxima
-        df[f'Rolling_Min_{window_size}'] = df['Low'].rolling(window=window_size).min()
-        df[f'Rolling_Max_{window_size}'] = df['High'].rolling(window=window_size).max()
-        
-        # Rolling Standard Deviation
-        df[f'Rolling_STD_{window_size}'] = df['Close'].rolling(window=window_size).std()
-        
-         # Volatility (using logarithmic returns)
-        df['Log_Returns'] = np.log(df['Close'] / df['Close'].shift(1))
-        # Extract the time frame from the file name
-        # Assuming the file name contains '_1m', '_1H', '_1D', '_1W', '_1M', or '_1Y'
-        time_frame_match = re.search(r'_1([mHDWMY])\.', file_path)
-        if time_frame_match:
-            time_frame_code = time_frame_match.group(1)
-            # Determine periods per year based on the time frame
-            if time_frame_code == 'm':
-                periods_per_year = 525600  # 365 days * 24 hours * 60 minutes
-                vol_window_size = 30
-            elif time_frame_code == 'H':
-                periods_per_year = 8760  # 365 days * 24 hours
-                vol_window_size = 12
-            elif time_frame_code == 'D':
-                periods_per_year = 365  # 365 days
-                vol_window_size = 2
-            elif time_frame_code == 'W':
-                periods_per_year = 52  # 52 weeks
-                vol_window_size = 2
-            elif time_frame_code == 'M':
-                periods_per_year = 12  # 12 months
-                vol_window_size = 2
-            elif time_frame_code == 'Y':
-                periods_per_year = 1  # 1 year
-                vol_window_size = 2
-            else:
-                print(f"Unknown time frame code '{time_frame_code}' in file path '{file_path}'")
-                return
-        else:
-            print(f"Could not determine time frame from file path '{file_path}'")
-            return
-
-        # Calculate the annualization factor
-        annualization_factor = np.sqrt(periods_per_year)
-
-        # Volatility (using logarithmic returns)
-        df[f'Volatility_{vol_window_size}'] = df['Log_Returns'].rolling(window=vol_window_size).std() * annualization_factor
-        # Drop 'Log_Returns' column if not needed
-        df.drop(columns=['Log_Returns'], inplace=True)
-
-    else:
-        print(f"Not enough data to compute rolling calculations for {file_path}")
+    spec = spec_for_file(file_path)
+    if spec is None:
+        return
 
-    # Add Volume-Based Indicators
-    # On-Balance Volume (OBV)
-    if 'Volume' in df.columns and not df['Volume'].isnull().all():
-        obv_series = ta.obv(close=df['Close'], volume=df['Volume'])
-        if not obv_series.isnull().all():
-            df['OBV'] = obv_series
-        else:
-            print(f"OBV calculation returned all NaN for {file_path}")
-    else:
-        print(f"Volume data not available for OBV in {file_path}")
-    
-    # Accumulation/Distribution Line (A/D)
-    if required_columns.union({'Volume'}).issubset(df.columns):
-        ad_series = ta.ad(high=df['High'], low=df['Low'], close=df['Close'], volume=df['Volume'])
-        if not ad_series.isnull().all():
-            df['AccDist'] = ad_series
-        else:
-            print(f"Accumulation/Distribution calculation returned all NaN for {file_path}")
-    else:
-        print(f"Required columns for Accumulation/Distribution not found in {file_path}")
-    
-    # Chaikin Money Flow (CMF)
-    cmf_period = 20
-    if len(df) >= cmf_period and required_columns.union({'Volume'}).issubset(df.columns):
-        cmf_series = ta.cmf(high=df['High'], low=df['Low'], close=df['Close'], volume=df['Volume'], length=cmf_period)
-        if not cmf_series.isnull().all():
-            df['CMF'] = cmf_series
-        else:
-            print(f"CMF calculation returned all NaN for {file_path}")
-    else:
-        print(f"Not enough data to compute CMF or required columns missing for {file_path}")
-    
+    # Compile the spec into a graph (shared intermediates are computed once,
+    # features that can't be computed on this data are skipped) and run it
+    has_volume = 'Volume' in df.columns and not df['Volume'].isnull().all()
+    plan = compile_graph(spec, len(df), has_volume, file_path)
+    columns = run_graph(df, plan)
+    for column, series in columns:
+        if series.isnull().all():
+            print(f"{column} calculation returned all NaN for {file_path}")
+        df[column] = series
 
     # Remove columns that are all NaN (indicators that couldn't be calculated)
     df.dropna(axis=1, how='all', inplace=True)
@@ -336,6 +97,7 @@ if __name__ == "__main__":
     
     # Ensure the output base directory exists
     os.makedirs(base_output_dir, exist_ok=True)
+    cache = IndicatorCache(CACHE_DIR, CACHE_BUDGET_BYTES)
     for ticker in tickers:
         for time_frame, time_name in time_frames:
             input_dir = os.path.join(base_input_dir, time_frame)
@@ -347,6 +109,9 @@ if __name__ == "__main__":
             
             if os.path.exists(input_file):
                 print(f"Processing {input_file}...")
-                calculate_indicators(input_file, output_file)
+                if time_name == 'm' and ticker in FORWARD_FILLED:
+                    calculate_indicators(input_file, output_file, CHUNK_ROWS, cache, change_aware=True)
+                else:
+                    calculate_indicators(input_file, output_file, CHUNK_ROWS if time_name == 'm' else None, cache)
             else:
                 print(f"File {input_file} not found.")
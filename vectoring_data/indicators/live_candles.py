@@ -0,0 +1,250 @@
+"""
+Live forming candles: the current partial bar of each (ticker, time frame)
+with its indicator values, updated minute by minute from the live fetchers.
+
+A tracked time frame starts from its resampled file (time_processer.py): the
+completed bars warm up the streaming indicator states of chunked_indicators.py
+and the last bar, still open when the file was written, is the forming one.
+Each new minute is merged into the forming bar; when a minute falls in a later
+bucket the forming bar is closed and folded into the states. candle() runs
+the indicator steps on a copy of the states with the forming bar as the last
+row, so its values are the ones the batch chain would compute on a file
+ending with that bar (the non_zero_range() flags come from the history).
+
+    live = LiveCandles('../timing/resampled_data')
+    live.track('BTC', 'H')
+    live.poll('BTC', '../../fetching_data/live/PriceData/BTCUSD_data.csv')
+    live.candle('BTC', 'H')
+
+The buckets and the resampled files are the ones of the timing scripts, run it
+with vectoring_data/timing importable:
+
+    PYTHONPATH=../timing python live_candles.py      (set PYTHONPATH=..\timing on Windows)
+"""
+import copy
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from indicator_graph import spec_for_file, compile_graph
+from chunked_indicators import initial_states, _run_steps
+try:
+    from minute_store import last_line, line_before
+    from session_resampler import UTC_CALENDAR, to_minutes, to_datetimes
+    from time_processer import TIME_FRAMES, load_state, calendar_key, output_path
+except ImportError as e:
+    raise ImportError(f"{e}, live_candles.py needs vectoring_data/timing on PYTHONPATH") from e
+
+
+def merge_minute(bar, o, h, l, c, v):
+    # Minute into bar ([o, h, l, c, v]), NaN skipped as in the resampling
+    if bar[0] != bar[0]:
+        bar[0] = o
+    if h == h and (bar[1] != bar[1] or h > bar[1]):
+        bar[1] = h
+    if l == l and (bar[2] != bar[2] or l < bar[2]):
+        bar[2] = l
+    if c == c:
+        bar[3] = c
+    if v == v:
+        bar[4] += v
+
+
+class LiveCandles:
+    def __init__(self, resampled_dir, calendar=UTC_CALENDAR):
+        self.resampled_dir = resampled_dir
+        self.calendar = calendar
+        # (ticker, rule): forming bar, indicator plan and states
+        self.frames = {}
+        # ticker: last minute merged (int64 epoch minute)
+        self.last_minute = {}
+        # live file: (bytes read, last line read)
+        self.live_files = {}
+        # Watermarks of the resampled files
+        self.resample_state = load_state(resampled_dir)
+
+    def _bucket(self, rule, closed, label, minute):
+        # (start, label) in epoch minutes of the bucket holding minute
+        bounds, _ = self.calendar.buckets(rule, minute, minute)
+        j = int(np.searchsorted(bounds, minute, 'left' if closed == 'right' else 'right')) - 1
+        return int(bounds[j]), int(self.calendar.labels(rule, label)[j])
+
+    def _bucket_of_label(self, rule, label, label_minute):
+        bounds, _ = self.calendar.buckets(rule, label_minute, label_minute)
+        labels = self.calendar.labels(rule, label)
+        j = int(np.searchsorted(labels, label_minute))
+        return int(bounds[j])
+
+    def _block(self, frame, label_minute, bar):
+        # One bar as the block the streaming nodes take
+        data = {'Open': [bar[0]], 'High': [bar[1]], 'Low': [bar[2]], 'Close': [bar[3]]}
+        if frame['has_volume']:
+            data['Volume'] = [bar[4]]
+        index = pd.DatetimeIndex(to_datetimes([label_minute]), name='Formatted_Time')
+        return pd.DataFrame(data, index=index)
+
+    def track(self, ticker, rule):
+        """
+        Starts following the time frame rule ('H', 'D', 'W', 'M' or 'Y') of
+        ticker from its resampled file.
+        """
+        dir_name, closed, label = next((d, c, l) for d, r, c, l in TIME_FRAMES if r == rule)
+        bars_file = output_path(self.resampled_dir, dir_name, f'Processed_{ticker}.csv', rule)
+        if not os.path.exists(bars_file):
+            print(f"File {bars_file} not found.")
+            return False
+        df = pd.read_csv(bars_file)
+        time_col = 'Formatted_Time' if 'Formatted_Time' in df.columns else 'datetime'
+        df[time_col] = pd.to_datetime(df[time_col])
+        df.rename(columns={time_col: 'Formatted_Time'}, inplace=True)
+        df.set_index('Formatted_Time', inplace=True)
+        if df.empty:
+            print(f"No bars in {bars_file}")
+            return False
+
+        spec = spec_for_file(bars_file)
+        if spec is None:
+            return False
+        has_volume = 'Volume' in df.columns and not df['Volume'].isnull().all()
+        plan = compile_graph(spec, len(df), has_volume, bars_file)
+        columns = ['Open', 'High', 'Low', 'Close'] + (['Volume'] if has_volume else [])
+        history = df[columns].astype(np.float64)
+
+        # The completed bars warm up the states, the last one is forming
+        states = initial_states(plan['steps'], lambda: [history])
+        if len(history) > 1:
+            _run_steps(history.iloc[:-1], plan['steps'], states)
+        last = history.iloc[-1]
+        label_minute = int(to_minutes(history.index[-1:].values)[0])
+        self.frames[(ticker, rule)] = {
+            'closed': closed,
+            'label': label,
+            'plan': plan,
+            'states': states,
+            'has_volume': has_volume,
+            'bucket': self._bucket_of_label(rule, label, label_minute),
+            'label_minute': label_minute,
+            'bar': [float(last['Open']), float(last['High']), float(last['Low']), float(last['Close']),
+                    float(last['Volume']) if has_volume else 0.0]
+        }
+
+        # Minutes up to the watermark of the resampling are already in the bars
+        file_state = self.resample_state.get(f'Processed_{ticker}.csv')
+        if file_state and file_state['calendar'] == calendar_key(self.calendar):
+            self.last_minute[ticker] = max(self.last_minute.get(ticker, file_state['watermark']), file_state['watermark'])
+        print(f"Tracking {ticker} 1{rule} from {len(history) - 1} completed bars")
+        return True
+
+    def update(self, ticker, minute_time, open_, high, low, close, volume=np.nan):
+        """
+        Merges one minute (naive UTC time) into the forming bars of ticker.
+        Minutes not after the last one merged are ignored (returns False).
+        """
+        minute = int(to_minutes(np.array([np.datetime64(pd.Timestamp(minute_time))]))[0])
+        if minute <= self.last_minute.get(ticker, minute - 1):
+            return False
+        self.last_minute[ticker] = minute
+        for (frame_ticker, rule), frame in self.frames.items():
+            if frame_ticker != ticker:
+                continue
+            start, label_minute = self._bucket(rule, frame['closed'], frame['label'], minute)
+            if start < frame['bucket']:
+                continue
+            if start > frame['bucket']:
+                # The forming bar is complete, it goes into the states (bars
+                # without a valid OHLC are dropped, as in the resampled files)
+                bar = frame['bar']
+                if not np.isnan(bar[:4]).any():
+                    _run_steps(self._block(frame, frame['label_minute'], bar), frame['plan']['steps'], frame['states'])
+                frame.update({'bucket': start, 'label_minute': label_minute, 'bar': [np.nan, np.nan, np.nan, np.nan, 0.0]})
+            merge_minute(frame['bar'], open_, high, low, close, volume)
+        return True
+
+    def candle(self, ticker, rule):
+        """
+        The forming bar of (ticker, rule) with its indicator values, as a dict
+        of the columns of the indicator files. None before a valid price.
+        """
+        frame = self.frames.get((ticker, rule))
+        if frame is None or np.isnan(frame['bar'][:4]).any():
+            return None
+        block = self._block(frame, frame['label_minute'], frame['bar'])
+        plan = frame['plan']
+        results = _run_steps(block, plan['steps'], copy.deepcopy(frame['states']))
+        row = {'Formatted_Time': block.index[0]}
+        row.update({column: float(block[column].iloc[0]) for column in block.columns})
+        for name, key in plan['outputs']:
+            result = results[key]
+            if isinstance(result, pd.DataFrame):
+                row.update({column: float(series.iloc[0]) for column, series in result.items()})
+            else:
+                row[name] = float(result.iloc[0])
+        return row
+
+    def poll(self, ticker, live_file):
+        """
+        Merges the minutes added to a live fetcher file since the last poll:
+        the BTC file (Timestamp, Open, High, Low, Close, Volume) or a ticker
+        file (timestamp, price, volume). Returns the number of new minutes.
+        """
+        if not os.path.exists(live_file):
+            print(f"Live file {live_file} not found.")
+            return 0
+        with open(live_file, 'rb') as f:
+            header = f.readline()
+            size = f.seek(0, 2)
+            offset, line = self.live_files.get(live_file, (len(header), None))
+            # Files rewritten by the fetcher are read again from the top, the
+            # minutes already merged are skipped by update()
+            if size < offset or (line is not None and line_before(f, offset) != line):
+                offset = len(header)
+            f.seek(offset)
+            data = f.read()
+        data = data[:data.rfind(b'\n') + 1]
+        if not data.strip():
+            return 0
+        self.live_files[live_file] = (offset + len(data), last_line(data))
+
+        df = pd.read_csv(io.BytesIO(header + data))
+        if 'Timestamp' in df.columns:
+            times = pd.to_datetime(df['Timestamp'].astype(np.int64), unit='s')
+            o, h, l, c = [df[col].to_numpy(dtype=np.float64) for col in ['Open', 'High', 'Low', 'Close']]
+            v = df['Volume'].to_numpy(dtype=np.float64)
+        else:
+            times = pd.to_datetime(df['timestamp'], format='%Y-%m-%d %H:%M')
+            o = h = l = c = df['price'].to_numpy(dtype=np.float64)
+            v = df['volume'].to_numpy(dtype=np.float64) if 'volume' in df.columns else np.full(len(df), np.nan)
+        merged = 0
+        for i in np.argsort(times.values, kind='stable'):
+            merged += self.update(ticker, times.iloc[i], o[i], h[i], l[i], c[i], v[i])
+        return merged
+
+
+if __name__ == "__main__":
+    resampled_dir = '../timing/resampled_data'
+    live_dir = '../../fetching_data/live/PriceData'
+    live_files = {'BTC': 'BTCUSD_data.csv'}
+    for ticker in ['DXY', 'GOLD', 'NDQ', 'US02Y', 'US10Y', 'VIX', 'SPX']:
+        live_files[ticker] = f'{ticker}_data.csv'
+
+    live = LiveCandles(resampled_dir)
+    for ticker in live_files:
+        for rule in ['H', 'D', 'W']:
+            live.track(ticker, rule)
+
+    # Print the forming BTC candles at the start of every minute
+    while True:
+        try:
+            for ticker, live_file in live_files.items():
+                live.poll(ticker, os.path.join(live_dir, live_file))
+            for rule in ['H', 'D', 'W']:
+                candle = live.candle('BTC', rule)
+                if candle is not None:
+                    print(f"BTC 1{rule} forming candle: {candle}")
+            time.sleep(60 - time.time() % 60)
+        except KeyboardInterrupt:
+            print("Stopped by user.")
+            break
@@ -0,0 +1,345 @@
+"""
+Integrity scanner for the time series CSV files.
+
+Only the time column (as int64 seconds) and the price column are read, located
+in the raw bytes without a CSV parse, and every check is done on the time
+differences and price equalities computed once per file:
+
+- duplicates: times seen more than once
+- non_monotonic: rows earlier than the row before them
+- gaps: steps longer than the frequency of the file (from _1m, _1H, _1D, _1W,
+  _1M or _1Y in its name, 1 minute otherwise), with the missing periods
+- nan / constant runs of the price: count and longest run
+
+Files are scanned in parallel and the results go to one JSON report.
+"""
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from numba import njit
+
+# Frequency of each time frame, in seconds (M and Y are counted in months and
+# years instead)
+FREQUENCIES = {'m': 60, 'H': 3600, 'D': 86400, 'W': 7 * 86400}
+
+# Constant price runs at least this long (rows) are counted
+LONG_RUN_ROWS = 60
+
+# Examples kept in the report for each check
+MAX_EXAMPLES = 20
+
+
+@njit
+def field_bounds(raw, start, n_lines, wanted, n_fields):
+    # One pass over the bytes from start: (start, length) of the fields
+    # wanted[j] of every non-empty line (n_lines at most), and whether every
+    # line has n_fields fields (no quoted commas, no truncated lines)
+    starts = np.empty((n_lines, len(wanted)), np.int64)
+    lengths = np.empty((n_lines, len(wanted)), np.int64)
+    row = 0
+    field = 0
+    field_start = start
+    line_start = start
+    for i in range(start, len(raw) + 1):
+        byte = raw[i] if i < len(raw) else 10
+        if byte != 44 and byte != 10:
+            continue
+        end = i
+        if byte == 10 and end > field_start and raw[end - 1] == 13:
+            end -= 1
+        for j in range(len(wanted)):
+            if wanted[j] == field:
+                starts[row, j] = field_start
+                lengths[row, j] = end - field_start
+        if byte == 44:
+            field += 1
+        else:
+            if end > line_start:
+                if field != n_fields - 1:
+                    return starts[:0], lengths[:0], False
+                row += 1
+            field = 0
+            line_start = i + 1
+        field_start = i + 1
+    return starts[:row], lengths[:row], True
+
+def read_fields(file_path, columns):
+    """
+    The raw bytes of some columns of a plain CSV file, without parsing the
+    others. Returns {column: fixed width bytes array}, or None if the file
+    isn't a plain CSV with the same number of fields on every line.
+    """
+    raw = np.fromfile(file_path, dtype=np.uint8)
+    newline = np.flatnonzero(raw[:1 << 16] == ord('\n'))
+    if len(newline) == 0:
+        return None
+    header = bytes(raw[:newline[0]]).decode('utf-8', 'replace').rstrip('\r').split(',')
+    if not set(columns) <= set(header):
+        return None
+    wanted = np.array([header.index(column) for column in columns], dtype=np.int64)
+    n_lines = int(np.count_nonzero(raw == ord('\n'))) + 1
+    starts, lengths, ok = field_bounds(raw, int(newline[0]) + 1, n_lines, wanted, len(header))
+    if not ok:
+        return None
+    fields = {}
+    for j, column in enumerate(columns):
+        width = max(int(lengths[:, j].max()), 1) if len(lengths) else 1
+        fields[column] = gather_fields(raw, starts[:, j], lengths[:, j], width).view(f'S{width}').ravel()
+    return fields
+
+@njit
+def gather_fields(raw, starts, lengths, width):
+    # The fields as rows of width bytes, zero padded
+    out = np.zeros((len(starts), width), np.uint8)
+    for r in range(len(starts)):
+        for i in range(lengths[r]):
+            out[r, i] = raw[starts[r] + i]
+    return out
+
+def read_times(file_path):
+    # (int64 epoch seconds, price values as raw bytes) of the file, price may
+    # be None. Empty or 'nan' prices are NaN
+    columns = pd.read_csv(file_path, nrows=0).columns
+    price_col = next((col for col in ['Close', 'Price', 'price'] if col in columns), None)
+    for time_col in ['Formatted_Time', 'datetime', 'timestamp', 'Timestamp']:
+        if time_col in columns:
+            break
+    else:
+        raise ValueError(f"No time column found in {file_path}")
+    usecols = [time_col] + ([price_col] if price_col else [])
+    fields = read_fields(file_path, usecols)
+    try:
+        seconds = parse_times(fields[time_col], time_col) if fields else None
+    except ValueError:
+        # Quoted values
+        seconds = None
+    if seconds is None:
+        # Not a plain CSV, parsed by pandas
+        df = pd.read_csv(file_path, usecols=usecols, dtype=str, keep_default_na=False)
+        fields = {col: df[col].to_numpy().astype(bytes) for col in usecols}
+        seconds = parse_times(fields[time_col], time_col)
+    return seconds, fields[price_col] if price_col else None
+
+def parse_times(values, time_col):
+    # Time fields (bytes) to int64 epoch seconds
+    if time_col == 'Timestamp':
+        # Unix seconds (BTC live data)
+        return values.astype(np.float64).astype(np.int64)
+    seconds = parse_iso(values)
+    if seconds is None:
+        # Other layouts (and invalid dates, reported) go through pandas
+        times = pd.to_datetime(pd.Series(values.astype(str)), format='ISO8601')
+        seconds = times.values.astype('datetime64[s]').astype(np.int64)
+    return seconds
+
+@njit
+def iso_seconds(chars):
+    # Rows of 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD' bytes to epoch seconds,
+    # ok is False if a row isn't a valid date of that layout
+    n, width = chars.shape
+    seconds = np.empty(n, np.int64)
+    month_days = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    for r in range(n):
+        values = np.zeros(6, np.int64)
+        for i in range(width):
+            c = chars[r, i]
+            if i == 4 or i == 7:
+                if c != 45:
+                    return seconds, False
+            elif i == 10:
+                if c != 32:
+                    return seconds, False
+            elif i == 13 or i == 16:
+                if c != 58:
+                    return seconds, False
+            else:
+                if c < 48 or c > 57:
+                    return seconds, False
+                part = 0 if i < 4 else 1 if i < 7 else 2 if i < 10 else 3 if i < 13 else 4 if i < 16 else 5
+                values[part] = values[part] * 10 + (c - 48)
+        year, month, day, hour, minute, second = values[0], values[1], values[2], values[3], values[4], values[5]
+        if month < 1 or month > 12 or day < 1 or hour > 23 or minute > 59 or second > 59:
+            return seconds, False
+        leap = year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+        if day > month_days[month - 1] + (1 if leap and month == 2 else 0):
+            return seconds, False
+        # Days from 1970-01-01 of the proleptic Gregorian date
+        y = year - 1 if month <= 2 else year
+        era = y // 400
+        year_of_era = y - era * 400
+        day_of_year = (153 * (month - 3 if month > 2 else month + 9) + 2) // 5 + day - 1
+        day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+        days = era * 146097 + day_of_era - 719468
+        seconds[r] = days * 86400 + hour * 3600 + minute * 60 + second
+    return seconds, True
+
+def parse_iso(values):
+    # Time fields of the fixed ISO layouts to epoch seconds, None otherwise.
+    # (numpy's own bytes to datetime64 cast can crash on invalid fields
+    # instead of raising)
+    width = values.dtype.itemsize
+    if width not in (10, 19) or len(values) == 0:
+        return None
+    seconds, ok = iso_seconds(np.ascontiguousarray(values).view(np.uint8).reshape(len(values), width))
+    return seconds if ok else None
+
+def runs(mask):
+    # (start, length) of the runs of True in a boolean array
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends - starts
+
+def as_time(seconds):
+    return str(np.datetime64(int(seconds), 's')).replace('T', ' ')
+
+def steps_of(seconds, time_frame):
+    # Times in units of the frequency: seconds, months or years
+    if time_frame == 'M':
+        return seconds.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64), 1
+    if time_frame == 'Y':
+        return seconds.astype('datetime64[s]').astype('datetime64[Y]').astype(np.int64), 1
+    return seconds, FREQUENCIES[time_frame]
+
+def scan_file(file_path):
+    """
+    Checks one file, returns its report entry.
+    """
+    started = time.time()
+    match = re.search(r'_1([mHDWMY])\.csv$', file_path)
+    time_frame = match.group(1) if match else 'm'
+    try:
+        seconds, price = read_times(file_path)
+    except Exception as e:
+        return {'file': file_path, 'error': str(e)}
+
+    n = len(seconds)
+    report = {'file': file_path, 'rows': n, 'time_frame': time_frame}
+    if n:
+        report['first'] = as_time(seconds.min())
+        report['last'] = as_time(seconds.max())
+
+    units, frequency = steps_of(seconds, time_frame)
+    diff = np.diff(units)
+
+    # Ordering: rows going back in time
+    back = np.flatnonzero(diff < 0)
+    report['non_monotonic'] = {
+        'count': int(len(back)),
+        'examples': [as_time(seconds[i + 1]) for i in back[:MAX_EXAMPLES]]
+    }
+
+    # Duplicates: equal neighbours once sorted (the file order if monotonic)
+    if len(back):
+        sorted_seconds = np.sort(seconds)
+        same = np.flatnonzero(np.diff(sorted_seconds) == 0)
+        duplicated = sorted_seconds[same]
+    else:
+        duplicated = seconds[np.flatnonzero(diff == 0)]
+    report['duplicates'] = {
+        'count': int(len(duplicated)),
+        'times': int(len(np.unique(duplicated))),
+        'examples': [as_time(s) for s in np.unique(duplicated)[:MAX_EXAMPLES]]
+    }
+
+    # Gaps: steps longer than the frequency (in time order)
+    ordered_units = np.sort(units) if len(back) else units
+    ordered_seconds = np.sort(seconds) if len(back) else seconds
+    steps = np.diff(ordered_units)
+    gap = np.flatnonzero(steps > frequency)
+    missing = steps[gap] // frequency - 1
+    largest = gap[np.argmax(missing)] if len(gap) else None
+    report['gaps'] = {
+        'count': int(len(gap)),
+        'missing_periods': int(missing.sum()),
+        'largest': None if largest is None else {
+            'after': as_time(ordered_seconds[largest]),
+            'before': as_time(ordered_seconds[largest + 1]),
+            'missing_periods': int(steps[largest] // frequency - 1)
+        },
+        'examples': [as_time(ordered_seconds[i]) for i in gap[:MAX_EXAMPLES]]
+    }
+
+    # Price: NaN runs and runs of the same value (same text, same value)
+    if price is not None:
+        nan = (price == b'') | (price == b'nan') | (price == b'NaN')
+        starts, lengths = runs(nan)
+        report['nan'] = {
+            'count': int(nan.sum()),
+            'runs': int(len(starts)),
+            'longest': int(lengths.max()) if len(lengths) else 0,
+            'longest_from': as_time(seconds[starts[np.argmax(lengths)]]) if len(lengths) else None
+        }
+        starts, lengths = runs(price[1:] == price[:-1])
+        lengths = lengths + 1
+        long_runs = lengths >= LONG_RUN_ROWS
+        report['constant'] = {
+            'runs': int(long_runs.sum()),
+            'rows': int(lengths[long_runs].sum()),
+            'longest': int(lengths.max()) if len(lengths) else 0,
+            'longest_from': as_time(seconds[starts[np.argmax(lengths)]]) if len(lengths) else None
+        }
+
+    report['seconds'] = round(time.time() - started, 3)
+    return report
+
+def scan(input_dirs, report_file, workers=None):
+    """
+    Scans every CSV under input_dirs in parallel and writes the JSON report.
+    """
+    files = []
+    for input_dir in input_dirs:
+        for root, dirs, names in os.walk(input_dir):
+            files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith('.csv'))
+    if not files:
+        print(f"No CSV files found in {input_dirs}.")
+        return None
+
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        reports = list(executor.map(scan_file, files))
+
+    problems = 0
+    for report in reports:
+        if 'error' in report:
+            problems += 1
+            print(f"{report['file']}: {report['error']}")
+            continue
+        issues = report['duplicates']['count'] + report['non_monotonic']['count']
+        problems += issues > 0
+        print(f"{report['file']}: {report['rows']} rows, {report['duplicates']['count']} duplicates, "
+              f"{report['non_monotonic']['count']} out of order, {report['gaps']['count']} gaps "
+              f"({report['gaps']['missing_periods']} missing)")
+
+    summary = {
+        'files': len(reports),
+        'files_with_problems': problems,
+        'seconds': round(time.time() - started, 3),
+        'reports': reports
+    }
+    report_dir = os.path.dirname(report_file)
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+    with open(report_file, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Scanned {len(reports)} files in {summary['seconds']}s, report saved to {report_file}")
+    return summary
+
+
+if __name__ == "__main__":
+    # Define the input directories and the report file
+    input_dirs = ['resampled_data']
+    report_file = 'integrity_report.json'
+
+    # Ensure the input directories exist
+    for input_dir in input_dirs:
+        if not os.path.exists(input_dir):
+            print(f"Input directory {input_dir} does not exist.")
+            exit(1)
+
+    scan(input_dirs, report_file)
@@ -0,0 +1,254 @@
+"""
+Partitioned columnar store of the processed minute data.
+
+Each ticker is a directory of monthly partitions, one .npz file per month
+(minute_store/BTC/2024-05.npz) holding the int64 epoch minutes ('minute', sorted,
+unique) and one typed array per column. Readers load only the partitions in
+the requested time range and only the requested columns (an .npz member is
+read when accessed); writers rewrite only the partitions they touch, the
+newest one for the hourly appends.
+
+    store = MinuteStore(STORE_DIR)
+    store.sync_csv('BTC', '../../fetching_data/history/LIVE PROCESSED/Processed_BTC.csv')
+    df = store.read('BTC', columns=['Close'], start='2024-05-01', end='2024-05-31 23:59')
+
+time_processer.py syncs the store with a processed file (LIVE PROCESSED)
+before resampling it as a whole, and reads the minutes from it instead of
+parsing the CSV when in_sync() says it holds every row of the file.
+
+The CSV tail helpers (last_line, line_before) of the timing scripts are here
+too.
+"""
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from session_resampler import MINUTE_NS, to_minutes
+
+META_FILE = 'meta.json'
+# Store of the timing scripts, next to resampled_data
+STORE_DIR = 'minute_store'
+
+
+def last_line(data):
+    # Last line of the bytes, without its newline
+    return data.rstrip(b'\r\n').rsplit(b'\n', 1)[-1].decode('utf-8', 'replace')
+
+def line_before(f, offset):
+    # The line of the file ending at offset
+    start = max(offset - 4096, 0)
+    f.seek(start)
+    return last_line(f.read(offset - start))
+
+def month_of(minutes):
+    # 'YYYY-MM' partition of each epoch minute
+    return np.asarray(minutes, dtype=np.int64).astype('datetime64[m]').astype('datetime64[M]').astype(str)
+
+
+class MinuteStore:
+    def __init__(self, root):
+        self.root = root
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, ticker)
+
+    def _path(self, ticker, month):
+        return os.path.join(self._dir(ticker), f'{month}.npz')
+
+    def load_meta(self, ticker):
+        meta_file = os.path.join(self._dir(ticker), META_FILE)
+        if not os.path.exists(meta_file):
+            return {}
+        with open(meta_file) as f:
+            return json.load(f)
+
+    def save_meta(self, ticker, meta):
+        meta_file = os.path.join(self._dir(ticker), META_FILE)
+        with open(meta_file + '.tmp', 'w') as f:
+            json.dump(meta, f, indent=4)
+        os.replace(meta_file + '.tmp', meta_file)
+
+    def partitions(self, ticker):
+        # Months stored for ticker, sorted
+        if not os.path.isdir(self._dir(ticker)):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self._dir(ticker)) if name.endswith('.npz'))
+
+    def _load(self, ticker, month, columns=None):
+        with np.load(self._path(ticker, month)) as data:
+            names = [name for name in data.files if name != 'minute'] if columns is None else columns
+            return data['minute'], {name: data[name] for name in names}
+
+    def _save(self, ticker, month, minute, columns):
+        # np.savez adds .npz to a name without it, the temporary file keeps it
+        path = self._path(ticker, month)
+        tmp_path = path[:-4] + '.tmp.npz'
+        np.savez(tmp_path, minute=minute, **columns)
+        os.replace(tmp_path, path)
+
+    def last_minute(self, ticker):
+        months = self.partitions(ticker)
+        if not months:
+            return None
+        with np.load(self._path(ticker, months[-1])) as data:
+            minute = data['minute']
+        return int(minute[-1]) if len(minute) else None
+
+    def append(self, ticker, minutes, columns):
+        """
+        Appends rows (epoch minutes and {column: array}) to ticker. Stored rows
+        from the first new minute on are replaced, so the last minutes can be
+        written again; only the partitions of the new rows are rewritten.
+        Returns the number of rows written.
+        """
+        minutes = np.asarray(minutes, dtype=np.int64)
+        if len(minutes) == 0:
+            return 0
+        order = np.argsort(minutes, kind='stable')
+        minutes = minutes[order]
+        columns = {name: np.asarray(values)[order] for name, values in columns.items()}
+        # Last value of a repeated minute wins
+        keep = np.append(minutes[1:] != minutes[:-1], True)
+        minutes = minutes[keep]
+        columns = {name: values[keep] for name, values in columns.items()}
+
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        first = minutes[0]
+        months = month_of(minutes)
+        # Partitions after the first new month only hold rows being replaced
+        stored = self.partitions(ticker)
+        for month in stored:
+            if month > months[0]:
+                os.remove(self._path(ticker, month))
+        bounds = np.flatnonzero(np.append(True, months[1:] != months[:-1]))
+        for i, start in enumerate(bounds):
+            end = bounds[i + 1] if i + 1 < len(bounds) else len(minutes)
+            month = months[start]
+            part_minutes = minutes[start:end]
+            part_columns = {name: values[start:end] for name, values in columns.items()}
+            if i == 0 and month in stored:
+                old_minutes, old_columns = self._load(ticker, month)
+                if set(old_columns) != set(part_columns):
+                    raise ValueError(f"Columns of {ticker} changed: {sorted(old_columns)} -> {sorted(part_columns)}")
+                kept = old_minutes < first
+                part_minutes = np.concatenate([old_minutes[kept], part_minutes])
+                part_columns = {name: np.concatenate([old_columns[name][kept], values])
+                                for name, values in part_columns.items()}
+            self._save(ticker, month, part_minutes, part_columns)
+        return len(minutes)
+
+    def read(self, ticker, columns=None, start=None, end=None):
+        """
+        Rows of ticker between start and end (included, anything pd.Timestamp
+        takes, None for no bound) as a DataFrame indexed by 'datetime', with
+        only the given columns (all by default).
+        """
+        first = None if start is None else int(to_minutes([pd.Timestamp(start).to_datetime64()])[0])
+        last = None if end is None else int(to_minutes([pd.Timestamp(end).to_datetime64()])[0])
+        months = self.partitions(ticker)
+        # Partitions outside the range are not opened
+        if first is not None:
+            months = [month for month in months if month >= month_of([first])[0]]
+        if last is not None:
+            months = [month for month in months if month <= month_of([last])[0]]
+
+        parts_minutes = []
+        parts_columns = []
+        for month in months:
+            minute, values = self._load(ticker, month, columns)
+            lo = 0 if first is None else np.searchsorted(minute, first, 'left')
+            hi = len(minute) if last is None else np.searchsorted(minute, last, 'right')
+            parts_minutes.append(minute[lo:hi])
+            parts_columns.append({name: array[lo:hi] for name, array in values.items()})
+        if not parts_minutes:
+            return pd.DataFrame(columns=columns or [], index=pd.DatetimeIndex([], name='datetime'))
+        minute = np.concatenate(parts_minutes)
+        data = {name: np.concatenate([part[name] for part in parts_columns]) for name in parts_columns[0]}
+        index = pd.DatetimeIndex(minute * MINUTE_NS, name='datetime')
+        return pd.DataFrame(data, index=index)
+
+    def sync_csv(self, ticker, csv_file):
+        """
+        Brings ticker up to date with its processed CSV (first column the
+        time): only the lines from the last one stored are read, the last line
+        is read again as the tail mode of processer.py rewrites it. A CSV
+        rewritten in its older lines is imported again as a whole.
+        Returns the number of rows written.
+        """
+        meta = self.load_meta(ticker)
+        with open(csv_file, 'rb') as f:
+            header = f.readline()
+            size = f.seek(0, 2)
+            offset = meta.get('offset', len(header))
+            # The line before the offset must not have changed
+            full = size < offset or line_before(f, offset) != meta.get('line_before')
+            if full:
+                offset = len(header)
+            f.seek(offset)
+            data = f.read()
+        data = data[:data.rfind(b'\n') + 1]
+        if not data:
+            return 0
+
+        df = pd.read_csv(io.BytesIO(header + data))
+        time_col = df.columns[0]
+        minutes = to_minutes(pd.to_datetime(df[time_col]).values)
+        columns = {}
+        # Dtypes of the columns when the whole CSV is parsed: integer only if
+        # every part read so far was (the values are stored as float64)
+        dtypes = {} if full else meta.get('dtypes', {})
+        for name in df.columns[1:]:
+            values = df[name].to_numpy()
+            columns[name] = values.astype(np.int64) if name == 'Timestamp' else values.astype(np.float64)
+            dtype = str(values.dtype)
+            dtypes[name] = dtype if dtypes.get(name, dtype) == dtype else 'float64'
+        if full:
+            for month in self.partitions(ticker):
+                os.remove(self._path(ticker, month))
+        written = self.append(ticker, minutes, columns)
+
+        # Next time from the start of the last line read
+        offset += data.rstrip(b'\r\n').rfind(b'\n') + 1
+        with open(csv_file, 'rb') as f:
+            self.save_meta(ticker, {
+                'offset': offset,
+                'line_before': line_before(f, offset),
+                'last_line': last_line(data),
+                'dtypes': dtypes,
+            })
+        return written
+
+    def in_sync(self, ticker, csv_file):
+        # Whether ticker holds every row of its CSV: the file still ends with
+        # the last line of the last sync_csv, at the same offset
+        meta = self.load_meta(ticker)
+        if 'last_line' not in meta or not os.path.exists(csv_file):
+            return False
+        with open(csv_file, 'rb') as f:
+            size = f.seek(0, 2)
+            # More than a line after the offset: rows were added since
+            if size < meta['offset'] or size - meta['offset'] > 1 << 16:
+                return False
+            f.seek(meta['offset'])
+            if f.read().rstrip(b'\r\n').decode() != meta['last_line']:
+                return False
+            return line_before(f, meta['offset']) == meta['line_before']
+
+    def column_dtypes(self, ticker):
+        # {column: dtype of the column in the CSV} as of the last sync_csv
+        return self.load_meta(ticker).get('dtypes', {})
+
+if __name__ == "__main__":
+    # Import (or bring up to date) the processed files into the store
+    input_dir = '../../fetching_data/history/LIVE PROCESSED'
+    store = MinuteStore(STORE_DIR)
+    for ticker in ['BTC', 'DXY', 'GOLD', 'NDQ', 'US02Y', 'US10Y', 'VIX', 'SPX']:
+        csv_file = os.path.join(input_dir, f'Processed_{ticker}.csv')
+        if not os.path.exists(csv_file):
+            print(f"File {csv_file} not found.")
+            continue
+        written = store.sync_csv(ticker, csv_file)
+        print(f"{ticker}: {written} rows written, {len(store.partitions(ticker))} monthly partitions")
@@ -0,0 +1,245 @@
+"""
+OHLCV aggregation over int64 epoch minutes with precomputed bucket boundaries.
+
+A SessionCalendar says where the bars of each time frame start: the timezone
+of the market, the start of the trading day relative to the local midnight
+(0 for BTC on UTC days, -7h for the CME day opening at 17:00 New York the day
+before) and the first day of the week. Its boundaries are int64 epoch minutes
+in UTC, computed once per time frame (DST included) and reused for every
+ticker resampled with the calendar.
+
+aggregate_buckets is a single linear pass over the sorted minutes: every row
+falls in the bucket between two boundaries, no DatetimeIndex involved.
+
+resample_cascade only passes over the minutes for the hours: the days are
+aggregated from the hour bars, the weeks and months from the day bars and the
+years from the month bars (SOURCE_RULES). The buckets nest as long as the
+closed side is the same all the way down, so a frame closed on the other side
+than the one it is asked with gets its own chain (the left-closed hours and
+days under the weeks). Only the volume sums can differ from an aggregation of
+the minutes, by rounding.
+"""
+import numpy as np
+import pandas as pd
+from numba import njit
+
+MINUTE_NS = 60 * 10**9
+
+
+@njit
+def aggregate_buckets(minutes, open_, high, low, close, volume, bounds, closed_right):
+    # Bucket i holds the minutes between bounds[i] and bounds[i + 1], the right
+    # end included if closed_right (else the left one). minutes must be sorted.
+    # NaN are skipped like pandas does: first / last valid value, max / min of
+    # the valid values, Kahan sum of the valid volumes.
+    n_buckets = len(bounds) - 1
+    o = np.full(n_buckets, np.nan)
+    h = np.full(n_buckets, np.nan)
+    l = np.full(n_buckets, np.nan)
+    c = np.full(n_buckets, np.nan)
+    v = np.zeros(n_buckets)
+    compensation = np.zeros(n_buckets)
+    count = np.zeros(n_buckets, np.int64)
+    j = 0
+    for i in range(len(minutes)):
+        t = minutes[i]
+        if closed_right:
+            while j < n_buckets and t > bounds[j + 1]:
+                j += 1
+            if j == n_buckets or t <= bounds[j]:
+                continue
+        else:
+            while j < n_buckets and t >= bounds[j + 1]:
+                j += 1
+            if j == n_buckets or t < bounds[j]:
+                continue
+        count[j] += 1
+        val = open_[i]
+        if o[j] != o[j] and val == val:
+            o[j] = val
+        val = high[i]
+        if val == val and (h[j] != h[j] or val > h[j]):
+            h[j] = val
+        val = low[i]
+        if val == val and (l[j] != l[j] or val < l[j]):
+            l[j] = val
+        val = close[i]
+        if val == val:
+            c[j] = val
+        val = volume[i]
+        if val == val:
+            y = val - compensation[j]
+            total = v[j] + y
+            compensation[j] = total - v[j] - y
+            v[j] = total
+    return o, h, l, c, v, count
+
+
+def to_minutes(times):
+    # datetime64 values (naive UTC) to int64 epoch minutes
+    return np.asarray(times, dtype='datetime64[ns]').astype(np.int64) // MINUTE_NS
+
+def to_datetimes(minutes):
+    return pd.to_datetime(np.asarray(minutes, dtype=np.int64) * MINUTE_NS)
+
+
+class SessionCalendar:
+    def __init__(self, timezone, day_start=0, week_start=0):
+        # day_start: minutes from the local midnight to the start of the
+        # trading day (negative: the evening before)
+        # week_start: weekday of the first trading day of the week (0 = Monday)
+        self.timezone = timezone
+        self.day_start = day_start
+        self.week_start = week_start
+        # rule: (first minute, last minute, boundaries, period dates)
+        self._buckets = {}
+
+    def _period_dates(self, rule, first_day, last_day):
+        # Local dates of the trading days starting a period, around the span
+        days = pd.date_range(first_day - pd.Timedelta(days=400), last_day + pd.Timedelta(days=400), freq='D')
+        if rule == 'D':
+            return days
+        if rule == 'W':
+            return days[days.weekday == self.week_start]
+        if rule == 'M':
+            return days[days.day == 1]
+        if rule == 'Y':
+            return days[(days.month == 1) & (days.day == 1)]
+        raise ValueError(f"Unknown time frame {rule}")
+
+    def _compute(self, rule, first_minute, last_minute):
+        if rule == 'H':
+            # Hours of the calendar, aligned on the start of the day
+            offset = self.day_start % 60
+            start = (first_minute - offset) // 60 * 60 + offset - 60
+            end = (last_minute - offset) // 60 * 60 + offset + 120
+            return np.arange(start, end, 60, dtype=np.int64), None
+        # Trading days named by their local date, starting at day_start
+        local = to_datetimes([first_minute, last_minute]).tz_localize('UTC').tz_convert(self.timezone)
+        first_day = local[0].tz_localize(None).normalize()
+        last_day = local[1].tz_localize(None).normalize()
+        dates = self._period_dates(rule, first_day, last_day)
+        starts = (dates + pd.Timedelta(minutes=self.day_start)).tz_localize(
+            self.timezone, ambiguous=True, nonexistent='shift_forward'
+        ).tz_convert('UTC').tz_localize(None)
+        return to_minutes(starts.values), dates
+
+    def buckets(self, rule, first_minute, last_minute):
+        """
+        Boundaries (int64 epoch minutes, UTC) covering first_minute..last_minute
+        and the local dates of the periods they start (None for hours).
+        Computed once per time frame, again only for minutes outside the span.
+        """
+        known = self._buckets.get(rule)
+        if known is None or first_minute < known[0] or last_minute > known[1]:
+            if known is not None:
+                first_minute = min(first_minute, known[0])
+                last_minute = max(last_minute, known[1])
+            bounds, dates = self._compute(rule, first_minute, last_minute)
+            known = (first_minute, last_minute, bounds, dates)
+            self._buckets[rule] = known
+        return known[2], known[3]
+
+    def labels(self, rule, label):
+        # Label of each bucket: 'start' is its first boundary, 'last day' the
+        # local date of its last trading day (how pandas labels W/M/Y bars)
+        bounds, dates = self._buckets[rule][2], self._buckets[rule][3]
+        if label == 'start':
+            return bounds[:-1]
+        return to_minutes((dates[1:] - pd.Timedelta(days=1)).values)
+
+
+# BTC: UTC days starting at midnight, weeks on Monday
+UTC_CALENDAR = SessionCalendar('UTC')
+# CME: trading day from 17:00 New York the evening before, weeks opening
+# Sunday 17:00 with the Monday session
+CME_CALENDAR = SessionCalendar('America/New_York', day_start=-7 * 60)
+
+
+def resample_ohlcv(minutes, open_, high, low, close, volume, calendar, rule, closed, label):
+    """
+    OHLCV bars of one time frame. minutes: sorted int64 epoch minutes, volume
+    may be None. Returns (label minutes, o, h, l, c, v) of the buckets with
+    all of OHLC valid, and the open bar: the [o, h, l, c, v] of the bucket of
+    the last minute (NaN until a valid value), with whether it is in the bars.
+    """
+    bounds, _ = calendar.buckets(rule, minutes[0], minutes[-1])
+    if volume is None:
+        volume = np.zeros(len(minutes))
+    o, h, l, c, v, count = aggregate_buckets(minutes, open_, high, low, close, volume, bounds, closed == 'right')
+    labels = calendar.labels(rule, label)
+    keep = ~(np.isnan(o) | np.isnan(h) | np.isnan(l) | np.isnan(c))
+    last = np.flatnonzero(count)[-1]
+    open_bar = [float(o[last]), float(h[last]), float(l[last]), float(c[last]), float(v[last])]
+    return (labels[keep], o[keep], h[keep], l[keep], c[keep], v[keep]), open_bar, bool(keep[last])
+
+
+# Time frame whose bars make the bars of a longer one: days start on an hour,
+# weeks and months on a day and years on a month
+SOURCE_RULES = {'D': 'H', 'W': 'D', 'M': 'D', 'Y': 'M'}
+
+def carry_key(rule, closed):
+    return f'{rule} {closed}'
+
+def resample_cascade(minutes, open_, high, low, close, volume, calendar, frames, carry=None):
+    """
+    OHLCV bars of several time frames, frames: [(rule, closed, label)]. The
+    minutes are sorted int64 epoch minutes, volume may be None. Returns the
+    (bars, open bar, whether it is in the bars) of each frame, as
+    resample_ohlcv does, and the carry of the run.
+
+    The carry continues the cascade with the minutes after the last one: its
+    'watermark' is that minute, its 'frames' hold the part of the open bucket
+    of every frame of the chains that the next run doesn't aggregate again
+    (all its minutes for the hours; for the longer frames, the source bars
+    before the open source bar, which the next run rebuilds).
+    """
+    first = minutes[0] if carry is None else carry['watermark']
+    if volume is None:
+        volume = np.zeros(len(minutes))
+    built = {}
+    new_carry = {'watermark': int(minutes[-1]), 'frames': {}}
+
+    def build(rule, closed):
+        # (bars for the longer frames, aggregated buckets) of a frame
+        if (rule, closed) in built:
+            return built[(rule, closed)]
+        closed_right = closed == 'right'
+        source = SOURCE_RULES.get(rule)
+        if source is None:
+            times, o, h, l, c, v = minutes, open_, high, low, close, volume
+        else:
+            times, o, h, l, c, v = build(source, closed)[0]
+        if carry is not None:
+            # The carried part of the open bucket goes first, at the time of
+            # the first minute (or source bar), which is in that bucket
+            bar = carry['frames'][carry_key(rule, closed)]
+            at = carry['watermark'] if source is None else times[0]
+            times = np.concatenate(([at], times))
+            o, h, l, c, v = [np.concatenate(([x], values)) for x, values in zip(bar, (o, h, l, c, v))]
+        bounds, _ = calendar.buckets(rule, first, minutes[-1])
+        buckets = aggregate_buckets(times, o, h, l, c, v, bounds, closed_right)
+        count = buckets[5]
+        last = np.flatnonzero(count)[-1]
+        if source is None:
+            settled = buckets
+        else:
+            # Without the last source bar, still open
+            settled = aggregate_buckets(times[:-1], o[:-1], h[:-1], l[:-1], c[:-1], v[:-1], bounds, closed_right)
+        new_carry['frames'][carry_key(rule, closed)] = [float(values[last]) for values in settled[:5]]
+        # Bars of the non-empty buckets, at the bound on their closed side
+        filled = count > 0
+        edges = bounds[1:] if closed_right else bounds[:-1]
+        bars = (edges[filled],) + tuple(values[filled] for values in buckets[:5])
+        built[(rule, closed)] = (bars, buckets)
+        return built[(rule, closed)]
+
+    results = []
+    for rule, closed, label in frames:
+        _, (o, h, l, c, v, count) = build(rule, closed)
+        labels = calendar.labels(rule, label)
+        keep = ~(np.isnan(o) | np.isnan(h) | np.isnan(l) | np.isnan(c))
+        last = np.flatnonzero(count)[-1]
+        open_bar = [float(o[last]), float(h[last]), float(l[last]), float(c[last]), float(v[last])]
+        results.append(((labels[keep], o[keep], h[keep], l[keep], c[keep], v[keep]), open_bar, bool(keep[last])))
+    return results, new_carry
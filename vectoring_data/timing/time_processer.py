@@ -1,103 +1,299 @@
+import io
+import json
+import numpy as np
 import pandas as pd
 import os
 import shutil
 
-def resample_data(file_path, output_base_dir):
-    # Save original data as '1 minute' data
-    one_minute_dir = os.path.join(output_base_dir, '1 minute')
-    os.makedirs(one_minute_dir, exist_ok=True)
-    one_minute_file = os.path.join(one_minute_dir, os.path.basename(file_path))
-    shutil.copy(file_path, one_minute_file.replace('.csv', '_1m.csv'))
-    
-    # Read the data
-    df = pd.read_csv(file_path)
-    
-    # Identify the time column and set it as index
+from minute_store import MinuteStore, STORE_DIR, last_line, line_before
+from session_resampler import UTC_CALENDAR, CME_CALENDAR, to_minutes, to_datetimes, resample_cascade
+
+# Define the time frames and their corresponding bucket rules
+# (closed side, label). The days are (D, D+1] labelled D, the W/M/Y bars hold
+# whole calendar days labelled with their last day (the pandas W/M/Y bins).
+# Only the hours are aggregated from the minutes, the other frames cascade
+# from the bars of a shorter one (resample_cascade)
+TIME_FRAMES = [
+    ('1 hour', 'H', 'right', 'start'),
+    ('1 day', 'D', 'right', 'start'),
+    ('1 week', 'W', 'left', 'last day'),
+    ('1 month', 'M', 'left', 'last day'),
+    ('1 year', 'Y', 'left', 'last day')
+]
+
+# Session calendars of the CME tickers (trading day closing at 17:00 New
+# York). Their session bars don't share the UTC labels of the BTC bars, which
+# the environment merge joins on, so they are used only with USE_SESSIONS
+TICKER_CALENDARS = {
+    'DXY': CME_CALENDAR,
+    'GOLD': CME_CALENDAR,
+    'NDQ': CME_CALENDAR,
+    'SPX': CME_CALENDAR,
+    'VIX': CME_CALENDAR,
+    'US02Y': CME_CALENDAR,
+    'US10Y': CME_CALENDAR
+}
+
+# Watermarks and carried open bars of the resampled files, in the output
+# directory
+STATE_FILE = 'resample_state.json'
+
+def load_state(output_base_dir):
+    state_file = os.path.join(output_base_dir, STATE_FILE)
+    if os.path.exists(state_file):
+        try:
+            with open(state_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Resample state unreadable ({e}), rebuilding every file")
+    return {}
+
+def save_state(output_base_dir, state):
+    os.makedirs(output_base_dir, exist_ok=True)
+    state_file = os.path.join(output_base_dir, STATE_FILE)
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+def ohlcv_arrays(df, file_path):
+    # (time column, sorted int64 epoch minutes, open, high, low, close, volume)
+    # of the rows, or None if the columns aren't recognized
+    # Identify the time column
     if 'Formatted_Time' in df.columns:
         time_col = 'Formatted_Time'
     elif 'datetime' in df.columns:
         time_col = 'datetime'
     else:
         print(f"Time column not found in {file_path}")
-        return
+        return None
 
-    df[time_col] = pd.to_datetime(df[time_col])
-    df.set_index(time_col, inplace=True)
+    # Int64 epoch minutes, sorted
+    minutes = to_minutes(pd.to_datetime(df[time_col]).values)
+    order = np.argsort(minutes, kind='stable')
+    minutes = minutes[order]
     
     # Check which price columns are present
     if {'Open', 'High', 'Low', 'Close'}.issubset(df.columns):
         # Data is in OHLC format
-        agg_dict = {
-            'Open': 'first',
-            'High': 'max',
-            'Low': 'min',
-            'Close': 'last'
-        }
+        open_, high, low, close = [df[col].to_numpy(dtype=np.float64)[order] for col in ['Open', 'High', 'Low', 'Close']]
     elif 'Price' in df.columns:
-        # Data is in Price format
-        # For resampling, use 'Price' to compute 'Open', 'High', 'Low', 'Close'
-        agg_dict = {
-            'Price': ['first', 'max', 'min', 'last']
-        }
+        # Data is in Price format, the price is the open, high, low and close
+        open_ = high = low = close = df['Price'].to_numpy(dtype=np.float64)[order]
     else:
         print(f"No recognizable price columns found in {file_path}")
-        return
+        return None
     
     # Handle Volume if present
-    if 'Volume' in df.columns:
-        agg_dict['Volume'] = 'sum'
-    
-    # Define the time frames and their corresponding resampling rules
-    time_frames = [
-        ('1 hour', 'H', 'left', 'right'),
-        ('1 day', 'D', 'left', 'right'),
-        ('1 week', 'W', 'right', 'right'),
-        ('1 month', 'M', 'right', 'right'),
-        ('1 year', 'Y', 'right', 'right')
-    ]
-    
-    # Process each time frame independently
-    for dir_name, resample_rule, label, closed in time_frames:
-        # Resample the data
-        resampled = df.resample(resample_rule, label=label, closed=closed).agg(agg_dict)
-        
-        # If 'Price' was used, flatten MultiIndex columns and rename
-        if 'Price' in df.columns:
-            # Flatten the MultiIndex columns
-            resampled.columns = ['_'.join(col).strip() if isinstance(col, tuple) else col for col in resampled.columns.values]
-            # Rename columns to standard OHLC names
-            column_mapping = {
-                'Price_first': 'Open',
-                'Price_max': 'High',
-                'Price_min': 'Low',
-                'Price_last': 'Close'
-            }
-            if 'Volume' or 'Volume_sum' in df.columns:
-                column_mapping['Volume'] = 'Volume'
-                column_mapping['Volume_sum'] = 'Volume'
-            resampled.rename(columns=column_mapping, inplace=True)
-        else:
-            # For OHLC data, columns are already named correctly
-            pass
-        
-        # Drop periods with NaN values in OHLC columns
-        resampled.dropna(subset=['Open', 'High', 'Low', 'Close'], inplace=True)
-        
-        # Reset index to get the time column back as a column
-        resampled.reset_index(inplace=True)
+    volume = df['Volume'].to_numpy(dtype=np.float64)[order] if 'Volume' in df.columns else None
+    return time_col, minutes, open_, high, low, close, volume
+
+def write_bars(out, time_col, bars, volume_dtype, open_kept, header, date_format):
+    # Writes the bars at the current position of out (binary) and returns the
+    # offset of the open bar row, None if the open bar isn't written
+    labels, o, h, l, c, v = bars
+    resampled = pd.DataFrame({
+        time_col: to_datetimes(labels),
+        'Open': o,
+        'High': h,
+        'Low': l,
+        'Close': c
+    })
+    if volume_dtype is not None:
+        # Integer volumes stay integers
+        resampled['Volume'] = v.astype(volume_dtype) if np.dtype(volume_dtype).kind in 'iu' else v
+    closed_bars = resampled.iloc[:-1] if open_kept else resampled
+    # The header is written even without closed bars
+    out.write(closed_bars.to_csv(index=False, header=header, date_format=date_format).encode())
+    if not open_kept:
+        return None
+    offset = out.tell()
+    out.write(resampled.iloc[-1:].to_csv(index=False, header=False, date_format=date_format).encode())
+    return offset
+
+def output_path(output_base_dir, dir_name, file_path, resample_rule):
+    output_file = os.path.join(output_base_dir, dir_name, os.path.basename(file_path))
+    return output_file.replace('.csv','_1' + resample_rule + '.csv')
+
+def calendar_key(calendar):
+    return [calendar.timezone, calendar.day_start, calendar.week_start]
+
+def link_one_minute(file_path, one_minute_file):
+    # The 1 minute file is a hardlink to the processed file (no copy, and it
+    # follows the file as processer.py rewrites it in place). Where links
+    # aren't possible, a copy that only gets the bytes added since last run
+    if os.path.exists(one_minute_file) and os.path.samefile(file_path, one_minute_file):
+        return
+    tmp_file = one_minute_file + '.tmp'
+    try:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        os.link(file_path, tmp_file)
+        os.replace(tmp_file, one_minute_file)
+        return
+    except OSError as e:
+        print(f"Can't link {one_minute_file} ({e}), copying the new rows")
+    
+    if os.path.exists(one_minute_file):
+        copied = os.path.getsize(one_minute_file)
+        with open(file_path, 'rb') as f, open(one_minute_file, 'r+b') as out:
+            # The copy is continued if the file still starts with it
+            if 0 < copied <= f.seek(0, 2) and line_before(f, copied) == line_before(out, copied):
+                f.seek(copied)
+                out.seek(copied)
+                shutil.copyfileobj(f, out)
+                return
+    shutil.copy(file_path, one_minute_file)
+
+def read_minutes(file_path, store=None):
+    # (rows, volume dtype) of a processed file: from the minute store, brought
+    # up to date with the lines added to the file since its last sync (typed
+    # columns, no CSV to parse), else from the file
+    ticker = os.path.basename(file_path).replace('Processed_', '').replace('.csv', '')
+    if store is not None:
+        try:
+            written = store.sync_csv(ticker, file_path)
+            print(f"{written} rows written to the {ticker} store")
+        except Exception as e:
+            # The CSV is read instead, the store catches up on the next sync
+            print(f"The {ticker} store was not updated ({str(e)})")
+    if store is not None and store.in_sync(ticker, file_path):
+        print(f"Reading the minutes of {ticker} from the store")
+        df = store.read(ticker)
+        df.index.name = pd.read_csv(file_path, nrows=0).columns[0]
+        df.reset_index(inplace=True)
+        return df, store.column_dtypes(ticker).get('Volume', 'float64') if 'Volume' in df.columns else None
+    df = pd.read_csv(file_path)
+    return df, str(df['Volume'].dtype) if 'Volume' in df.columns else None
+
+def resample_data(file_path, output_base_dir, calendar=UTC_CALENDAR, state=None, store=None):
+    """
+    Writes the 1m copy and the resampled time frames of file_path. With a
+    state (load_state), a file resampled before only gets the minutes added
+    since its watermark: the open bar of each time frame is rewritten and the
+    new bars appended. The state is updated in place, save it after the run.
+    A full run syncs store (a MinuteStore) with the file and reads the
+    minutes from it.
+    """
+    # Serve the original data as '1 minute' data
+    one_minute_dir = os.path.join(output_base_dir, '1 minute')
+    os.makedirs(one_minute_dir, exist_ok=True)
+    one_minute_file = os.path.join(one_minute_dir, os.path.basename(file_path))
+    link_one_minute(file_path, one_minute_file.replace('.csv', '_1m.csv'))
+    
+    name = os.path.basename(file_path)
+    if state is not None and name in state:
+        if resample_new_minutes(file_path, output_base_dir, calendar, state[name]):
+            return
+        print(f"{file_path} changed before its watermark, rebuilding it")
+    
+    # Read the data
+    df, volume_dtype = read_minutes(file_path, store)
+    arrays = ohlcv_arrays(df, file_path)
+    if arrays is None:
+        return
+    time_col, minutes, open_, high, low, close, volume = arrays
+    if len(minutes) == 0:
+        print(f"No data in {file_path}")
+        return
+    
+    # Aggregate in the buckets of the calendar, periods with NaN values in
+    # OHLC columns are dropped
+    results, carry = resample_cascade(
+        minutes, open_, high, low, close, volume, calendar,
+        [(resample_rule, closed, label) for _, resample_rule, closed, label in TIME_FRAMES]
+    )
+    frames = {}
+    for (dir_name, resample_rule, closed, label), (bars, _, open_kept) in zip(TIME_FRAMES, results):
+        # Date only when every label is a midnight, as pandas writes them
+        date_format = '%Y-%m-%d' if (bars[0] % 1440 == 0).all() else '%Y-%m-%d %H:%M:%S'
         
         # Create the output directory
-        output_dir = os.path.join(output_base_dir, dir_name)
-        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(os.path.join(output_base_dir, dir_name), exist_ok=True)
         
         # Save the resampled data to CSV
-        output_file = os.path.join(output_dir, os.path.basename(file_path))
-        resampled.to_csv(output_file.replace('.csv','_1' + resample_rule + '.csv'), index=False)
+        with open(output_path(output_base_dir, dir_name, file_path, resample_rule), 'wb') as out:
+            row_offset = write_bars(out, time_col, bars, volume_dtype, open_kept, True, date_format)
+        frames[resample_rule] = {'row_offset': row_offset, 'date_format': date_format}
+    
+    if state is not None:
+        with open(file_path, 'rb') as f:
+            size = f.seek(0, 2)
+            state[name] = {
+                'calendar': calendar_key(calendar),
+                'offset': size,
+                'last_line': line_before(f, size),
+                'watermark': int(minutes[-1]),
+                'carry': carry['frames'],
+                'time_col': time_col,
+                'volume_dtype': volume_dtype,
+                'frames': frames
+            }
+
+def resample_new_minutes(file_path, output_base_dir, calendar, file_state):
+    # Incremental run, False if the file can't be continued from its state
+    if file_state['calendar'] != calendar_key(calendar) or 'carry' not in file_state:
+        return False
+    for dir_name, resample_rule, _, _ in TIME_FRAMES:
+        if not os.path.exists(output_path(output_base_dir, dir_name, file_path, resample_rule)):
+            return False
+    
+    # The rows after the ones already resampled, if the file still starts
+    # with them (same last line at the same offset)
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+        size = f.seek(0, 2)
+        offset = file_state['offset']
+        if size < offset or line_before(f, offset) != file_state['last_line']:
+            return False
+        f.seek(offset)
+        data = f.read()
+    # Only complete lines, a line being written is left for the next run
+    data = data[:data.rfind(b'\n') + 1]
+    if not data.strip():
+        print(f"{file_path} is up to date")
+        return True
+    
+    columns = pd.read_csv(io.BytesIO(header), nrows=0).columns
+    df = pd.read_csv(io.BytesIO(data), names=columns, header=None)
+    arrays = ohlcv_arrays(df, file_path)
+    if arrays is None:
+        return False
+    time_col, minutes, open_, high, low, close, volume = arrays
+    watermark = file_state['watermark']
+    if time_col != file_state['time_col'] or len(minutes) == 0 or minutes[0] <= watermark:
+        return False
+    if (volume is None) != (file_state['volume_dtype'] is None):
+        return False
+    print(f"Resampling {len(minutes)} new minutes of {file_path}")
+    
+    # The carried open buckets go first, they aggregate like the minutes and
+    # bars they were made of
+    results, carry = resample_cascade(
+        minutes, open_, high, low, close, volume, calendar,
+        [(resample_rule, closed, label) for _, resample_rule, closed, label in TIME_FRAMES],
+        {'watermark': watermark, 'frames': file_state['carry']}
+    )
+    for (dir_name, resample_rule, closed, label), (bars, _, open_kept) in zip(TIME_FRAMES, results):
+        frame = file_state['frames'][resample_rule]
+        # Rewrite the open bar row and append the bars after it
+        with open(output_path(output_base_dir, dir_name, file_path, resample_rule), 'r+b') as out:
+            if frame['row_offset'] is not None:
+                out.truncate(frame['row_offset'])
+            out.seek(0, 2)
+            row_offset = write_bars(out, time_col, bars, file_state['volume_dtype'], open_kept, False, frame['date_format'])
+        frame['row_offset'] = row_offset
+    
+    file_state.update({'offset': offset + len(data), 'last_line': last_line(data), 'watermark': int(minutes[-1]),
+                       'carry': carry['frames']})
+    return True
 
 if __name__ == "__main__":
     # Define the input and output directories
     input_dir = '../../fetching_data/history/LIVE PROCESSED'
     output_base_dir = 'resampled_data'
+    # Session bars (CME day closing at 17:00 New York) for the CME tickers
+    USE_SESSIONS = False
     
     # Ensure the input directory exists
     if not os.path.exists(input_dir):
@@ -111,9 +307,19 @@ if __name__ == "__main__":
         print(f"No CSV files found in {input_dir}.")
         exit(1)
     
+    # Files resampled before only get their new minutes, the others are read
+    # from the minute store
+    state = load_state(output_base_dir)
+    store = MinuteStore(STORE_DIR)
+    
     # Process each file
     for csv_file in csv_files:
         file_path = os.path.join(input_dir, csv_file)
         print(f"Processing {file_path}...")
-        resample_data(file_path, output_base_dir)
+        calendar = UTC_CALENDAR
+        if USE_SESSIONS:
+            ticker = csv_file.replace('Processed_', '').replace('.csv', '')
+            calendar = TICKER_CALENDARS.get(ticker, UTC_CALENDAR)
+        resample_data(file_path, output_base_dir, calendar, state, store)
+        save_state(output_base_dir, state)
         print(f"Finished processing {file_path}.")